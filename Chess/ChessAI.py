@@ -0,0 +1,352 @@
+"""
+This is the computer player. It searches the game tree with negamax and alpha-beta pruning, one depth at a time
+(iterative deepening) until it runs out of time or nodes, and returns the best move it found together with the
+principal variation (the line of moves both sides are expected to play).
+
+The search only uses getValidMoves/getStagedMoves/hasLegalMove/isDraw/makeChessMove/undoMove and the evaluation
+scores the board keeps up to date (see ChessEvaluation), so it works on ChessEngine.GameBoard and on
+ChessBitboard.BitBoard.
+"""
+import math
+import time
+
+from Chess.ChessEvaluation import PIECE_VALUES, taperedScore
+from Chess.ChessMoveOrdering import MoveOrderer
+from Chess.ChessTransposition import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, NO_MOVE
+
+CHECKMATE = 100000  # score for being checkmated at the root; mates found deeper score a bit less so shorter mates win
+STALEMATE = 0
+DRAW = 0  # repetition, fifty-move rule or insufficient material
+MAX_PLY = 64
+DELTA_MARGIN = 200  # quiescence: a capture is skipped if winning the piece plus this much still can't raise alpha
+NULL_MOVE_MIN_DEPTH = 3  # null-move pruning is only tried this far from the leaves
+LMR_MIN_DEPTH = 3  # late move reductions: only moves searched at least this deep are reduced
+LMR_MIN_MOVES = 3  # ... and never the first moves (hash move, captures and killers usually come first)
+LMR_HISTORY_BONUS = 64  # a quiet move with at least this history score is reduced one ply less
+
+# Lazy SMP: helper n skips the depths where (depth + HELPER_SKIP_PHASE[n - 1]) // HELPER_SKIP_SIZE[n - 1] is odd
+HELPER_SKIP_SIZE = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+HELPER_SKIP_PHASE = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+
+# LMR_REDUCTIONS[depth][moveNumber] -> plies a late quiet move is reduced by: later moves in deeper searches get reduced
+# more, since the further down the order a move is the less likely it is to be the best one
+LMR_REDUCTIONS = [[0] * 64] + [[0] + [int(0.5 + math.log(depth) * math.log(moveNumber) / 2)
+                                      for moveNumber in range(1, 64)] for depth in range(1, MAX_PLY + 1)]
+
+'''
+Static evaluation in centipawns from the point of view of the side to move (positive = good for the side to move):
+material plus piece-square table bonuses, blended between opening and endgame by the game phase. The board keeps the
+scores up to date on every move, so this doesn't look at the squares at all.
+'''
+
+
+def evaluate(gameState):
+    score = taperedScore(gameState.openingScore, gameState.endgameScore, gameState.gamePhase)
+    return score if gameState.whiteToMove else -score
+
+
+'''
+Whether the side to move is in check. The boards' isInCheck attribute is only set by move generation, and a node has
+to know before it generates any moves.
+'''
+
+
+def sideToMoveInCheck(gameState):
+    kingRow, kingCol = gameState.whiteKingLocation if gameState.whiteToMove else gameState.blackKingLocation
+    return gameState.squareUnderAttack(kingRow, kingCol)
+
+
+'''
+Mate scores depend on how far the mate is from the root. The transposition table stores them as distance from the
+position itself so they stay right when the position comes up at another ply.
+'''
+
+
+def scoreToTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score + ply
+    if score <= -(CHECKMATE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score - ply
+    if score <= -(CHECKMATE - MAX_PLY):
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult():
+    def __init__(self, bestMove, score, depth, nodes, seconds, principalVariation):
+        self.bestMove = bestMove
+        self.score = score  # centipawns from the point of view of the side to move at the root
+        self.depth = depth  # last depth that was searched completely
+        self.nodes = nodes
+        self.seconds = seconds
+        self.principalVariation = principalVariation  # list of Move objects starting with bestMove
+
+    def __str__(self):
+        return "depth " + str(self.depth) + " score " + str(self.score) + " nodes " + str(self.nodes) + " pv " + \
+               " ".join(move.getChessNotation() for move in self.principalVariation)
+
+
+class Searcher():
+    def __init__(self, maxDepth=MAX_PLY, timeLimit=1.0, nodeLimit=None, hashSizeMB=16, moveOrderer=None,
+                 useQuiescence=True, usePVS=True, useNullMove=True, useLMR=True, onDepthCompleted=None,
+                 transpositionTable=None, stopEvent=None, helperIndex=0):
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit  # seconds, None for no limit
+        self.nodeLimit = nodeLimit  # nodes, None for no limit
+        self.nodes = 0
+        self.principalVariation = []
+        self.pvTable = [[] for _ in range(MAX_PLY + 1)]  # pvTable[ply] is the best line found from that ply
+        self.stopTime = None
+        # set by stop(), possibly from another thread; whoever starts the next search clears it first
+        self.stopRequested = False
+        self.stopEvent = stopEvent  # optional multiprocessing.Event: stops the search from another process
+        self.helperIndex = helperIndex  # 0 for a normal search; 1, 2, ... for the helpers of a Lazy SMP search
+        self.onDepthCompleted = onDepthCompleted  # called with the SearchResult of every depth that finished
+        # kept between searches: positions from the last move's search are often still useful. A table can be passed in
+        # to share it between searchers (see ChessSMP)
+        self.transpositionTable = transpositionTable if transpositionTable is not None else \
+            TranspositionTable(hashSizeMB)
+        self.moveOrderer = moveOrderer if moveOrderer is not None else MoveOrderer(MAX_PLY)  # killers and history
+        # each selectivity feature can be switched off to measure what it is worth (A/B testing)
+        self.useQuiescence = useQuiescence  # False: leaves are evaluated as they are
+        self.usePVS = usePVS  # principal variation search: moves after the first get a null window first
+        self.useNullMove = useNullMove  # null-move pruning
+        self.useLMR = useLMR  # late move reductions
+
+    '''
+    Iterative deepening: searches depth 1, 2, 3 ... and keeps the result of the last depth that finished. The best
+    line of one depth is searched first at the next depth, which makes alpha-beta cut off much more.
+    '''
+
+    def search(self, gameState):
+        startTime = time.perf_counter()
+        self.stopTime = startTime + self.timeLimit if self.timeLimit is not None else None
+        self.nodes = 0
+        self.principalVariation = []
+        self.transpositionTable.newSearch()
+        self.moveOrderer.newSearch()
+        rootMoves = gameState.getValidMoves()
+        result = SearchResult(rootMoves[0] if rootMoves else None, 0, 0, 0, 0.0, rootMoves[:1])
+        if len(rootMoves) <= 1:  # nothing to think about
+            return result
+        for depth in range(1, self.maxDepth + 1):
+            if self.skipsDepth(depth):
+                continue
+            try:
+                score = self.negamax(gameState, depth, -CHECKMATE - 1, CHECKMATE + 1, 0)
+            except SearchTimeout:  # every node takes back its own move on the way out, so the board is as it was
+                break
+            self.principalVariation = self.pvTable[0][:]
+            result = SearchResult(self.principalVariation[0], score, depth, self.nodes,
+                                  time.perf_counter() - startTime, self.principalVariation)
+            if self.onDepthCompleted is not None:
+                self.onDepthCompleted(result)
+            if abs(score) >= CHECKMATE - MAX_PLY:  # found a forced mate, searching deeper won't change the move
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - startTime
+        return result
+
+    '''
+    Lazy SMP helpers skip some depths of the iterative deepening, each helper a different pattern, so at any moment the
+    processes sharing a table are searching different depths and fill in each other's entries instead of all doing
+    the same work. The last depth is never skipped.
+    '''
+
+    def skipsDepth(self, depth):
+        if self.helperIndex == 0 or depth == self.maxDepth:
+            return False
+        index = (self.helperIndex - 1) % len(HELPER_SKIP_SIZE)
+        return ((depth + HELPER_SKIP_PHASE[index]) // HELPER_SKIP_SIZE[index]) % 2 == 1
+
+    '''
+    Makes a running search return the best move of the last finished depth as soon as it next looks at its budget
+    (within a few hundred nodes). Safe to call from another thread.
+    '''
+
+    def stop(self):
+        self.stopRequested = True
+
+    def checkBudget(self):
+        if self.stopRequested or (self.stopEvent is not None and self.stopEvent.is_set()):
+            raise SearchTimeout()
+        if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            raise SearchTimeout()
+        if self.stopTime is not None and time.perf_counter() >= self.stopTime:
+            raise SearchTimeout()
+
+    '''
+    Negamax with alpha-beta pruning. Returns the score of the position for the side to move; the score of a move is
+    minus the score the opponent gets after it.
+
+    Selectivity, each switchable in the constructor:
+    - null-move pruning: if the side to move is doing so well that even passing the turn and searching R plies less
+      (R = 3 deep in the tree, 2 near the leaves) still scores >= beta, a real move will too, so the node is cut off
+    - principal variation search: the first move is expected to be the best, so the others are only searched with a
+      null window (alpha, alpha + 1) to prove they are worse; one that isn't is searched again with the full window
+    - late move reductions: quiet moves late in the order are searched shallower (more so the later the move and the
+      deeper the node, less so with a good history score) and only searched again at full depth if they beat alpha
+    '''
+
+    def negamax(self, gameState, depth, alpha, beta, ply, allowNullMove=True):
+        self.nodes += 1
+        if self.nodes & 255 == 0:  # looking at the clock every node would cost more than the nodes themselves
+            self.checkBudget()
+        self.pvTable[ply] = []
+        if ply > 0 and gameState.isDraw(1):  # a position the side to move can repeat once it can repeat again
+            return DRAW
+        if depth == 0:
+            if self.useQuiescence:
+                return self.quiescence(gameState, alpha, beta, ply)
+            if not gameState.hasLegalMove():  # the static evaluation can't see that a leaf is mate or stalemate
+                return -(CHECKMATE - ply) if gameState.isInCheck else STALEMATE
+            return evaluate(gameState)
+
+        # a position searched before at least this deep can return without generating any moves
+        key = gameState.zobristKey
+        entry = self.transpositionTable.probe(key)
+        hashMoveID = NO_MOVE
+        if entry is not None:
+            entryDepth, entryScore, entryBound, hashMoveID = entry
+            if ply > 0 and entryDepth >= depth:
+                entryScore = scoreFromTable(entryScore, ply)
+                if entryBound == BOUND_EXACT or (entryBound == BOUND_LOWER and entryScore >= beta) or \
+                        (entryBound == BOUND_UPPER and entryScore <= alpha):
+                    return entryScore
+
+        inCheck = sideToMoveInCheck(gameState)
+        if self.useNullMove and allowNullMove and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and \
+                beta < CHECKMATE - MAX_PLY and evaluate(gameState) >= beta and gameState.hasNonPawnMaterial():
+            reduction = 3 if depth > 6 else 2  # adaptive null-move pruning
+            gameState.makeNullMove()
+            try:  # no null move right after this one: that would just be the same position searched shallower
+                score = -self.negamax(gameState, max(depth - 1 - reduction, 0), -beta, -beta + 1, ply + 1, False)
+            finally:
+                gameState.undoNullMove()
+            if score >= beta:
+                return beta if score >= CHECKMATE - MAX_PLY else score  # a mate after passing isn't a real mate
+
+        if hashMoveID == NO_MOVE and ply < len(self.principalVariation):
+            hashMoveID = self.principalVariation[ply].moveID  # the previous iteration's line
+        originalAlpha = alpha
+        bestScore = -CHECKMATE - 1
+        bestMove = None
+        # moves come hash move first, then captures, killers and quiet moves, and are only generated as they are needed
+        orderer = self.moveOrderer
+        history = orderer.getHistory()
+        canReduce = self.useLMR and depth >= LMR_MIN_DEPTH and not inCheck
+        moveNumber = 0
+        for move in gameState.getStagedMoves(hashMoveID if hashMoveID != NO_MOVE else None, orderer.getKillers(ply),
+                                             history):
+            moveNumber += 1
+            gameState.makeChessMove(move)
+            try:
+                if moveNumber == 1:
+                    score = -self.negamax(gameState, depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    searchBeta = alpha + 1 if self.usePVS else beta
+                    reduction = 0
+                    if canReduce and moveNumber > LMR_MIN_MOVES and move.pieceCaptured == "--" and \
+                            not move.isPawnPromotion and not sideToMoveInCheck(gameState):
+                        reduction = LMR_REDUCTIONS[depth][min(moveNumber, 63)]
+                        if history is not None and history[move.moveID & 0xFFF] >= LMR_HISTORY_BONUS:
+                            reduction -= 1
+                        reduction = min(reduction, depth - 1)
+                    score = -self.negamax(gameState, depth - 1 - reduction, -searchBeta, -alpha, ply + 1)
+                    if reduction > 0 and score > alpha:  # the reduced search says it's good: check at full depth
+                        score = -self.negamax(gameState, depth - 1, -searchBeta, -alpha, ply + 1)
+                    if searchBeta != beta and alpha < score < beta:  # beat the null window: get the real score
+                        score = -self.negamax(gameState, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                gameState.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+                    if alpha >= beta:
+                        orderer.addCutoff(move, ply, depth, moveNumber)
+                        break
+
+        if bestMove is None:  # no legal moves
+            return -(CHECKMATE - ply) if inCheck else STALEMATE
+        if bestScore >= beta:
+            bound = BOUND_LOWER
+        elif bestScore > originalAlpha:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.transpositionTable.store(key, depth, scoreToTable(bestScore, ply), bound,
+                                      bestMove.moveID if bound != BOUND_UPPER else NO_MOVE)
+        return bestScore
+
+    '''
+    Quiescence search: at the leaves only captures are searched, until the position is quiet, so the search doesn't
+    stop in the middle of an exchange (horizon effect). The side to move can always "stand pat" on the static
+    evaluation instead of capturing. Captures are skipped without being played when winning the captured piece can't
+    bring the score up to alpha (delta pruning) or when the static exchange evaluation says they lose material. In
+    check there is no standing pat and every evasion is searched.
+    '''
+
+    def quiescence(self, gameState, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.checkBudget()
+        if ply >= MAX_PLY:
+            return evaluate(gameState)
+        inCheck = sideToMoveInCheck(gameState)
+        if inCheck:
+            moves = gameState.getValidMoves()  # every evasion is searched, so they are all needed anyway
+            if len(moves) == 0:
+                return -(CHECKMATE - ply)
+            bestScore = -CHECKMATE - 1
+        else:
+            standPat = bestScore = evaluate(gameState)
+            if bestScore >= beta:
+                return bestScore
+            if bestScore > alpha:
+                alpha = bestScore
+            moves = gameState.getCaptureMoves()  # only generated once standing pat didn't cut off
+        for move in moves:
+            if not inCheck:
+                if not move.isPawnPromotion and standPat + PIECE_VALUES[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+                    continue  # delta pruning
+                if gameState.staticExchange(move) < 0:
+                    continue  # loses material
+            gameState.makeChessMove(move)
+            try:
+                score = -self.quiescence(gameState, -beta, -alpha, ply + 1)
+            finally:
+                gameState.undoMove()
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+
+'''
+Convenience function for ChessMain: best move for the side to move within the time limit (seconds). Passing the same
+searcher every move keeps its transposition table between moves.
+'''
+
+
+def findBestMove(gameState, timeLimit=1.0, searcher=None):
+    if searcher is None:
+        searcher = Searcher(timeLimit=timeLimit)
+    else:
+        searcher.timeLimit = timeLimit
+    return searcher.search(gameState).bestMove
@@ -0,0 +1,89 @@
+"""
+Runs the computer player's search in a background process, so ChessMain's loop keeps handling events and drawing at
+MAX_FPS while the computer thinks (a thread wouldn't help: the search would hold the GIL). ChessMain asks for a move
+with start(), calls poll() once per frame until the move arrives, and calls cancel() when the position the search is
+for goes away (undo or reset).
+
+The worker process keeps one Searcher for the whole game, so its transposition table carries over between moves.
+"""
+import multiprocessing
+import queue
+
+from Chess.ChessAI import Searcher
+
+'''
+The loop of the worker process. Requests are (requestID, game state, time limit); a request that was cancelled
+before the worker got to it is skipped, and a cancel during the search stops it through stopEvent.
+'''
+
+
+def _workerLoop(requests, results, stopEvent, cancelledUpTo, hashSizeMB):
+    searcher = Searcher(hashSizeMB=hashSizeMB, stopEvent=stopEvent)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        requestID, gameState, timeLimit = request
+        stopEvent.clear()  # cleared before the check below, so a cancel that comes after the check still stops us
+        if requestID <= cancelledUpTo.value:
+            continue
+        searcher.timeLimit = timeLimit
+        results.put((requestID, searcher.search(gameState).bestMove))
+
+
+class AIWorker():
+    def __init__(self, timeLimit=1.0, hashSizeMB=16):
+        self.timeLimit = timeLimit  # seconds per move
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.stopEvent = multiprocessing.Event()
+        self.cancelledUpTo = multiprocessing.Value("i", 0)  # requests with this ID or lower are not wanted any more
+        self.requestID = 0
+        self.thinking = False  # True from start() until poll() returned the move or cancel() was called
+        self.process = multiprocessing.Process(target=_workerLoop, daemon=True,
+                                               args=(self.requests, self.results, self.stopEvent, self.cancelledUpTo,
+                                                     hashSizeMB))
+        self.process.start()
+
+    '''
+    Starts searching the position for the side to move. The worker gets a clone, so the game can go on changing
+    game_state (e.g. undo) while it thinks.
+    '''
+
+    def start(self, gameState):
+        if self.thinking:
+            self.cancel()
+        self.requestID += 1
+        self.thinking = True
+        self.requests.put((self.requestID, gameState.clone(), self.timeLimit))
+
+    '''
+    Never blocks: returns the best move once the search of the last start() is done, otherwise None. Results of
+    cancelled searches are thrown away.
+    '''
+
+    def poll(self):
+        while self.thinking:
+            try:
+                requestID, bestMove = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if requestID == self.requestID:
+                self.thinking = False
+                return bestMove
+        return None
+
+    def cancel(self):
+        if not self.thinking:
+            return
+        with self.cancelledUpTo.get_lock():
+            self.cancelledUpTo.value = self.requestID
+        self.stopEvent.set()
+        self.thinking = False
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.terminate()
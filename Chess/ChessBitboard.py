@@ -0,0 +1,828 @@
+"""
+This class is a second way of storing the current state of a chess game. Instead of the 8x8 list of strings that
+GameBoard uses, the position is kept as 12 piece bitboards (one Python int per piece type and color) plus occupancy
+masks. It has the same makeChessMove/undoMove/getValidMoves/squareUnderAttack methods as GameBoard and makes the same
+Move objects, so ChessMain (and anything else written for GameBoard) can use either one.
+
+Moves are generated and made from the bitboards alone: the piece a move captures is found by testing the enemy
+bitboards, and makeChessMove/undoMove only XOR bits. board (the 8x8 list of strings GameBoard keeps) is built from
+the bitboards when something asks for it, which is only ChessMain, FEN and PGN, never the search or perft.
+
+Square numbering: square = row * 8 + coln with the same rows and colns as GameBoard (row 0 is black's back rank), so
+bit 0 is a8 and bit 63 is h1.
+"""
+import copy
+
+from Chess.ChessEngine import GameBoard, Move, CastleRights, ZOBRIST_PIECES, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT, \
+    ZOBRIST_BLACK_TO_MOVE
+from Chess.ChessEvaluation import OPENING_SCORES, ENDGAME_SCORES, PHASE_WEIGHTS, SEE_VALUES, computeScores
+from Chess.ChessMoveOrdering import mvvLvaScore
+
+PIECES = ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+FULL_BOARD = (1 << 64) - 1
+
+# directions are (row step, coln step). The first 4 are orthogonal, the last 4 are diagonal (same order as GameBoard).
+#               Up      Left     Down    Right     U L      U R      D L     D R
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ORTHOGONAL = (0, 1, 2, 3)
+DIAGONAL = (4, 5, 6, 7)
+# a direction is "positive" when it walks towards higher square numbers, so the nearest blocker is the lowest set bit
+POSITIVE_DIRECTION = tuple(d[0] * 8 + d[1] > 0 for d in DIRECTIONS)
+
+
+# the pieces a move of each color can capture (a king is never captured)
+CAPTURABLE_PIECES = {"w": ("bP", "bN", "bB", "bR", "bQ"), "b": ("wP", "wN", "wB", "wR", "wQ")}
+# Moves are never changed once they are made, so every move is only made once and then reused from here:
+# MOVE_CACHE[pieceMoved][pieceCaptured][start square << 6 | end square (| promotion index << 12)]
+MOVE_CACHE = {piece: {captured: {} for captured in ("--",) + CAPTURABLE_PIECES[piece[0]]} for piece in PIECES}
+FILE_A = sum(1 << (rows * 8) for rows in range(8))
+FILE_H = FILE_A << 7
+DARK_SQUARES = sum(1 << square for square in range(64) if (square // 8 + square % 8) % 2)  # a8 is a light square
+SQUARE_TUPLES = [divmod(square, 8) for square in range(64)]  # square -> (rows, colns), made once instead of per move
+
+
+def _onBoard(rows, colns):
+    return 0 <= rows < 8 and 0 <= colns < 8
+
+
+def _stepTable(steps):
+    table = []
+    for square in range(64):
+        rows, colns = divmod(square, 8)
+        mask = 0
+        for d in steps:
+            if _onBoard(rows + d[0], colns + d[1]):
+                mask |= 1 << ((rows + d[0]) * 8 + colns + d[1])
+        table.append(mask)
+    return table
+
+
+'''
+Tables that are computed once when the module is imported.
+'''
+KNIGHT_ATTACKS = _stepTable(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _stepTable(DIRECTIONS)
+# squares a pawn of the given color standing on the square attacks
+PAWN_ATTACKS = {"w": _stepTable(((-1, -1), (-1, 1))), "b": _stepTable(((1, -1), (1, 1)))}
+
+# RAYS[direction][square] -> every square from (not including) square to the edge of the board in that direction
+RAYS = []
+for _d in DIRECTIONS:
+    _table = []
+    for _square in range(64):
+        _rows, _colns = divmod(_square, 8)
+        _mask = 0
+        for _i in range(1, 8):
+            if not _onBoard(_rows + _d[0] * _i, _colns + _d[1] * _i):
+                break
+            _mask |= 1 << ((_rows + _d[0] * _i) * 8 + _colns + _d[1] * _i)
+        _table.append(_mask)
+    RAYS.append(_table)
+
+ROOK_RAYS = [RAYS[0][s] | RAYS[1][s] | RAYS[2][s] | RAYS[3][s] for s in range(64)]
+BISHOP_RAYS = [RAYS[4][s] | RAYS[5][s] | RAYS[6][s] | RAYS[7][s] for s in range(64)]
+
+# BETWEEN[a][b] -> squares strictly between a and b when they share a row, coln or diagonal (0 otherwise)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _j in range(8):
+    for _square in range(64):
+        _walked = 0
+        _rows, _colns = divmod(_square, 8)
+        for _i in range(1, 8):
+            if not _onBoard(_rows + DIRECTIONS[_j][0] * _i, _colns + DIRECTIONS[_j][1] * _i):
+                break
+            _target = (_rows + DIRECTIONS[_j][0] * _i) * 8 + _colns + DIRECTIONS[_j][1] * _i
+            BETWEEN[_square][_target] = _walked
+            _walked |= 1 << _target
+
+
+# LINES[square] -> (ray, ray table, positive) for every direction a slider on the square can move in (the rays that
+# run straight off the edge of the board are left out), so walking the rays doesn't look anything else up
+def _sliderLines(directions):
+    return [tuple((RAYS[j][square], RAYS[j], POSITIVE_DIRECTION[j]) for j in directions if RAYS[j][square])
+            for square in range(64)]
+
+
+ROOK_LINES = _sliderLines(ORTHOGONAL)
+BISHOP_LINES = _sliderLines(DIAGONAL)
+
+
+def slidingAttacks(square, occupied, lines):
+    attacks = 0
+    for ray, rays, positive in lines[square]:
+        blockers = ray & occupied
+        if blockers:
+            if positive:  # cut off everything behind the blocker
+                ray ^= rays[(blockers & -blockers).bit_length() - 1]  # nearest blocker is the lowest bit
+            else:
+                ray ^= rays[blockers.bit_length() - 1]  # nearest blocker is the highest bit
+        attacks |= ray
+    return attacks
+
+
+# Attack sets looked up instead of walked: only the pieces on a slider's rays short of the edge of the board (the
+# "relevant" occupancy) can block it, so the attacks of a slider on a square only depend on occupied & that mask.
+# ROOK_ATTACK_CACHE[square] maps every relevant occupancy seen so far to its attacks, so every ray walk is done once.
+def _relevantMask(square, directions):
+    mask = 0
+    for j in directions:
+        ray = RAYS[j][square]
+        if ray:
+            edge = 1 << (ray.bit_length() - 1) if POSITIVE_DIRECTION[j] else ray & -ray  # the last square of the ray
+            mask |= ray ^ edge
+    return mask
+
+
+ROOK_MASKS = [_relevantMask(square, ORTHOGONAL) for square in range(64)]
+BISHOP_MASKS = [_relevantMask(square, DIAGONAL) for square in range(64)]
+ROOK_ATTACK_CACHE = [{} for _ in range(64)]
+BISHOP_ATTACK_CACHE = [{} for _ in range(64)]
+
+
+def rookAttacks(square, occupied):
+    key = occupied & ROOK_MASKS[square]
+    attacks = ROOK_ATTACK_CACHE[square].get(key)
+    if attacks is None:
+        attacks = ROOK_ATTACK_CACHE[square][key] = slidingAttacks(square, key, ROOK_LINES)
+    return attacks
+
+
+def bishopAttacks(square, occupied):
+    key = occupied & BISHOP_MASKS[square]
+    attacks = BISHOP_ATTACK_CACHE[square].get(key)
+    if attacks is None:
+        attacks = BISHOP_ATTACK_CACHE[square][key] = slidingAttacks(square, key, BISHOP_LINES)
+    return attacks
+
+
+def queenAttacks(square, occupied):
+    return rookAttacks(square, occupied) | bishopAttacks(square, occupied)
+
+
+def squares(bitboard):  # yields the square number of every set bit, lowest first
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitBoard():
+    # perft and divide only use getValidMoves/makeChessMove/undoMove, so they are shared with GameBoard
+    perft = GameBoard.perft
+    divide = GameBoard.divide
+    # the position key is the same as GameBoard's, so a position has the same key in both backends
+    computeZobristKey = GameBoard.computeZobristKey
+    # a null move only touches the side to move, en passant square and key, which both backends keep the same way
+    makeNullMove = GameBoard.makeNullMove
+    undoNullMove = GameBoard.undoNullMove
+    # FEN only deals with self.board and the game state fields; the board setter below rebuilds the bitboards
+    fromFEN = classmethod(GameBoard.fromFEN.__func__)
+    setFEN = GameBoard.setFEN
+    toFEN = GameBoard.toFEN
+    # the undo stack is kept the same way as GameBoard's
+    resetHistory = GameBoard.resetHistory
+    growUndoStack = GameBoard.growUndoStack
+    logOfMoves = GameBoard.logOfMoves
+    pushState = GameBoard.pushState
+    restoreState = GameBoard.restoreState
+    getPreviousKeys = GameBoard.getPreviousKeys
+    # draws: the repetition scan only reads the undo stack, the fifty-move rule the halfmove clock
+    isRepetition = GameBoard.isRepetition
+    isDraw = GameBoard.isDraw
+    gameStatus = GameBoard.gameStatus
+    isLegal = GameBoard.isLegal
+    getLegalMoveIndex = GameBoard.getLegalMoveIndex
+
+    def __init__(self):
+        self.board = [  # only read to build the bitboards, see the board property below
+            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
+            ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
+            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
+
+        self.whiteToMove = True
+
+        self.whiteKingLocation = (7, 4)
+        self.blackKingLocation = (0, 4)
+
+        self.checkMate = False
+        self.staleMate = False
+        self.isInCheck = False
+
+        self.enPassantPossible = ()  # square where en passant capture can happen
+
+        self.currentCastlingRights = CastleRights(True, True, True, True)  # changed in place, see GameBoard
+
+        # plies since the last pawn move or capture, and the FEN move number
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+
+        # 64-bit position key: putPiece/removePiece/movePiece XOR the piece keys, makeChessMove the rest
+        self.zobristKey = self.computeZobristKey()
+
+        # moves made so far and the undo stack
+        self.resetHistory()
+
+        # legal moves of the last position getLegalMoveIndex was asked about (see GameBoard)
+        self.legalMoveIndex = None
+        self.legalMoveIndexKey = None
+
+        # material + piece-square scores and game phase, kept up to date by putPiece/removePiece/movePiece
+        self.openingScore, self.endgameScore, self.gamePhase = computeScores(self.board)
+
+    '''
+    The position as an 8x8 list of strings like GameBoard.board, for ChessMain, FEN and PGN. It is built from the
+    bitboards every time it is read, so it is a copy: changing it doesn't change the position. Setting it (new game,
+    setFEN) rebuilds the bitboards from the given board.
+    '''
+
+    @property
+    def board(self):
+        board = [["--"] * 8 for _ in range(8)]
+        for piece, bitboard in self.pieceBitboards.items():
+            for square in squares(bitboard):
+                board[square >> 3][square & 7] = piece
+        return board
+
+    @board.setter
+    def board(self, board):
+        self.pieceBitboards = {piece: 0 for piece in PIECES}  # one int per piece type and color
+        for rows in range(8):
+            for colns in range(8):
+                piece = board[rows][colns]
+                if piece != "--":
+                    self.pieceBitboards[piece] |= 1 << (rows * 8 + colns)
+        self.updateOccupancy()
+
+    '''
+    Recomputes the position key and scores after the board was set up directly (see GameBoard.setFEN).
+    '''
+
+    def positionChanged(self):
+        self.zobristKey = self.computeZobristKey()
+        self.openingScore, self.endgameScore, self.gamePhase = computeScores(self.board)
+
+    '''
+    A copy of the position without the move history (see GameBoard.clone).
+    '''
+
+    def clone(self):
+        gameState = copy.copy(self)
+        gameState.pieceBitboards = dict(self.pieceBitboards)
+        gameState.occupancy = dict(self.occupancy)
+        gameState.legalMoveIndex = None  # a cache, rebuilt on demand: not worth pickling with every clone
+        gameState.legalMoveIndexKey = None
+        rights = self.currentCastlingRights
+        gameState.currentCastlingRights = CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)
+        gameState.resetHistory(self.getPreviousKeys(self.halfmoveClock))
+        return gameState
+
+    '''
+    Rebuilds the occupancy masks from the piece bitboards.
+    '''
+
+    def updateOccupancy(self):
+        bitboards = self.pieceBitboards
+        self.occupancy = {"w": bitboards["wP"] | bitboards["wN"] | bitboards["wB"] | bitboards["wR"] | bitboards["wQ"] | bitboards["wK"],
+                          "b": bitboards["bP"] | bitboards["bN"] | bitboards["bB"] | bitboards["bR"] | bitboards["bQ"] | bitboards["bK"]}
+        self.occupied = self.occupancy["w"] | self.occupancy["b"]
+
+    '''
+    Puts a piece on / takes a piece off / moves a piece between squares, in the bitboards, the position key and the
+    evaluation scores. The piece comes from the move, so nothing has to be looked up.
+    '''
+
+    def putPiece(self, piece, square):
+        bit = 1 << square
+        self.zobristKey ^= ZOBRIST_PIECES[piece][square]
+        self.openingScore += OPENING_SCORES[piece][square]
+        self.endgameScore += ENDGAME_SCORES[piece][square]
+        self.gamePhase += PHASE_WEIGHTS[piece[1]]
+        self.pieceBitboards[piece] |= bit
+        self.occupancy[piece[0]] |= bit
+        self.occupied |= bit
+
+    def removePiece(self, piece, square):
+        bit = 1 << square
+        self.zobristKey ^= ZOBRIST_PIECES[piece][square]
+        self.openingScore -= OPENING_SCORES[piece][square]
+        self.endgameScore -= ENDGAME_SCORES[piece][square]
+        self.gamePhase -= PHASE_WEIGHTS[piece[1]]
+        self.pieceBitboards[piece] ^= bit
+        self.occupancy[piece[0]] ^= bit
+        self.occupied ^= bit
+
+    def movePiece(self, piece, startSquare, endSquare):
+        bits = 1 << startSquare | 1 << endSquare
+        keys = ZOBRIST_PIECES[piece]
+        self.zobristKey ^= keys[startSquare] ^ keys[endSquare]
+        self.openingScore += OPENING_SCORES[piece][endSquare] - OPENING_SCORES[piece][startSquare]
+        self.endgameScore += ENDGAME_SCORES[piece][endSquare] - ENDGAME_SCORES[piece][startSquare]
+        self.pieceBitboards[piece] ^= bits
+        self.occupancy[piece[0]] ^= bits
+        self.occupied ^= bits
+
+    '''
+    Takes a move as a parameter and executes it (including castling, pawn promotion and en-passant).
+    '''
+
+    def makeChessMove(self, move):
+        self.pushState(move)
+        oldCastlingMask = self.currentCastlingRights.getMask()
+        self.zobristKey ^= self.getEnPassantZobrist()
+        pieceMoved = move.pieceMoved
+        startSquare = move.startRow * 8 + move.startCol
+        endSquare = move.endRow * 8 + move.endCol
+        if move.pieceCaptured != "--":
+            if move.isEnpassantMove:
+                self.removePiece(move.pieceCaptured, move.startRow * 8 + move.endCol)  # capturing the pawn that passed
+            else:
+                self.removePiece(move.pieceCaptured, endSquare)
+        if move.isPawnPromotion:
+            self.removePiece(pieceMoved, startSquare)
+            self.putPiece(pieceMoved[0] + move.promotionChoice, endSquare)
+        else:
+            self.movePiece(pieceMoved, startSquare, endSquare)
+
+        if pieceMoved[1] == "K":
+            if pieceMoved[0] == "w":
+                self.whiteKingLocation = (move.endRow, move.endCol)
+            else:
+                self.blackKingLocation = (move.endRow, move.endCol)
+            if move.isCastleMove:
+                if move.endCol - move.startCol == 2:  # king side castling
+                    self.movePiece(pieceMoved[0] + "R", endSquare + 1, endSquare - 1)
+                else:  # queen side castling
+                    self.movePiece(pieceMoved[0] + "R", endSquare - 2, endSquare + 1)
+
+        if pieceMoved[1] == "P" and abs(move.startRow - move.endRow) == 2:  # only for 2 square pawn advance
+            self.enPassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
+        else:
+            self.enPassantPossible = ()
+
+        if pieceMoved[1] == "P" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+
+        if oldCastlingMask:  # once all four rights are gone there is nothing left to take away
+            self.updateCastlingRights(move)
+
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= ZOBRIST_CASTLING[oldCastlingMask] ^ ZOBRIST_CASTLING[self.currentCastlingRights.getMask()] ^ \
+            self.getEnPassantZobrist() ^ ZOBRIST_BLACK_TO_MOVE
+
+    '''
+    Undo the last move made.
+    '''
+
+    def undoMove(self):
+        if self.ply == 0:
+            return
+        self.ply -= 1
+        move = self.moveStack[self.ply]
+        self.whiteToMove = not self.whiteToMove
+        pieceMoved = move.pieceMoved
+        startSquare = move.startRow * 8 + move.startCol
+        endSquare = move.endRow * 8 + move.endCol
+
+        if move.isPawnPromotion:
+            self.removePiece(pieceMoved[0] + move.promotionChoice, endSquare)
+            self.putPiece(pieceMoved, startSquare)
+        else:
+            self.movePiece(pieceMoved, endSquare, startSquare)
+        if move.pieceCaptured != "--":
+            if move.isEnpassantMove:
+                self.putPiece(move.pieceCaptured, move.startRow * 8 + move.endCol)
+            else:
+                self.putPiece(move.pieceCaptured, endSquare)
+
+        if pieceMoved[1] == "K":
+            if pieceMoved[0] == "w":
+                self.whiteKingLocation = (move.startRow, move.startCol)
+            else:
+                self.blackKingLocation = (move.startRow, move.startCol)
+            if move.isCastleMove:
+                if move.endCol - move.startCol == 2:  # king side castling
+                    self.movePiece(pieceMoved[0] + "R", endSquare - 1, endSquare + 1)
+                else:  # queen side castling
+                    self.movePiece(pieceMoved[0] + "R", endSquare + 1, endSquare - 2)
+
+        # putPiece/removePiece/movePiece above changed the key, the one on the undo stack is exact
+        self.restoreState()
+        if not self.whiteToMove:
+            self.fullmoveNumber -= 1
+
+        self.checkMate = False
+        self.staleMate = False
+
+    '''
+    The en passant part of the position key (see GameBoard.getEnPassantZobrist): the file counts only when a pawn
+    of the side to move can reach the en passant square, i.e. stands where an enemy pawn on it would attack.
+    '''
+
+    def getEnPassantZobrist(self):
+        if self.enPassantPossible == ():
+            return 0
+        rows, colns = self.enPassantPossible
+        if self.whiteToMove:
+            pawns = PAWN_ATTACKS["b"][rows * 8 + colns] & self.pieceBitboards["wP"]
+        else:
+            pawns = PAWN_ATTACKS["w"][rows * 8 + colns] & self.pieceBitboards["bP"]
+        return ZOBRIST_EN_PASSANT[colns] if pawns else 0
+
+    '''
+    True if neither side can ever mate (see GameBoard.hasInsufficientMaterial). The piece bitboards are the piece
+    counts here, and they also tell the square colors of the bishops.
+    '''
+
+    def hasInsufficientMaterial(self):
+        bitboards = self.pieceBitboards
+        if bitboards["wP"] | bitboards["bP"] | bitboards["wR"] | bitboards["bR"] | bitboards["wQ"] | bitboards["bQ"]:
+            return False
+        bishops = bitboards["wB"] | bitboards["bB"]
+        minors = bitboards["wN"] | bitboards["bN"] | bishops
+        if minors & (minors - 1) == 0:  # at most one knight or bishop
+            return True
+        return minors == bishops and (bishops & DARK_SQUARES == 0 or bishops & DARK_SQUARES == bishops)
+
+    '''
+    True if the side to move has a knight, bishop, rook or queen (see GameBoard.hasNonPawnMaterial).
+    '''
+
+    def hasNonPawnMaterial(self):
+        allyColor = "w" if self.whiteToMove else "b"
+        bitboards = self.pieceBitboards
+        return bool(self.occupancy[allyColor] & ~(bitboards[allyColor + "P"] | bitboards[allyColor + "K"]))
+
+    '''
+    Updates the castling right that is given to a move (when it is a rook or king move or a rook gets captured).
+    '''
+
+    def updateCastlingRights(self, move):
+        rights = self.currentCastlingRights
+        if move.pieceMoved == "wK":
+            rights.wks = rights.wqs = False
+        elif move.pieceMoved == "bK":
+            rights.bks = rights.bqs = False
+        # a rook leaving its corner or something landing on that corner both end castling on that side
+        for rows, colns in ((move.startRow, move.startCol), (move.endRow, move.endCol)):
+            if (rows, colns) == (7, 0):
+                rights.wqs = False
+            elif (rows, colns) == (7, 7):
+                rights.wks = False
+            elif (rows, colns) == (0, 0):
+                rights.bqs = False
+            elif (rows, colns) == (0, 7):
+                rights.bks = False
+
+    '''
+    Returns a bitboard of every piece (of both colors) attacking the square, given an occupancy.
+    '''
+
+    def attackersTo(self, square, occupied):
+        bitboards = self.pieceBitboards
+        attackers = (PAWN_ATTACKS["b"][square] & bitboards["wP"]) | (PAWN_ATTACKS["w"][square] & bitboards["bP"]) | \
+                    (KNIGHT_ATTACKS[square] & (bitboards["wN"] | bitboards["bN"])) | \
+                    (KING_ATTACKS[square] & (bitboards["wK"] | bitboards["bK"]))
+        # the rays are only followed when a slider stands somewhere on them
+        rooks = ROOK_RAYS[square] & (bitboards["wR"] | bitboards["bR"] | bitboards["wQ"] | bitboards["bQ"])
+        if rooks:
+            attackers |= rookAttacks(square, occupied) & rooks
+        bishops = BISHOP_RAYS[square] & (bitboards["wB"] | bitboards["bB"] | bitboards["wQ"] | bitboards["bQ"])
+        if bishops:
+            attackers |= bishopAttacks(square, occupied) & bishops
+        return attackers
+
+    '''
+    Static exchange evaluation of a capture, the same as GameBoard.staticExchange. Taking a piece that has captured
+    out of the occupancy lets the rook, bishop or queen behind it attack the square (x-ray).
+    '''
+
+    def staticExchange(self, move):
+        square = move.endRow * 8 + move.endCol
+        bitboards = self.pieceBitboards
+        gains = [SEE_VALUES[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0]
+        attackerValue = SEE_VALUES[move.pieceMoved[1]]
+        occupied = self.occupied ^ (1 << (move.startRow * 8 + move.startCol))
+        attackerColor = "b" if move.pieceMoved[0] == "w" else "w"
+        while True:
+            attackers = self.attackersTo(square, occupied) & occupied & self.occupancy[attackerColor]
+            if not attackers:
+                break
+            for pieceType in "PNBRQK":  # least valuable attacker first
+                attacker = attackers & bitboards[attackerColor + pieceType]
+                if attacker:
+                    break
+            gains.append(attackerValue - gains[-1])
+            attackerValue = SEE_VALUES[pieceType]
+            occupied ^= attacker & -attacker  # lowest set bit: one of the attackers of that type
+            attackerColor = "b" if attackerColor == "w" else "w"
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    '''
+    All captures (en passant included) for the quiescence search, most valuable victim / least valuable attacker
+    first (sets isInCheck). Only moves onto enemy pieces are generated.
+    '''
+
+    def getCaptureMoves(self):
+        captures = self.generateMoves(self.occupancy["b" if self.whiteToMove else "w"])
+        captures.sort(key=mvvLvaScore, reverse=True)
+        return captures
+
+    '''
+    This method will determine if the enemy can attack the square rows, colns
+    '''
+
+    def squareUnderAttack(self, rows, colns):
+        enemyColor = "b" if self.whiteToMove else "w"
+        return (self.attackersTo(rows * 8 + colns, self.occupied) & self.occupancy[enemyColor]) != 0
+
+    '''
+    The squares the king of the side to move can go to: not in blocked (its own pieces, plus whatever the caller
+    leaves out) and not attacked. The king is taken off the board for the attack test so it can't hide behind itself.
+    '''
+
+    def getKingTargets(self, kingSquare, blocked, enemies):
+        occupiedWithoutKing = self.occupied ^ (1 << kingSquare)
+        targets = 0
+        for target in squares(KING_ATTACKS[kingSquare] & ~blocked):
+            if not self.attackersTo(target, occupiedWithoutKing) & enemies:
+                targets |= 1 << target
+        return targets
+
+    '''
+    All moves the user can make considering checks. Moves are only generated if they are legal, so nothing has to
+    be removed from the list afterwards.
+    '''
+
+    def getValidMoves(self):
+        moves = self.generateMoves(FULL_BOARD)
+        # either checkmate or stalemate when there are no moves
+        self.checkMate = len(moves) == 0 and self.isInCheck
+        self.staleMate = len(moves) == 0 and not self.isInCheck
+        return moves
+
+    '''
+    The legal moves onto the squares of targetMask (FULL_BOARD for every move, the enemy pieces for captures), and
+    sets isInCheck.
+    '''
+
+    def generateMoves(self, targetMask):
+        moves = []
+        allyColor = "w" if self.whiteToMove else "b"
+        enemyColor = "b" if self.whiteToMove else "w"
+        bitboards = self.pieceBitboards
+        allies = self.occupancy[allyColor]
+        enemies = self.occupancy[enemyColor]
+        occupied = self.occupied
+        kingSquare = bitboards[allyColor + "K"].bit_length() - 1
+        allMoves = targetMask == FULL_BOARD
+
+        checkers = self.attackersTo(kingSquare, occupied) & enemies
+        self.isInCheck = checkers != 0
+        self.addMoves(kingSquare, allyColor + "K", self.getKingTargets(kingSquare, allies | ~targetMask, enemies),
+                      moves)
+
+        if checkers & (checkers - 1) == 0:  # not a double check so other pieces can move too
+            if checkers:  # single check -> capture the checker or block the line between it and the king
+                targetMask &= checkers | BETWEEN[kingSquare][checkers.bit_length() - 1]
+            targetMask &= ~allies
+
+            pinRays = self.getPinRays(kingSquare, allies, enemyColor)
+            self.getPawnMoves(allyColor, targetMask, pinRays, moves)
+            knight = allyColor + "N"
+            for square in squares(bitboards[knight]):
+                if square not in pinRays:  # a pinned knight can never move
+                    self.addMoves(square, knight, KNIGHT_ATTACKS[square] & targetMask, moves)
+            for piece, attacks in ((allyColor + "B", bishopAttacks), (allyColor + "R", rookAttacks),
+                                   (allyColor + "Q", queenAttacks)):
+                for square in squares(bitboards[piece]):
+                    targets = attacks(square, occupied) & targetMask
+                    if square in pinRays:
+                        targets &= pinRays[square]
+                    self.addMoves(square, piece, targets, moves)
+            if not checkers and allMoves:
+                self.getCastlingMoves(allyColor, enemies, moves)
+        return moves
+
+    '''
+    The legal move with the given moveID, or None (see GameBoard.getLegalMove). The bitboard generator makes all the
+    moves in one pass, so this looks the move up in the position's LegalMoveIndex.
+    '''
+
+    def getLegalMove(self, moveID):
+        return self.getLegalMoveIndex().find(moveID)
+
+    '''
+    Pins: an enemy slider lined up with the king with exactly one allied piece in between. Returns {square of the
+    pinned piece: bitboard of the squares it can still move to (between the king and the slider, slider included)}.
+    '''
+
+    def getPinRays(self, kingSquare, allies, enemyColor):
+        bitboards = self.pieceBitboards
+        pinRays = {}
+        snipers = (ROOK_RAYS[kingSquare] & (bitboards[enemyColor + "R"] | bitboards[enemyColor + "Q"])) | \
+                  (BISHOP_RAYS[kingSquare] & (bitboards[enemyColor + "B"] | bitboards[enemyColor + "Q"]))
+        for sniper in squares(snipers):
+            between = BETWEEN[kingSquare][sniper] & self.occupied
+            if between and between & (between - 1) == 0 and between & allies:
+                pinRays[between.bit_length() - 1] = BETWEEN[kingSquare][sniper] | (1 << sniper)
+        return pinRays
+
+    '''
+    Whether the side to move has at least one legal move (sets isInCheck). Like GameBoard.hasLegalMove it stops at
+    the first move: king, knights and sliders only need a non-empty target set, and pawns are generated last.
+    '''
+
+    def hasLegalMove(self):
+        allyColor = "w" if self.whiteToMove else "b"
+        enemyColor = "b" if self.whiteToMove else "w"
+        bitboards = self.pieceBitboards
+        allies = self.occupancy[allyColor]
+        enemies = self.occupancy[enemyColor]
+        occupied = self.occupied
+        kingSquare = bitboards[allyColor + "K"].bit_length() - 1
+
+        checkers = self.attackersTo(kingSquare, occupied) & enemies
+        self.isInCheck = checkers != 0
+        if self.getKingTargets(kingSquare, allies, enemies):
+            return True
+        if checkers & (checkers - 1):  # double check: only the king can move
+            return False
+        if checkers:
+            checkMask = checkers | BETWEEN[kingSquare][checkers.bit_length() - 1]
+        else:
+            checkMask = FULL_BOARD
+
+        pinRays = self.getPinRays(kingSquare, allies, enemyColor)
+        targetMask = ~allies & checkMask
+        for square in squares(bitboards[allyColor + "N"]):
+            if square not in pinRays and KNIGHT_ATTACKS[square] & targetMask:
+                return True
+        for piece, attacks in (("B", bishopAttacks), ("R", rookAttacks), ("Q", queenAttacks)):
+            for square in squares(bitboards[allyColor + piece]):
+                targets = attacks(square, occupied) & targetMask
+                if square in pinRays:
+                    targets &= pinRays[square]
+                if targets:
+                    return True
+        moves = []
+        self.getPawnMoves(allyColor, targetMask, pinRays, moves)
+        return len(moves) > 0
+
+    '''
+    The same stages as GameBoard.getStagedMoves: hash move, captures by MVV-LVA, killer moves, quiet moves. The
+    bitboard generator finds all the legal moves in one pass anyway, so here the stages only put that list in order.
+    '''
+
+    def getStagedMoves(self, hashMoveID=None, killerMoveIDs=(), history=None):
+        moves = self.getValidMoves()
+        byID = {move.moveID: move for move in moves}
+        if hashMoveID in byID:
+            yield byID[hashMoveID]
+        captures = [move for move in moves if move.pieceCaptured != "--" and move.moveID != hashMoveID]
+        captures.sort(key=mvvLvaScore, reverse=True)
+        yield from captures
+        killers = [byID[killerMoveID] for killerMoveID in killerMoveIDs if killerMoveID != hashMoveID and
+                   killerMoveID in byID and byID[killerMoveID].pieceCaptured == "--"]
+        yield from killers
+        quiets = [move for move in moves if move.pieceCaptured == "--" and move.moveID != hashMoveID and
+                  move not in killers]
+        if history is not None:
+            quiets.sort(key=lambda move: history[move.moveID & 0xFFF], reverse=True)
+        yield from quiets
+
+    '''
+    Adds a move of the piece on square to every square in targets. The empty targets are quiet moves; the captured
+    piece of every other target is found by testing it against the enemy bitboards, one piece type at a time.
+    '''
+
+    def addMoves(self, square, piece, targets, moves):
+        startSquare = SQUARE_TUPLES[square]
+        cache = MOVE_CACHE[piece]
+        quiets = targets & ~self.occupied
+        captures = targets ^ quiets
+        quietMoves = cache["--"]
+        while quiets:  # the squares loop of squares() written out, this is the hottest loop of the generator
+            bit = quiets & -quiets
+            quiets ^= bit
+            key = square << 6 | (bit.bit_length() - 1)
+            move = quietMoves.get(key)
+            if move is None:
+                move = quietMoves[key] = Move(startSquare, SQUARE_TUPLES[key & 63], None, pieceMoved=piece,
+                                              pieceCaptured="--")
+            moves.append(move)
+        if captures:
+            bitboards = self.pieceBitboards
+            for captured in CAPTURABLE_PIECES[piece[0]]:
+                victims = captures & bitboards[captured]
+                if victims:
+                    captureMoves = cache[captured]
+                    for target in squares(victims):
+                        move = captureMoves.get(square << 6 | target)
+                        if move is None:
+                            move = captureMoves[square << 6 | target] = Move(startSquare, SQUARE_TUPLES[target], None,
+                                                                             pieceMoved=piece, pieceCaptured=captured)
+                        moves.append(move)
+
+    '''
+    Adds the pawn moves onto targetMask for every pawn of allyColor. Pushes and captures are done for all pawns at
+    once by shifting the whole pawn bitboard; captures are shifted onto one enemy piece type at a time, so the
+    captured piece is known.
+    '''
+
+    def getPawnMoves(self, allyColor, targetMask, pinRays, moves):
+        pawn = allyColor + "P"
+        pawns = self.pieceBitboards[pawn]
+        empty = ~self.occupied & FULL_BOARD
+        if allyColor == "w":
+            forward = -8
+            singlePushes = (pawns >> 8) & empty
+            doublePushes = ((singlePushes & 0xFF0000000000) >> 8) & empty  # pawns that reached row 5 can go to row 4
+            leftAttacks = (pawns & ~FILE_A) >> 9
+            rightAttacks = (pawns & ~FILE_H) >> 7
+        else:
+            forward = 8
+            singlePushes = (pawns << 8) & empty
+            doublePushes = ((singlePushes & 0xFF0000) << 8) & empty
+            leftAttacks = ((pawns & ~FILE_A) << 7) & FULL_BOARD
+            rightAttacks = ((pawns & ~FILE_H) << 9) & FULL_BOARD
+        for target in squares(singlePushes & targetMask):
+            self.addPawnMove(pawn, target - forward, target, "--", pinRays, moves)
+        for target in squares(doublePushes & targetMask):
+            self.addPawnMove(pawn, target - 2 * forward, target, "--", pinRays, moves)
+        if (leftAttacks | rightAttacks) & targetMask & ~empty:
+            bitboards = self.pieceBitboards
+            for captured in CAPTURABLE_PIECES[allyColor]:
+                victims = bitboards[captured] & targetMask
+                for target in squares(leftAttacks & victims):
+                    self.addPawnMove(pawn, target - forward + 1, target, captured, pinRays, moves)
+                for target in squares(rightAttacks & victims):
+                    self.addPawnMove(pawn, target - forward - 1, target, captured, pinRays, moves)
+
+        if self.enPassantPossible != ():
+            target = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+            capturedSquare = target - forward
+            if not targetMask & (1 << target | 1 << capturedSquare):
+                return  # doesn't answer the check (or the captured pawn is left out of targetMask)
+            enemyColor = "b" if allyColor == "w" else "w"
+            kingSquare = self.pieceBitboards[allyColor + "K"].bit_length() - 1
+            for square in squares(PAWN_ATTACKS[enemyColor][target] & pawns):
+                # en passant takes two pieces off one line, so test the king directly instead of using pins/checks
+                occupiedAfter = (self.occupied ^ (1 << square) ^ (1 << capturedSquare)) | (1 << target)
+                if not self.attackersTo(kingSquare, occupiedAfter) & self.occupancy[enemyColor] & ~(1 << capturedSquare):
+                    moves.append(Move(SQUARE_TUPLES[square], SQUARE_TUPLES[target], None, isEnpassantMove=True,
+                                      pieceMoved=pawn, pieceCaptured="--"))
+
+    def addPawnMove(self, pawn, square, target, captured, pinRays, moves):
+        if square in pinRays and not pinRays[square] & (1 << target):
+            return
+        cache = MOVE_CACHE[pawn][captured]
+        key = square << 6 | target
+        move = cache.get(key)
+        if move is None:
+            if target < 8 or target >= 56:  # last row -> one move per promotion piece, cached under the queen's key
+                for i, promotionChoice in enumerate(Move.promotionPieces):
+                    cache[key | i << 12] = Move(SQUARE_TUPLES[square], SQUARE_TUPLES[target], None,
+                                                promotionChoice=promotionChoice, pieceMoved=pawn, pieceCaptured=captured)
+                move = cache[key]
+            else:
+                move = cache[key] = Move(SQUARE_TUPLES[square], SQUARE_TUPLES[target], None, pieceMoved=pawn,
+                                         pieceCaptured=captured)
+        moves.append(move)
+        if move.isPawnPromotion:
+            moves.append(cache[key | 1 << 12])
+            moves.append(cache[key | 2 << 12])
+            moves.append(cache[key | 3 << 12])
+
+    '''
+    Generate all valid castle moves for the king of allyColor and add them to the list of moves (the king is
+    known not to be in check here).
+    '''
+
+    def getCastlingMoves(self, allyColor, enemies, moves):
+        occupied = self.occupied
+        if allyColor == "w":
+            rows, kingSide, queenSide = 7, self.currentCastlingRights.wks, self.currentCastlingRights.wqs
+        else:
+            rows, kingSide, queenSide = 0, self.currentCastlingRights.bks, self.currentCastlingRights.bqs
+        kingSquare = rows * 8 + 4
+        if kingSide and not occupied & (0b11 << (kingSquare + 1)):
+            if not self.attackersTo(kingSquare + 1, occupied) & enemies and \
+                    not self.attackersTo(kingSquare + 2, occupied) & enemies:
+                moves.append(Move((rows, 4), (rows, 6), None, isCastleMove=True, pieceMoved=allyColor + "K",
+                                  pieceCaptured="--"))
+        if queenSide and not occupied & (0b111 << (kingSquare - 3)):
+            if not self.attackersTo(kingSquare - 1, occupied) & enemies and \
+                    not self.attackersTo(kingSquare - 2, occupied) & enemies:
+                moves.append(Move((rows, 4), (rows, 2), None, isCastleMove=True, pieceMoved=allyColor + "K",
+                                  pieceCaptured="--"))
@@ -2,6 +2,133 @@
 This class is where all the information about the current state of a chess game is stored. It will also be where the
 valid moves at the current state are determined. It will also track the moves and make a log of it.
 """
+import copy
+import random
+from array import array
+
+from Chess.ChessEvaluation import SEE_VALUES, computeScores, scoreDelta
+from Chess.ChessMoveOrdering import mvvLvaScore
+
+'''
+Zobrist keys: a random 64-bit number for every (piece, square), for every combination of castling rights, for every
+en passant file and for black to move. The position key (GameBoard.zobristKey) is the XOR of the keys of everything
+in the position, so a move only has to XOR out what changed and XOR in what is new.
+'''
+_zobristRandom = random.Random(2021)  # fixed seed -> the same position always gets the same key
+ZOBRIST_PIECES = {piece: [_zobristRandom.getrandbits(64) for _ in range(64)]  # indexed by rows * 8 + colns
+                  for piece in ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")}
+_castlingKeys = [_zobristRandom.getrandbits(64) for _ in range(4)]  # wks, wqs, bks, bqs
+ZOBRIST_CASTLING = []  # indexed by CastleRights.getMask()
+for _mask in range(16):
+    _key = 0
+    for _bit in range(4):
+        if _mask & (1 << _bit):
+            _key ^= _castlingKeys[_bit]
+    ZOBRIST_CASTLING.append(_key)
+ZOBRIST_EN_PASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]  # indexed by the coln of the en passant square
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+
+'''
+Move tables computed once when the module is imported, indexed by square = rows * 8 + colns. The move generators and
+attack tests walk these lists instead of adding direction offsets and checking the result is still on the board.
+'''
+#               Up      Left     Down    Right     U L      U R      D L     D R
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))  # [0,3] orthogonal, [4,7] diagonal
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def _stepTargets(rows, colns, steps):
+    return tuple((rows + d[0], colns + d[1]) for d in steps if 0 <= rows + d[0] < 8 and 0 <= colns + d[1] < 8)
+
+
+def _ray(rows, colns, d):
+    squares = []
+    endRow, endCol = rows + d[0], colns + d[1]
+    while 0 <= endRow < 8 and 0 <= endCol < 8:
+        squares.append((endRow, endCol))
+        endRow, endCol = endRow + d[0], endCol + d[1]
+    return tuple(squares)
+
+
+KNIGHT_TARGETS = [_stepTargets(sq // 8, sq % 8, KNIGHT_JUMPS) for sq in range(64)]
+KING_TARGETS = [_stepTargets(sq // 8, sq % 8, DIRECTIONS) for sq in range(64)]
+# squares a pawn of that color standing on the square attacks (white pawns capture up the board, black pawns down)
+PAWN_ATTACK_TARGETS = {"w": [_stepTargets(sq // 8, sq % 8, ((-1, -1), (-1, 1))) for sq in range(64)],
+                       "b": [_stepTargets(sq // 8, sq % 8, ((1, -1), (1, 1))) for sq in range(64)]}
+# RAYS[square][j] -> squares in direction DIRECTIONS[j], nearest first, up to the edge of the board
+RAYS = [tuple(_ray(sq // 8, sq % 8, d) for d in DIRECTIONS) for sq in range(64)]
+
+
+def _checkBlockMasks(kingSquare):
+    masks = [1 << sq for sq in range(64)]  # a knight or a pawn can only be captured
+    for ray in RAYS[kingSquare]:
+        mask = 0
+        for endRow, endCol in ray:
+            mask |= 1 << (endRow * 8 + endCol)
+            masks[endRow * 8 + endCol] = mask  # a slider can be captured or blocked on any square in between
+    return masks
+
+
+# CHECK_BLOCK_MASKS[kingSquare][checkerSquare] -> bitmask (bit rows * 8 + colns) of the squares a piece other than the
+# king can move to when the king is in check from checkerSquare: the checking piece and the squares in between
+CHECK_BLOCK_MASKS = [_checkBlockMasks(sq) for sq in range(64)]
+
+
+def _squareMask(squares):
+    mask = 0
+    for endRow, endCol in squares:
+        mask |= 1 << (endRow * 8 + endCol)
+    return mask
+
+
+# the knight, king and pawn tables as bitmasks, for building the map of squares the enemy attacks
+KNIGHT_MASKS = [_squareMask(targets) for targets in KNIGHT_TARGETS]
+KING_MASKS = [_squareMask(targets) for targets in KING_TARGETS]
+PAWN_ATTACK_MASKS = {color: [_squareMask(targets) for targets in PAWN_ATTACK_TARGETS[color]] for color in "wb"}
+FULL_BOARD = (1 << 64) - 1
+
+'''
+Undo stack: what a move can't be undone without (the state before it) is packed into one 64-bit record per ply, kept
+next to the position key from before the move in a preallocated array, two words per ply:
+
+    record = moveID (16 bits) | captured piece (4) << 16 | castling rights mask (4) << 20 | en passant file + 1 (4) << 24
+             | halfmove clock (16) << 28
+    key    = zobristKey before the move
+
+so making and undoing a move only writes and reads one slot instead of appending to and popping several lists.
+'''
+UNDO_STACK_PLIES = 256  # plies preallocated; the stack doubles when a game gets longer
+NULL_MOVE_ID = 0xFFFF  # moveID in the record of a null move
+PIECE_CODES = {"--": 0, "wP": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bP": 7, "bN": 8, "bB": 9, "bR": 10, "bQ": 11, "bK": 12}
+# EN_PASSANT_SQUARES[whiteToMove][en passant file + 1] -> enPassantPossible (the square is behind the pawn that just
+# moved 2 squares, so its row only depends on whose turn it is)
+EN_PASSANT_SQUARES = ([()] + [(5, colns) for colns in range(8)], [()] + [(2, colns) for colns in range(8)])
+# what gameStatus returns
+GAME_ONGOING = "ongoing"
+GAME_CHECKMATE = "checkmate"
+GAME_STALEMATE = "stalemate"
+GAME_REPETITION = "threefold repetition"
+GAME_FIFTY_MOVES = "fifty-move rule"
+GAME_INSUFFICIENT_MATERIAL = "insufficient material"
+FIFTY_MOVE_PLIES = 100  # halfmove clock at which the fifty-move rule draws
+# pawns, rooks and queens: with any of them on the board there is enough material to mate
+MATING_PIECE_CODES = tuple(PIECE_CODES[piece] for piece in ("wP", "wR", "wQ", "bP", "bR", "bQ"))
+
+
+'''
+How many pieces of every kind are on the board, indexed by PIECE_CODES (index 0, the empty square, stays 0).
+'''
+
+
+def countPieces(board):
+    counts = [0] * len(PIECE_CODES)
+    for row in board:
+        for piece in row:
+            if piece != "--":
+                counts[PIECE_CODES[piece]] += 1
+    return counts
+
 
 # Main piece of information about the board is stored here
 class GameBoard():
@@ -26,7 +153,6 @@ class GameBoard():
                               "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
 
         self.whiteToMove = True
-        self.logOfMoves = []
 
         # keeps track of kings to make valid move calculations and simplify castling (rows, colns)
         self.whiteKingLocation = (7, 4)
@@ -37,29 +163,216 @@ class GameBoard():
         self.staleMate = False
 
         self.isInCheck = False
-        self.pins = []
+        self.enemyAttacks = 0  # bitmask of the squares the side not to move attacks, set by getValidMoves
+        self.enemyPieces = 0  # bitmask of the squares the side not to move has pieces on
+        self.pins = [None] * 64  # pins[rows * 8 + colns] -> direction (dRow, dCol) the piece there is pinned along
         self.checks = []
 
         # for En Passant Move
         self.enPassantPossible = ()  # square where en passant capture can happen
-        self.enPassantLogs = [self.enPassantPossible]
 
-        # for castling move
+        # for castling move (one object for the whole game: moves change it in place and undoMove sets it back)
         self.currentCastlingRights = CastleRights(True, True, True, True)
-        # self.castleRightsLog =  [self.currentCastlingRights] # this will pose a problem as we are not copying the
-        # self.currentCastlingRights object we are just storing another reference to it.
-        self.castleRightsLog = [
-            CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs,  # correct way
-                         self.currentCastlingRights.bks, self.currentCastlingRights.bqs)]
+
+        # halfmove clock: plies since the last pawn move or capture (fifty-move rule); fullmove number: starts at 1
+        # and goes up after every black move (both are in FEN)
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+
+        # 64-bit position key, kept up to date by makeChessMove/undoMove
+        self.zobristKey = self.computeZobristKey()
+
+        # moves made so far and the undo stack (see UNDO_STACK_PLIES)
+        self.resetHistory()
+
+        # LegalMoveIndex of the last position getLegalMoveIndex was asked about, and that position's key
+        self.legalMoveIndex = None
+        self.legalMoveIndexKey = None
+
+        # material + piece-square scores (positive = good for white) and game phase, see ChessEvaluation
+        self.openingScore, self.endgameScore, self.gamePhase = computeScores(self.board)
+        # pieces of every kind on the board (see countPieces), kept up to date on captures and promotions
+        self.pieceCounts = countPieces(self.board)
+
+    '''
+    Builds a board (of the class it is called on, so BitBoard.fromFEN works too) from a FEN string.
+    '''
+
+    @classmethod
+    def fromFEN(cls, fen):
+        gameState = cls()
+        gameState.setFEN(fen)
+        return gameState
+
+    '''
+    Sets up the position of a FEN string: piece placement, side to move, castling rights, en passant square,
+    halfmove clock and fullmove number (the last two may be left out, as in EPD). The move history is cleared.
+    '''
+
+    def setFEN(self, fen):
+        fields = fen.split()
+        board = []
+        for rows, rank in enumerate(fields[0].split("/")):
+            boardRow = []
+            for symbol in rank:
+                if symbol.isdigit():
+                    boardRow.extend(["--"] * int(symbol))
+                else:
+                    boardRow.append(("w" if symbol.isupper() else "b") + symbol.upper())
+                    if symbol == "K":
+                        self.whiteKingLocation = (rows, len(boardRow) - 1)
+                    elif symbol == "k":
+                        self.blackKingLocation = (rows, len(boardRow) - 1)
+            board.append(boardRow)
+        self.board = board
+        self.whiteToMove = fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.currentCastlingRights = CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling)
+        self.enPassantPossible = ()
+        if len(fields) > 3 and fields[3] != "-":
+            self.enPassantPossible = (8 - int(fields[3][1]), "abcdefgh".index(fields[3][0]))
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.checkMate = False
+        self.staleMate = False
+        self.resetHistory()
+        self.positionChanged()
+
+    '''
+    Recomputes everything that is normally kept up to date move by move, after the board was set up directly.
+    '''
+
+    def positionChanged(self):
+        self.zobristKey = self.computeZobristKey()
+        self.openingScore, self.endgameScore, self.gamePhase = computeScores(self.board)
+        self.pieceCounts = countPieces(self.board)
+
+    '''
+    The position as a FEN string. The en passant square is written whenever the last move was a 2 square pawn
+    advance, like most programs do.
+    '''
+
+    def toFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == "w" else piece[1].lower()
+            ranks.append(rank + (str(empty) if empty else ""))
+        rights = self.currentCastlingRights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + \
+                   ("q" if rights.bqs else "")
+        enPassant = "-"
+        if self.enPassantPossible != ():
+            enPassant = "abcdefgh"[self.enPassantPossible[1]] + str(8 - self.enPassantPossible[0])
+        return " ".join(["/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)])
+
+    '''
+    A copy of the position that can be searched or sent to another process on its own. Only the position itself is
+    copied (board, king locations, side to move, castling rights, en passant square, move counters, key and scores);
+    the move history is not, so the copy can't undo moves made before it was cloned. The keys of the positions since
+    the last capture or pawn move are kept, so the copy still sees repetitions.
+    '''
+
+    def clone(self):
+        gameState = copy.copy(self)  # shares nothing mutable once the lists below are replaced
+        gameState.board = [row[:] for row in self.board]
+        gameState.moveFunctions = {"P": gameState.getPawnMoves, "R": gameState.getRookMoves,
+                                   "N": gameState.getKnightMoves, "B": gameState.getBishopMoves,
+                                   "Q": gameState.getQueenMoves, "K": gameState.getKingMoves}
+        gameState.pins = self.pins[:]
+        gameState.checks = self.checks[:]
+        gameState.pieceCounts = self.pieceCounts[:]
+        gameState.legalMoveIndex = None  # a cache, rebuilt on demand: not worth pickling with every clone
+        gameState.legalMoveIndexKey = None
+        rights = self.currentCastlingRights
+        gameState.currentCastlingRights = CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)
+        gameState.resetHistory(self.getPreviousKeys(self.halfmoveClock))
+        return gameState
+
+    '''
+    Forgets the moves made so far: the current position becomes the one undoMove stops at. earlierKeys are the keys
+    of the positions before it (oldest first) that repetitions are still looked for in.
+    '''
+
+    def resetHistory(self, earlierKeys=()):
+        self.ply = 0  # number of moves (and null moves) on the undo stack
+        self.moveStack = [None] * UNDO_STACK_PLIES  # the Move objects, logOfMoves is the used part
+        self.undoStack = array("Q", bytes(16 * UNDO_STACK_PLIES))
+        self.earlierKeys = earlierKeys
+
+    '''
+    The keys of (up to) the last count positions before the current one, oldest first.
+    '''
+
+    def getPreviousKeys(self, count):
+        fromStack = min(count, self.ply)
+        earlier = self.earlierKeys[max(len(self.earlierKeys) - (count - fromStack), 0):] if count > fromStack else ()
+        return tuple(earlier) + tuple(self.undoStack[(self.ply - fromStack) * 2 + 1:self.ply * 2:2])
+
+    def growUndoStack(self):
+        self.moveStack.extend([None] * len(self.moveStack))
+        self.undoStack.extend(array("Q", bytes(8 * len(self.undoStack))))
+
+    '''
+    The moves made so far, oldest first (a new list every time; the board itself keeps them in moveStack).
+    '''
+
+    @property
+    def logOfMoves(self):
+        return self.moveStack[:self.ply]
+
+    '''
+    Saves the state a move (None for a null move) is about to change and can't be undone without: castling rights,
+    en passant file, halfmove clock and position key, packed into the move's slot on the undo stack.
+    '''
+
+    def pushState(self, move):
+        ply = self.ply
+        if ply == len(self.moveStack):
+            self.growUndoStack()
+        enPassant = self.enPassantPossible
+        if move is None:
+            record = NULL_MOVE_ID
+        else:
+            record = move.moveID | PIECE_CODES[move.pieceCaptured] << 16
+        self.undoStack[ply * 2] = record | self.currentCastlingRights.getMask() << 20 | \
+            (enPassant[1] + 1 if enPassant else 0) << 24 | self.halfmoveClock << 28
+        self.undoStack[ply * 2 + 1] = self.zobristKey
+        self.moveStack[ply] = move
+        self.ply = ply + 1
+
+    '''
+    Puts back the state saved by pushState for the move in slot self.ply (undoMove has already taken it off the
+    stack and switched whiteToMove back).
+    '''
+
+    def restoreState(self):
+        ply = self.ply
+        record = self.undoStack[ply * 2]
+        self.currentCastlingRights.setMask((record >> 20) & 15)
+        self.enPassantPossible = EN_PASSANT_SQUARES[self.whiteToMove][(record >> 24) & 15]
+        self.halfmoveClock = (record >> 28) & 0xFFFF
+        self.zobristKey = self.undoStack[ply * 2 + 1]
 
     '''
     Takes a move as a parameter and executes it. This will not work for castling, pawn promotion, and en-passant. 
     '''
 
     def makeChessMove(self, move):  # allows player to make move
+        self.pushState(move)  # log the move so we can undo it later; display history of game
+        oldCastlingMask = self.currentCastlingRights.getMask()
+        oldEnPassantKey = self.getEnPassantZobrist()
         self.board[move.startRow][move.startCol] = "--"  # when piece is moved, space on board is empty
         self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.logOfMoves.append(move)  # log the move so we can undo it later; display history of game
         # self.whiteToMove = not self.whiteToMove  # swap players to switch turns
         # update the king's location if moved
         if move.pieceMoved == "wK":
@@ -72,7 +385,7 @@ class GameBoard():
             # if (self.whiteToMove) or (not self.whiteToMove):
             #promotedPiece = input("Enter your choice to Promote : Q, R, B or N : ")
             # else:
-            promotedPiece = "Q"
+            promotedPiece = move.promotionChoice  # a separate move is generated for each piece the pawn can become
             self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
 
         # En-Passant
@@ -85,9 +398,6 @@ class GameBoard():
         else:
             self.enPassantPossible = ()
 
-        # Updating En Passant Logs
-        self.enPassantLogs.append(self.enPassantPossible)
-
         # castle Move
         if move.isCastleMove:
             if move.endCol - move.startCol == 2:  # king side castling
@@ -106,24 +416,106 @@ class GameBoard():
                 self.board[move.endRow][move.endCol - 1] = move.pieceMoved[0] + "R" 
                 '''
 
-        # Update Castling Rights
+        if move.pieceMoved[1] == "P" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+
+        # piece counts: a capture takes a piece off the board, a promotion turns a pawn into another piece
+        if move.pieceCaptured != "--":
+            self.pieceCounts[PIECE_CODES[move.pieceCaptured]] -= 1
+        if move.isPawnPromotion:
+            self.pieceCounts[PIECE_CODES[move.pieceMoved]] -= 1
+            self.pieceCounts[PIECE_CODES[move.pieceMoved[0] + move.promotionChoice]] += 1
+
+        # Update Castling Rights (undoMove gets the old ones back from the undo stack)
         self.updateCastlingRights(move)
-        newCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs,
-                                       self.currentCastlingRights.bks, self.currentCastlingRights.bqs)
-        self.castleRightsLog.append(newCastleRights)
 
         self.whiteToMove = not self.whiteToMove  # swap the turns of the players
 
+        self.updateZobristKey(move, oldCastlingMask, oldEnPassantKey)
+
+        openingDelta, endgameDelta, phaseDelta = scoreDelta(move)
+        self.openingScore += openingDelta
+        self.endgameScore += endgameDelta
+        self.gamePhase += phaseDelta
+
+    '''
+    XORs the changes a move just made into the position key: the moved piece (or the piece it promoted to), the
+    captured piece (taken from beside the end square for en passant), the castling rook, castling rights, the en
+    passant file and the side to move.
+    '''
+
+    def updateZobristKey(self, move, oldCastlingMask, oldEnPassantKey):
+        key = self.zobristKey
+        startSquare = move.startRow * 8 + move.startCol
+        endSquare = move.endRow * 8 + move.endCol
+        key ^= ZOBRIST_PIECES[move.pieceMoved][startSquare]
+        key ^= ZOBRIST_PIECES[self.board[move.endRow][move.endCol]][endSquare]  # moved or promoted piece
+        if move.isEnpassantMove:
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][endSquare]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + "R"
+            if move.endCol - move.startCol == 2:  # king side: rook h -> f
+                key ^= ZOBRIST_PIECES[rook][endSquare + 1] ^ ZOBRIST_PIECES[rook][endSquare - 1]
+            else:  # queen side: rook a -> d
+                key ^= ZOBRIST_PIECES[rook][endSquare - 2] ^ ZOBRIST_PIECES[rook][endSquare + 1]
+        newCastlingMask = self.currentCastlingRights.getMask()
+        if newCastlingMask != oldCastlingMask:
+            key ^= ZOBRIST_CASTLING[oldCastlingMask] ^ ZOBRIST_CASTLING[newCastlingMask]
+        key ^= oldEnPassantKey ^ self.getEnPassantZobrist()
+        self.zobristKey = key ^ ZOBRIST_BLACK_TO_MOVE
+
+    '''
+    The en passant part of the position key. The en passant file is only part of the key when a pawn of the side to
+    move stands next to the pawn that just moved 2 squares, otherwise positions that are really the same (nobody can
+    capture en passant) would get different keys.
+    '''
+
+    def getEnPassantZobrist(self):
+        if self.enPassantPossible == ():
+            return 0
+        passedRow = 3 if self.whiteToMove else 4  # row of the pawn that can be captured
+        colns = self.enPassantPossible[1]
+        allyPawn = "wP" if self.whiteToMove else "bP"
+        if (colns > 0 and self.board[passedRow][colns - 1] == allyPawn) or \
+                (colns < 7 and self.board[passedRow][colns + 1] == allyPawn):
+            return ZOBRIST_EN_PASSANT[colns]
+        return 0
+
+    '''
+    Builds the position key from scratch. Only used when a position is set up (new game or FEN); after that the key
+    is only ever updated by makeChessMove/undoMove.
+    '''
+
+    def computeZobristKey(self):
+        key = 0
+        for rows in range(8):
+            for colns in range(8):
+                piece = self.board[rows][colns]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][rows * 8 + colns]
+        key ^= ZOBRIST_CASTLING[self.currentCastlingRights.getMask()]
+        key ^= self.getEnPassantZobrist()
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key
+
     '''
     Undo the last move made. 
     '''
 
     def undoMove(self):
-        if len(self.logOfMoves) == 0:
+        if self.ply == 0:
             print('No move done at this time. Can\'t UNDO at the start of the game.')
             return
-        if len(self.logOfMoves) != 0:  # make sure there is a move to undo
-            move = self.logOfMoves.pop()  # pop removes the move but also returns it so you have a reference to it
+        if self.ply != 0:  # make sure there is a move to undo
+            self.ply -= 1
+            move = self.moveStack[self.ply]  # the slot stays as it is until the next move overwrites it
             self.board[move.startRow][move.startCol] = move.pieceMoved  # reverse piece that was moved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove  # switch turns back between players
@@ -131,26 +523,13 @@ class GameBoard():
             if move.pieceMoved == "wK":
                 self.whiteKingLocation = (move.startRow, move.startCol)
             elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.endRow, move.endCol)
+                self.blackKingLocation = (move.startRow, move.startCol)
 
             # undo En Passant move
             if move.isEnpassantMove:
                 self.board[move.endRow][move.endCol] = '--'  # removes the pawn that was captured
                 self.board[move.startRow][move.endCol] = move.pieceCaptured  # returns the piece that was captured
 
-            self.enPassantLogs.pop()
-            self.enPassantPossible = self.enPassantLogs[-1]
-
-            # undo castling rights:
-            self.castleRightsLog.pop()  # get rid of last updated castling right in makeChessMove method
-            newCastleRights = self.castleRightsLog[-1]
-            '''Redundant but another way to do it:
-            self.currentCastlingRights.wks = self.castleRightsLog[-1].wks  # update current castling right
-            self.currentCastlingRights.wqs = self.castleRightsLog[-1].wqs  # update current castling right
-            self.currentCastlingRights.bks = self.castleRightsLog[-1].bks  # update current castling right
-            self.currentCastlingRights.bqs = self.castleRightsLog[-1].bqs  # update current castling right'''
-            self.currentCastlingRights = CastleRights(newCastleRights.wks, newCastleRights.bks, newCastleRights.wqs, newCastleRights.bqs)
-
             # undo castling move:
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  # for king side castling
@@ -160,12 +539,59 @@ class GameBoard():
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
                     self.board[move.endRow][move.endCol + 1] = "--"
 
+            # en passant square, castling rights, halfmove clock and key from before the move
+            self.restoreState()
+            if not self.whiteToMove:
+                self.fullmoveNumber -= 1
+
+            openingDelta, endgameDelta, phaseDelta = scoreDelta(move)
+            self.openingScore -= openingDelta
+            self.endgameScore -= endgameDelta
+            self.gamePhase -= phaseDelta
+
+            if move.pieceCaptured != "--":
+                self.pieceCounts[PIECE_CODES[move.pieceCaptured]] += 1
+            if move.isPawnPromotion:
+                self.pieceCounts[PIECE_CODES[move.pieceMoved]] += 1
+                self.pieceCounts[PIECE_CODES[move.pieceMoved[0] + move.promotionChoice]] -= 1
+
             # resets checkmate and stalemate to false
             self.checkMate = False
             self.staleMate = False
 
     '''
-    Updates the castling right that is given to a move (when it is a rook or king move). 
+    Passes the turn without moving a piece (a "null move", used by the search for null-move pruning). Nothing can be
+    captured en passant after it. It takes a slot on the undo stack (with None as the move); undoNullMove takes it back
+    exactly and must come before the next undoMove.
+    '''
+
+    def makeNullMove(self):
+        self.pushState(None)
+        self.zobristKey ^= self.getEnPassantZobrist() ^ ZOBRIST_BLACK_TO_MOVE
+        self.enPassantPossible = ()
+        self.halfmoveClock = 0  # a position after a null move is no repetition of one before it
+        self.whiteToMove = not self.whiteToMove
+
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.ply -= 1
+        self.restoreState()
+
+    '''
+    True if the side to move has a knight, bishop, rook or queen. With only king and pawns zugzwang is common and
+    passing the turn is no test of the position, so the search doesn't try null moves then.
+    '''
+
+    def hasNonPawnMaterial(self):
+        allyColor = "w" if self.whiteToMove else "b"
+        for row in self.board:
+            for piece in row:
+                if piece[0] == allyColor and piece[1] != "P" and piece[1] != "K":
+                    return True
+        return False
+
+    '''
+    Updates the castling right that is given to a move (when it is a rook or king move).
     '''
 
     def updateCastlingRights(self, move):
@@ -204,6 +630,17 @@ class GameBoard():
                 elif move.endCol == 7:
                     self.currentCastlingRights.bks = False
 
+    '''
+    Works out what the piece move generators read for the position: check, pins and checks, the squares the enemy
+    attacks and the squares it has pieces on. Returns the location of the king of the side to move.
+    '''
+
+    def prepareMoveGeneration(self):
+        self.isInCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        # king moves and castling only need to look squares up
+        self.enemyAttacks, self.enemyPieces = self.getEnemySquares()
+        return self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+
     '''
     All moves the user can make considering checks.
     '''
@@ -211,86 +648,168 @@ class GameBoard():
     def getValidMoves(self):
         # tempEnPassant = self.enPassantPossible
         tempCastlingRights = self.currentCastlingRights
-        moves = []
-        self.isInCheck, self.pins, self.checks = self.checkForPinsAndChecks()
-        if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
-        else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
-
-        if self.isInCheck:
-            if len(self.checks) == 1:  # only does 1 check (block check or move king)
-                # 1. generate all possible moves
-                moves = self.getAllPossibleMoves()
-                # to block check -> move piece in-between King and enemy piece Attacking
-                check = self.checks[0]  # check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]  # enemy piece causing the check
-                validSquares = []  # sq. to which we can bring our piece to block the check
-                # if knight then it needs to be captured or move the king
-                if pieceChecking[1] == "N":
-                    validSquares.append((checkRow, checkCol))
-                # other pieces can be blocked
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i)  # check[2] & check[3] are check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:  # once you reach attacking piece stop.
-                            break
-                # 2. for each move, make the move; eliminates any move that doesn't block king or capture the piece
-                for i in range(len(moves) - 1, -1, -1):  # when removing from a list, go backwards through the list to avoid bugs
-                    if moves[i].pieceMoved[1] != "K":  # this move doesn't move the king, it must be a piece capture or block
-                        # print((moves[i].endRow, moves[i].endCol))
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])  # move does not block or capture piece
-            else:  # double checks because it must move the king
-                self.getKingMoves(kingRow, kingCol, moves)
-
-        else:  # not in check so all moves can work
-            moves = self.getAllPossibleMoves()
-
-            # 3. generate all opponent's moves
-            # 4. for each opponent's move, see if they attack you king
-            # self.whiteToMove = not self.whiteToMove  # switch terms  before calling isInCheck because makeChessMoves swtiched the turns
-            # if self.isInCheck():
-            # moves.remove(moves[i])  # 5. if they do attack your king, it's not a valid move
-            # self.whiteToMove = not self.whiteToMove
-            # self.undoMove()
-        if len(moves) == 0:  # either checkmate or stalemate
-            if self.isInCheck:
-                self.checkMate = True
-                if self.whiteToMove:
-                    print("Black Wins!")
-                else:
-                    print("White Wins!")
-            else:
-                self.staleMate = True
-                print("DRAW! (Stalemate)", end=', ')
-                if self.whiteToMove:
-                    print("White does not have any moves")
-                else:
-                    print("Black does not have any moves")
-        else:
-            self.staleMate = False
-            self.checkMate = False
+        kingRow, kingCol = self.prepareMoveGeneration()
+        moves = self.getMovesOnto(kingRow, kingCol)  # evasions only when in check
         self.currentCastlingRights = tempCastlingRights
 
-        # get Updated Castling Moves for black king and white king locations
+        # get Updated Castling Moves for black king and white king locations (before deciding checkmate/stalemate,
+        # castling can be the only legal move)
         self.getCastlingMoves(kingRow, kingCol, moves)
 
+        # either checkmate or stalemate when there are no moves
+        self.checkMate = len(moves) == 0 and self.isInCheck
+        self.staleMate = len(moves) == 0 and not self.isInCheck
+
         # self.enPassantPossible = tempEnPassant
 
         return moves
 
+    '''
+    Whether the side to move has at least one legal move (sets isInCheck like getValidMoves). Stops at the first move
+    it finds: king moves are tried first, then the other pieces one at a time. Castling doesn't have to be looked at:
+    when castling is legal, so is the king's step towards the rook.
+    '''
+
+    def hasLegalMove(self):
+        kingRow, kingCol = self.prepareMoveGeneration()
+        moves = []
+        self.getKingMoves(kingRow, kingCol, moves)
+        if moves:
+            return True
+        if len(self.checks) > 1:  # double check: only the king can move
+            return False
+        targetMask = None
+        if self.isInCheck:
+            targetMask = CHECK_BLOCK_MASKS[kingRow * 8 + kingCol][self.checks[0][0] * 8 + self.checks[0][1]]
+        allyColor = "w" if self.whiteToMove else "b"
+        for rows in range(8):
+            boardRow = self.board[rows]
+            for colns in range(8):
+                piece = boardRow[colns]
+                if piece[0] == allyColor and piece[1] != "K":
+                    self.moveFunctions[piece[1]](rows, colns, moves, targetMask)
+                    if moves:
+                        return True
+        return False
+
+    '''
+    The legal move with the given moveID (the board's own Move object, with the en passant/castling flags set), or
+    None if the move isn't legal here. Only the moves of the piece on the start square are generated.
+    '''
+
+    def getLegalMove(self, moveID):
+        self.prepareMoveGeneration()
+        return self.findLegalMove(moveID)
+
+    '''
+    Whether a move (e.g. one built from a click or read from UCI/PGN input) is legal in this position. Moves compare
+    by moveID, so the move doesn't have to come from the move generators.
+    '''
+
+    def isLegal(self, move):
+        return self.getLegalMove(move.moveID) is not None
+
+    '''
+    The legal moves of the position as a LegalMoveIndex. The index is kept until the position changes (it is looked up
+    by position key), so asking again for the same position, e.g. every frame in ChessMain, costs nothing.
+    '''
+
+    def getLegalMoveIndex(self):
+        if self.legalMoveIndexKey != self.zobristKey:
+            self.legalMoveIndex = LegalMoveIndex(self.getValidMoves())
+            self.legalMoveIndexKey = self.zobristKey
+        return self.legalMoveIndex
+
+    '''
+    GAME_CHECKMATE, GAME_STALEMATE or GAME_ONGOING for the side to move. Sets checkMate and staleMate like
+    getValidMoves, but without generating every move.
+    '''
+
+    def gameStatus(self):
+        hasMove = self.hasLegalMove()
+        self.checkMate = not hasMove and self.isInCheck
+        self.staleMate = not hasMove and not self.isInCheck
+        if self.checkMate:
+            return GAME_CHECKMATE
+        if self.staleMate:
+            return GAME_STALEMATE
+        if self.isRepetition():
+            return GAME_REPETITION
+        if self.halfmoveClock >= FIFTY_MOVE_PLIES:
+            return GAME_FIFTY_MOVES
+        if self.hasInsufficientMaterial():
+            return GAME_INSUFFICIENT_MATERIAL
+        return GAME_ONGOING
+
+    '''
+    Whether the current position was on the board at least `repetitions` times before (2 makes it a threefold
+    repetition). Only the positions since the last capture or pawn move can be the same (the halfmove clock says how
+    far back that was), and only every second one has the same side to move, so the keys on the undo stack are
+    compared two plies at a time. The scan stops at the first position with other castling rights: rights never come
+    back once they are lost.
+    '''
+
+    def isRepetition(self, repetitions=2):
+        key = self.zobristKey
+        castlingMask = self.currentCastlingRights.getMask()
+        undoStack = self.undoStack
+        earlierKeys = self.earlierKeys
+        count = 0
+        for ply in range(self.ply - 2, self.ply - 1 - self.halfmoveClock, -2):
+            if ply >= 0:
+                if (undoStack[ply * 2] >> 20) & 15 != castlingMask:
+                    break
+                if undoStack[ply * 2 + 1] == key:
+                    count += 1
+            elif -ply <= len(earlierKeys):  # before the bottom of the stack (a clone, see resetHistory)
+                if earlierKeys[ply] == key:
+                    count += 1
+            else:
+                break
+            if count >= repetitions:
+                return True
+        return False
+
+    '''
+    True if neither side can ever mate: no pawns, rooks or queens and at most one knight or bishop, or only bishops
+    that all stand on squares of one color. Decided from the piece counts; the board is only looked at for the
+    bishops-only endings.
+    '''
+
+    def hasInsufficientMaterial(self):
+        counts = self.pieceCounts
+        for code in MATING_PIECE_CODES:
+            if counts[code]:
+                return False
+        knights = counts[PIECE_CODES["wN"]] + counts[PIECE_CODES["bN"]]
+        bishops = counts[PIECE_CODES["wB"]] + counts[PIECE_CODES["bB"]]
+        if knights + bishops <= 1:
+            return True
+        if knights:
+            return False
+        squareColors = {(rows + colns) % 2 for rows in range(8) for colns in range(8)
+                        if self.board[rows][colns][1] == "B"}
+        return len(squareColors) == 1
+
+    '''
+    Whether the game is drawn by rule: a repetition (the position was on the board `repetitions` times before; the
+    search passes 1), fifty moves without a capture or pawn move, or too little material to mate. Checkmate on the
+    last ply of the fifty moves still wins.
+    '''
+
+    def isDraw(self, repetitions=2):
+        if self.hasInsufficientMaterial():
+            return True
+        if self.halfmoveClock >= FIFTY_MOVE_PLIES and (self.hasLegalMove() or not self.isInCheck):
+            return True
+        return self.isRepetition(repetitions)
+
     ''' 
     This method returns if a player is pinned or a king is in check
     '''
 
     def checkForPinsAndChecks(self):
-        pins = []  # sq. where allied pinned piece is and the direction of pin
+        pins = [None] * 64  # pin direction of every allied pinned piece by square, None if it isn't pinned
         checks = []  # sq. where enemy is attacking the king
         isInCheck = False
         # basic info
@@ -304,60 +823,91 @@ class GameBoard():
             allyColor = "b"
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
+        kingSquare = startRow * 8 + startCol
         # checks outward from king for pins and checks and keeps track of them
-        #               Up      Left     Down    Right     U L      U R      D L     D R
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for j in range(len(directions)):  # stands for direction => [0,3] -> orthogonal || [4,7] -> diagonal
-            d = directions[j]
+        rays = RAYS[kingSquare]
+        for j in range(8):  # stands for direction => [0,3] -> orthogonal || [4,7] -> diagonal
             possiblePins = ()  # reset possible pins
-            for i in range(1, 8):  # stands for number of squares away
-                endRow = startRow + (d[0] * i)
-                endCol = startCol + (d[1] * i)
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':  # when we call this function from getKingMoves we temp. move king -> this generates a phantom king and actual king is protecting it so we don't want that.
-                        if possiblePins == ():  # 1st piece that too ally -> might be a pin
-                            possiblePins = (endRow, endCol, d[0], d[1])
-                        else:  # 2nd ally piece so no pins or checks in this direction
-                            break
-                    elif endPiece[0] == enemyColor:
-                        pieceType = endPiece[1]
-                        # Five different possibilities here:
-                        # 1) orthogonally away from King, piece is a Rook
-                        # 2) Diagonally away from King, piece -> Bishop
-                        # 3) 1 sq. diagonally away King, piece -> Pawn
-                        # 4) Any Direction away, piece -> Queen
-                        # 5) 1 sq. any direction, piece  -> King
-                        if (0 <= j <= 3 and pieceType == "R") or \
-                                (4 <= j <= 7 and pieceType == "B") or \
-                                (i == 1 and pieceType == "P") and (
-                                (enemyColor == "w" and 6 <= j <= 7) or
-                                (enemyColor == "b" and 4 <= j <= 5)) or \
-                                (pieceType == "Q") or \
-                                (i == 1 and pieceType == "K"):
-                            if possiblePins == ():  # no piece blocking, so check
-                                isInCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:  # there exists possibility of pin
-                                pins.append(possiblePins)
-                                break
-                        else:  # enemy piece not applying check
-                            break
-                else:  # OFF BOARD
-                    break
-        # possible checks from knight moves:
-        knightMoves = [(-1, -2), (-2, -1), (1, -2), (2, -1), (1, 2), (2, 1), (-1, 2), (-2, 1)]
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
+            i = 0  # stands for number of squares away
+            for endRow, endCol in rays[j]:
+                i += 1
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == "N":  # enemy knight attacking king
-                    isInCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+                if endPiece[0] == allyColor:
+                    if possiblePins == ():  # 1st piece that too ally -> might be a pin
+                        possiblePins = (endRow, endCol) + DIRECTIONS[j]
+                    else:  # 2nd ally piece so no pins or checks in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    # Four different possibilities here (pawns are checked with the pawn table below):
+                    # 1) orthogonally away from King, piece is a Rook
+                    # 2) Diagonally away from King, piece -> Bishop
+                    # 3) Any Direction away, piece -> Queen
+                    # 4) 1 sq. any direction, piece  -> King
+                    if (j <= 3 and pieceType == "R") or (j >= 4 and pieceType == "B") or pieceType == "Q" or \
+                            (i == 1 and pieceType == "K"):
+                        if possiblePins == ():  # no piece blocking, so check
+                            isInCheck = True
+                            checks.append((endRow, endCol) + DIRECTIONS[j])
+                        else:  # there exists possibility of pin
+                            pins[possiblePins[0] * 8 + possiblePins[1]] = possiblePins[2:]
+                    break  # an enemy piece ends the ray either way
+        # possible checks from pawns: an enemy pawn checks from the squares our own pawn would capture on
+        enemyPawn = enemyColor + "P"
+        for endRow, endCol in PAWN_ATTACK_TARGETS[allyColor][kingSquare]:
+            if self.board[endRow][endCol] == enemyPawn:
+                isInCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
+        # possible checks from knight moves:
+        enemyKnight = enemyColor + "N"
+        for endRow, endCol in KNIGHT_TARGETS[kingSquare]:
+            if self.board[endRow][endCol] == enemyKnight:  # enemy knight attacking king
+                isInCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
         return isInCheck, pins, checks
 
+    '''
+    Bitmasks (bit rows * 8 + colns) of every square the side not to move attacks and of the squares its pieces are
+    on, computed once per getValidMoves. Rook, bishop and queen rays go through the king of the side to move, so the
+    king can't step back along the line of a check.
+    '''
+
+    def getEnemySquares(self):
+        if self.whiteToMove:
+            enemyColor = "b"
+            allyKing = "wK"
+        else:
+            enemyColor = "w"
+            allyKing = "bK"
+        board = self.board
+        pawnMasks = PAWN_ATTACK_MASKS[enemyColor]
+        attacked = 0
+        occupied = 0
+        for rows in range(8):
+            boardRow = board[rows]
+            for colns in range(8):
+                piece = boardRow[colns]
+                if piece[0] != enemyColor:
+                    continue
+                square = rows * 8 + colns
+                occupied |= 1 << square
+                pieceType = piece[1]
+                if pieceType == "P":
+                    attacked |= pawnMasks[square]
+                elif pieceType == "N":
+                    attacked |= KNIGHT_MASKS[square]
+                elif pieceType == "K":
+                    attacked |= KING_MASKS[square]
+                else:
+                    rays = RAYS[square]
+                    for j in (range(4) if pieceType == "R" else (range(4, 8) if pieceType == "B" else range(8))):
+                        for endRow, endCol in rays[j]:
+                            attacked |= 1 << (endRow * 8 + endCol)  # a defended piece counts as attacked too
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--" and endPiece != allyKing:
+                                break
+        return attacked, occupied
+
     '''
     This method will show if current player is in check or not. 
     '''
@@ -384,58 +934,115 @@ class GameBoard():
         return False
         '''
         # This is the more optimized way. This way takes into account the square you want to move away from and calculates the threat
-        # Max 64 opponents piece, 8 moves per piece = 64 moves total
+        # It walks the precomputed rays, pawn and knight tables from the square outwards
         allyColor = 'w' if self.whiteToMove else 'b'
         enemyColor = 'b' if self.whiteToMove else 'w'
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        underAttack = False
-        for j in range(len(directions)):  # stands for direction => [0,3] -> orthogoal || [4,7] -> diagonal
-            d = directions[j]
-            for i in range(1, 8):  # stands for number of sq. away
-                endRow = rows + (d[0] * i)
-                endCol = colns + (d[1] * i)
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor:
-                        break
-                    elif endPiece[0] == enemyColor:
-                        pieceType = endPiece[1]
-                        # Five different possibilities here:
-                        # 1) orthogonally away from king and piece is a Rook
-                        # 2) Diagonally away from King and piece is a Bishop
-                        # 3) 1 sq. diagonally away from King and piece is a Pawn
-                        # 4) Any Direction away and piece is a Queen
-                        # 5) 1 sq. any direction and piece is a King
-                        if (0 <= j <= 3 and pieceType == 'R') or \
-                                (4 <= j <= 7 and pieceType == 'B') or \
-                                (i == 1 and pieceType == 'P') and (
-                                (enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5)) or \
-                                (pieceType == 'Q') or \
-                                (i == 1 and pieceType == 'K'):
-
-                            return True
-                        else:  # enemy piece not applying check
-                            break
-                else:  # OFF BOARD
-                    break
-        if underAttack:
-            return True
-        # CHECK FOR KNIGHT CHECKS:
-        knightMoves = [(-1, -2), (-2, -1), (1, -2), (2, -1), (1, 2), (2, 1), (-1, 2), (-2, 1)]
-        for m in knightMoves:
-            endRow = rows + m[0]
-            endCol = colns + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N':  # enemy knight attacking king
-                    return True
+        square = rows * 8 + colns
+        board = self.board
+        rays = RAYS[square]
+        for j in range(8):  # stands for direction => [0,3] -> orthogoal || [4,7] -> diagonal
+            i = 0  # stands for number of sq. away
+            for endRow, endCol in rays[j]:
+                i += 1
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    continue
+                if endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    # 1) orthogonally away and piece is a Rook, 2) diagonally away and piece is a Bishop,
+                    # 3) any direction away and piece is a Queen, 4) 1 sq. any direction and piece is a King
+                    if (j <= 3 and pieceType == 'R') or (j >= 4 and pieceType == 'B') or pieceType == 'Q' or \
+                            (i == 1 and pieceType == 'K'):
+                        return True
+                break  # first piece in this direction blocks the rest of the ray
+        # CHECK FOR PAWN AND KNIGHT ATTACKS:
+        enemyPawn = enemyColor + 'P'
+        for endRow, endCol in PAWN_ATTACK_TARGETS[allyColor][square]:
+            if board[endRow][endCol] == enemyPawn:
+                return True
+        enemyKnight = enemyColor + 'N'
+        for endRow, endCol in KNIGHT_TARGETS[square]:
+            if board[endRow][endCol] == enemyKnight:  # enemy knight attacking square
+                return True
         return False
 
+    '''
+    The least valuable piece of attackerColor that attacks the square rows, colns, as (value, (rows, colns)), or None.
+    Works like squareUnderAttack, but the squares in removed count as empty: those pieces already captured on the
+    square during an exchange, and a rook, bishop or queen behind them joins in (x-ray).
+    '''
+
+    def getLeastValuableAttacker(self, rows, colns, attackerColor, removed):
+        board = self.board
+        square = rows * 8 + colns
+        best = None
+        defenderColor = "b" if attackerColor == "w" else "w"
+        # pawns and knights first, a pawn can't be beaten
+        attackerPawn = attackerColor + "P"
+        for endSquare in PAWN_ATTACK_TARGETS[defenderColor][square]:
+            if board[endSquare[0]][endSquare[1]] == attackerPawn and endSquare not in removed:
+                return SEE_VALUES["P"], endSquare
+        attackerKnight = attackerColor + "N"
+        for endSquare in KNIGHT_TARGETS[square]:
+            if board[endSquare[0]][endSquare[1]] == attackerKnight and endSquare not in removed:
+                return SEE_VALUES["N"], endSquare
+        rays = RAYS[square]
+        for j in range(8):
+            i = 0
+            for endSquare in rays[j]:
+                i += 1
+                endPiece = board[endSquare[0]][endSquare[1]]
+                if endPiece == "--" or endSquare in removed:
+                    continue
+                if endPiece[0] == attackerColor:
+                    pieceType = endPiece[1]
+                    if (j <= 3 and pieceType == "R") or (j >= 4 and pieceType == "B") or pieceType == "Q" or \
+                            (i == 1 and pieceType == "K"):
+                        if best is None or SEE_VALUES[pieceType] < best[0]:
+                            best = (SEE_VALUES[pieceType], endSquare)
+                break  # first piece in this direction blocks the rest of the ray
+        return best
+
+    '''
+    Static exchange evaluation: the material the side to move wins (negative: loses) with the capture move when
+    both sides keep recapturing on the end square with their least valuable attacker, and either side can stop when
+    going on would lose more. Nothing is played on the board. Pins are not looked at.
+    '''
+
+    def staticExchange(self, move):
+        rows, colns = move.endRow, move.endCol
+        gains = [SEE_VALUES[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0]
+        attackerValue = SEE_VALUES[move.pieceMoved[1]]  # the piece standing on the square, to be captured next
+        removed = {(move.startRow, move.startCol)}
+        attackerColor = "b" if move.pieceMoved[0] == "w" else "w"
+        while True:
+            attacker = self.getLeastValuableAttacker(rows, colns, attackerColor, removed)
+            if attacker is None:
+                break
+            gains.append(attackerValue - gains[-1])  # what the recapturing side has won if the exchange stops here
+            attackerValue = attacker[0]
+            removed.add(attacker[1])
+            attackerColor = "b" if attackerColor == "w" else "w"
+        for i in range(len(gains) - 1, 0, -1):  # each side only recaptures when that is better than stopping
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    '''
+    All captures (en passant included) for the quiescence search, most valuable victim / least valuable attacker
+    first. Sets isInCheck like getValidMoves; when in check only the captures that answer the check are returned.
+    '''
+
+    def getCaptureMoves(self):
+        kingRow, kingCol = self.prepareMoveGeneration()
+        captures = self.getMovesOnto(kingRow, kingCol, self.enemyPieces)
+        captures.sort(key=mvvLvaScore, reverse=True)
+        return captures
+
     '''
     All moves without taking checks into consideration. This is for moves within both pieces in question. 
     '''
 
-    def getAllPossibleMoves(self):
+    def getAllPossibleMoves(self, targetMask=None):
         moves = []
         for rows in range(len(self.board)):  # rows in the length of board (8)/number of rows
             for colns in range(len(self.board[rows])):  # length of current row that we're looking at
@@ -444,7 +1051,7 @@ class GameBoard():
                 if not (self.whiteToMove ^ (turn == "w")):
                     # if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
                     if piece != "-":
-                        self.moveFunctions[piece](rows, colns, moves)  # call appropriate get piece move function
+                        self.moveFunctions[piece](rows, colns, moves, targetMask)  # call appropriate get piece move function
                     # piece = self.board[rows][colns][1]  # takes a look at the piece so see what kind it is
                     # self.moveFunctions[piece](rows, colns, moves)  # calls the appropriate move function based on piece type
                     '''
@@ -456,117 +1063,107 @@ class GameBoard():
                     '''
         return moves
 
+    '''
+    Moves out of a single check. Pieces other than the king only generate moves onto the squares of the block mask
+    (capture the checking piece or step in between), so no move has to be thrown away afterwards. targetMask can
+    limit the moves further (e.g. to captures).
+    '''
+
+    def getCheckEvasions(self, kingRow, kingCol, check, moves, targetMask=None):
+        blockMask = CHECK_BLOCK_MASKS[kingRow * 8 + kingCol][check[0] * 8 + check[1]]
+        pieceMask = blockMask if targetMask is None else blockMask & targetMask
+        allyColor = "w" if self.whiteToMove else "b"
+        for rows in range(8):
+            boardRow = self.board[rows]
+            for colns in range(8):
+                piece = boardRow[colns]
+                if piece[0] == allyColor and piece[1] != "K":
+                    self.moveFunctions[piece[1]](rows, colns, moves, pieceMask)
+        self.getKingMoves(kingRow, kingCol, moves, targetMask)
+
     '''
     Method to get all the pawn moves for the pawn located in row, colns, and add these moves to the list.
+    targetMask (bitmask of squares, None for any square) limits the moves to those ending on its squares.
     '''
 
-    def getPawnMoves(self, rows, colns, moves):
-        piecePinned = False
-        pinDirection = ()
-        # print((self.pins))
-        for i in range(len(self.pins) - 1, -1, -1):
-            if (self.pins[i][0] == rows and self.pins[i][1] == colns):
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-            # white pawn moves
-        if self.whiteToMove:
-            # checking if square above is empty
-            if self.board[rows - 1][colns] == "--":
-                # if it is we append that as a valid move
-                moves.append(Move((rows, colns), (rows - 1, colns), self.board))
-                # checks if the piece hasn't been moved so it can do a double move
-                if rows == 6 and self.board[rows - 2][colns] == "--":
-                    moves.append(Move((rows, colns), (rows - 2, colns), self.board))
-            # captures to the left
-            if colns - 1 >= 0:
-                if self.board[rows - 1][colns - 1][0] == "b":
-                    moves.append(Move((rows, colns), (rows - 1, colns - 1), self.board))
-                elif (rows - 1, colns - 1) == self.enPassantPossible:
-                    moves.append(Move((rows, colns), (rows - 1, colns - 1), self.board, isEnpassantMove=True))
-            # captures to the right
-            if colns + 1 <= 7:
-                if self.board[rows - 1][colns + 1][0] == "b":
-                    moves.append(Move((rows, colns), (rows - 1, colns + 1), self.board))
-                elif (rows - 1, colns + 1) == self.enPassantPossible:
-                    moves.append(Move((rows, colns), (rows - 1, colns + 1), self.board, isEnpassantMove=True))
-
-        # black pawn moves
-        elif not self.whiteToMove:
-            if self.board[rows + 1][colns] == "--":
-                # checking if square below is empty
-                moves.append(Move((rows, colns), (rows + 1, colns), self.board))
+    def getPawnMoves(self, rows, colns, moves, targetMask=None):
+        pinDirection = self.pins[rows * 8 + colns]
+        piecePinned = pinDirection is not None
+        if self.whiteToMove:  # white pawns move up the board (rows decrease)
+            moveAmount = -1
+            startRow = 6
+            allyColor = "w"
+            enemyColor = "b"
+            kingRow, kingCol = self.whiteKingLocation
+        else:  # black pawns move down the board
+            moveAmount = 1
+            startRow = 1
+            allyColor = "b"
+            enemyColor = "w"
+            kingRow, kingCol = self.blackKingLocation
+
+        # 1 square pawn advance (a pinned pawn can only advance when pinned along its coln)
+        if self.board[rows + moveAmount][colns] == "--":
+            if not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                if targetMask is None or (targetMask >> ((rows + moveAmount) * 8 + colns)) & 1:
+                    self.addPawnMoves((rows, colns), (rows + moveAmount, colns), moves)
                 # checks if the piece hasn't been moved so it can do a double move
-                if rows == 1 and self.board[rows + 2][colns] == "--":
-                    moves.append(Move((rows, colns), (rows + 2, colns), self.board))
-            # captures to the left
-            if colns - 1 >= 0:
-                if self.board[rows + 1][colns - 1][0] == "w":
-                    moves.append(Move((rows, colns), (rows + 1, colns - 1), self.board))
-                elif (rows + 1, colns - 1) == self.enPassantPossible:
-                    moves.append(Move((rows, colns), (rows + 1, colns - 1), self.board, isEnpassantMove=True))
-            # captures to the right
-            if colns + 1 <= 7:
-                if self.board[rows + 1][colns + 1][0] == "w":
-                    moves.append(Move((rows, colns), (rows + 1, colns + 1), self.board))
-                elif (rows + 1, colns + 1) == self.enPassantPossible:
-                    moves.append(Move((rows, colns), (rows + 1, colns + 1), self.board, isEnpassantMove=True))
-        ''' Another way to implement it:
-        if self.whiteToMove and self.board[rows][colns][0] == 'w':  # white pawns moves
-            if self.board[rows - 1][colns] == "--":  # it's [rows-1] because we're going up the board. White pawns are decreasing up the board; 1 square pawn advance
-                if not piecePinned or pinDirection == (-1, 0):
-                    moves.append(Move((rows, colns), (rows - 1, colns), self.board))
-                    if rows == 6 and self.board[rows - 2][colns] == "--":  # 2 square pawn advance
-                        moves.append(Move((rows, colns), (rows - 2, colns), self.board))
-            if colns - 1 >= 0:  # make sure that capture to left side of board (no -1)
-                if self.board[rows - 1][colns - 1][0] == 'b':  # enemy piece to capture (white captures black)
-                    if not piecePinned or pinDirection == (-1, -1):
-                        moves.append(Move((rows, colns), (rows - 1, colns - 1), self.board))  # captures piece located: forward & to the left
-                    elif (rows + 1, colns + 1) == self.enPassantPossible:
-                        moves.append(Move((rows, colns), (rows - 1, colns - 1), self.board, isEnpassantMove=True))
-            if colns + 1 <= 7:  # less than length of board (7); captures to the right side of board
-                if self.board[rows - 1][colns + 1][0] == 'b':
-                    if not piecePinned or pinDirection == (-1, 1):
-                        moves.append(Move((rows, colns), (rows - 1, colns + 1), self.board))
-                    elif (rows - 1, colns + 1) == self.enPassantPossible:
-                        moves.append(Move((rows, colns), (rows - 1, colns + 1), self.board, isEnpassantMove=True))
-        if not self.whiteToMove and self.board[rows][colns][0] == 'b':  # black pawn moves
-            if self.board[rows + 1][colns] == "--":  # 1 square move
-                if not piecePinned or pinDirection == (1, 0):
-                    moves.append(Move((rows, colns), (rows + 1, colns), self.board))
-                    if rows == 1 and self.board[rows + 2][colns] == "--":  # 2 square moves
-                        moves.append(Move((rows, colns), (rows + 2, colns), self.board))
-            # capturing
-            if colns - 1 >= 0:  # capture to the left
-                if not piecePinned or pinDirection == (1, -1):
-                    if self.board[rows + 1][colns - 1][0] == 'w':
-                        moves.append(Move((rows, colns), (rows + 1, colns - 1), self.board))
-                    elif (rows + 1, colns - 1) == self.enPassantPossible:
-                        moves.append(Move((rows, colns), (rows + 1, colns - 1), self.board, isEnpassantMove=True))
-            if colns + 1 <= 7:  # capture to right
-                if not piecePinned or pinDirection == (1, 1):
-                    if self.board[rows + 1][colns + 1][0] == 'w':
-                        moves.append(Move((rows, colns), (rows + 1, colns + 1), self.board))
-                    elif (rows + 1, colns + 1) == self.enPassantPossible:
-                        moves.append(Move((rows, colns), (rows + 1, colns + 1), self.board, isEnpassantMove=True))'''
-        # todo: add pawn promotions later
+                if rows == startRow and self.board[rows + 2 * moveAmount][colns] == "--" and \
+                        (targetMask is None or (targetMask >> ((rows + 2 * moveAmount) * 8 + colns)) & 1):
+                    moves.append(Move((rows, colns), (rows + 2 * moveAmount, colns), self.board))
+        # captures to the left and to the right
+        for endSquare in PAWN_ATTACK_TARGETS[allyColor][rows * 8 + colns]:
+            endCol = endSquare[1]
+            colStep = endCol - colns
+            if not piecePinned or pinDirection == (moveAmount, colStep) or pinDirection == (-moveAmount, -colStep):
+                if self.board[endSquare[0]][endCol][0] == enemyColor:
+                    if targetMask is None or (targetMask >> (endSquare[0] * 8 + endCol)) & 1:
+                        self.addPawnMoves((rows, colns), endSquare, moves)
+                elif endSquare == self.enPassantPossible:
+                    # en passant can answer a check by taking the checking pawn (which isn't on the end square)
+                    if targetMask is not None and not (targetMask >> (endSquare[0] * 8 + endCol)) & 1 and \
+                            not (targetMask >> (rows * 8 + endCol)) & 1:
+                        continue
+                    if not self.enPassantRevealsCheck(rows, colns, endCol, kingRow, kingCol, enemyColor):
+                        moves.append(Move((rows, colns), endSquare, self.board, isEnpassantMove=True,
+                                          pieceMoved=allyColor + "P"))
+
+    '''
+    Adds a pawn move to the list of moves. A pawn reaching the last row gets one move for every piece it can be
+    promoted to.
+    '''
+
+    def addPawnMoves(self, startSquare, endSquare, moves):
+        pieceMoved = self.board[startSquare[0]][startSquare[1]]
+        pieceCaptured = self.board[endSquare[0]][endSquare[1]]
+        if endSquare[0] == 0 or endSquare[0] == 7:
+            for promotionChoice in Move.promotionPieces:
+                moves.append(Move(startSquare, endSquare, self.board, promotionChoice=promotionChoice,
+                                  pieceMoved=pieceMoved, pieceCaptured=pieceCaptured))
+        else:
+            moves.append(Move(startSquare, endSquare, self.board, pieceMoved=pieceMoved, pieceCaptured=pieceCaptured))
+
+    '''
+    En passant takes two pawns off the same row at once. checkForPinsAndChecks only ever finds one piece between
+    the king and a rook/queen, so this checks that row directly.
+    '''
+
+    def enPassantRevealsCheck(self, rows, colns, captureCol, kingRow, kingCol, enemyColor):
+        if kingRow != rows:
+            return False
+        direction = 3 if captureCol > kingCol else 1  # walk right/left from the king past both pawns
+        for endRow, endCol in RAYS[kingRow * 8 + kingCol][direction]:
+            if endCol != colns and endCol != captureCol:
+                endPiece = self.board[endRow][endCol]
+                if endPiece != "--":
+                    return endPiece[0] == enemyColor and (endPiece[1] == "R" or endPiece[1] == "Q")
+        return False
 
     '''
     Method to get all the rook moves for the rook located at row, colns, and add these moves to the list.
     '''
 
-    def getRookMoves(self, rows, colns, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if (self.pins[i][0] == rows and self.pins[i][1] == colns):
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[rows][colns][1] != "Q":  # added because we use the same function for queen
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
+    def getRookMoves(self, rows, colns, moves, targetMask=None):
         enemy_color = "b" if self.whiteToMove else "w"
         ''' 
         you can also say: 
@@ -575,122 +1172,90 @@ class GameBoard():
         else: 
             enemy_color = 'w'
         '''
-        for d in directions:
-            for i in range(1, 8):  # it's really 1-7 but 8 isn't included
-                endRow = rows + d[0] * i
-                endCol = colns + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":  # empty space valid
-                            moves.append(Move((rows, colns), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemy_color:  # enemy piece valid
-                            moves.append(Move((rows, colns), (endRow, endCol), self.board))
-                            break  # can't jump the enemy piece
-                        else:  # friendly piece invalid (can't capture it)
-                            break
-                else:  # square off the board (can't capture)
+        self.getSlidingMoves(rows, colns, (0, 1, 2, 3), enemy_color, moves, targetMask)  # up, left, down, right
+
+    '''
+    Walks the precomputed rays of the given directions (indexes into DIRECTIONS) for a rook, bishop or queen. A
+    pinned piece only walks the rays along its pin.
+    '''
+
+    def getSlidingMoves(self, rows, colns, directionIndexes, enemyColor, moves, targetMask=None):
+        pinDirection = self.pins[rows * 8 + colns]
+        rays = RAYS[rows * 8 + colns]
+        board = self.board
+        startSquare = (rows, colns)
+        piece = board[rows][colns]
+        for j in directionIndexes:
+            d = DIRECTIONS[j]
+            if pinDirection is not None and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
+            for endSquare in rays[j]:  # only squares that are on the board
+                endPiece = board[endSquare[0]][endSquare[1]]
+                if endPiece == "--":  # empty space valid
+                    if targetMask is None or (targetMask >> (endSquare[0] * 8 + endSquare[1])) & 1:
+                        moves.append(Move(startSquare, endSquare, board, pieceMoved=piece, pieceCaptured=endPiece))
+                elif endPiece[0] == enemyColor:  # enemy piece valid
+                    if targetMask is None or (targetMask >> (endSquare[0] * 8 + endSquare[1])) & 1:
+                        moves.append(Move(startSquare, endSquare, board, pieceMoved=piece, pieceCaptured=endPiece))
+                    break  # can't jump the enemy piece
+                else:  # friendly piece invalid (can't capture it)
                     break
 
     '''
     Method to get all the knight moves for the knight located at row, colns, and add these moves to the list.
     '''
 
-    def getKnightMoves(self, rows, colns, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if (self.pins[i][0] == rows and self.pins[i][1] == colns):
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))  # knight moves in L shape
+    def getKnightMoves(self, rows, colns, moves, targetMask=None):
+        if self.pins[rows * 8 + colns] is not None:  # a pinned knight can never move
+            return
         allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = rows + m[0]
-            endCol = colns + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:  # not an ally piece (empty or enemy piece)
-                        moves.append(Move((rows, colns), (endRow, endCol), self.board))
+        board = self.board
+        startSquare = (rows, colns)
+        piece = allyColor + "N"
+        for endSquare in KNIGHT_TARGETS[rows * 8 + colns]:  # knight moves in L shape that stay on the board
+            endPiece = board[endSquare[0]][endSquare[1]]
+            if endPiece[0] != allyColor and \
+                    (targetMask is None or (targetMask >> (endSquare[0] * 8 + endSquare[1])) & 1):  # empty or enemy
+                moves.append(Move(startSquare, endSquare, board, pieceMoved=piece, pieceCaptured=endPiece))
 
     '''
     Method to get all the bishop moves for the bishop located at row, colns, and add these moves to the list.
     '''
 
-    def getBishopMoves(self, rows, colns, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if (self.pins[i][0] == rows and self.pins[i][1] == colns):
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # 4 diagonals
+    def getBishopMoves(self, rows, colns, moves, targetMask=None):
         enemy_color = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):  # bishop can move max of 7 squares
-                endRow = rows + d[0] * i
-                endCol = colns + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # check to make sure it's on the board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":  # empty space valid
-                            moves.append(Move((rows, colns), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemy_color:  # enemy piece valid
-                            moves.append(Move((rows, colns), (endRow, endCol), self.board))
-                            break  # can't jump the enemy piece
-                        else:  # friendly piece invalid (can't capture it)
-                            break
-                else:  # square off the board (can't capture)
-                    break
+        self.getSlidingMoves(rows, colns, (4, 5, 6, 7), enemy_color, moves, targetMask)  # 4 diagonals
 
     '''
     Method to get all the queen moves for the queen located at row, colns, and add these moves to the list.
     '''
 
-    def getQueenMoves(self, rows, colns, moves):  # great example of abstraction since Queen can move any where on board
-        self.getRookMoves(rows, colns, moves)
-        self.getBishopMoves(rows, colns, moves)
+    def getQueenMoves(self, rows, colns, moves, targetMask=None):  # great example of abstraction since Queen can move any where on board
+        self.getRookMoves(rows, colns, moves, targetMask)
+        self.getBishopMoves(rows, colns, moves, targetMask)
 
     '''
     Method to get all the king moves for the king located at row, colns, and add these moves to the list.
     '''
 
-    def getKingMoves(self, rows, colns, moves):
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+    def getKingMoves(self, rows, colns, moves, targetMask=None):
         allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = rows + kingMoves[i][0]
-            endCol = colns + kingMoves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # not an ally piece (empty or enemy piece)
-                    # temporarily move the king to the new location
-                    if allyColor == "w":
-                        self.whiteKingLocation = (endRow, endCol)
-                    if allyColor == "b":
-                        self.blackKingLocation = (endRow, endCol)
-                    # check for if in check(also checks for pins)
-                    isInCheck, pins, checks = self.checkForPinsAndChecks()
-                    # if not check then valid move
-                    if not isInCheck:
-                        moves.append(Move((rows, colns), (endRow, endCol), self.board))
-                    # place king back in original location
-                    if allyColor == "w":
-                        self.whiteKingLocation = (rows, colns)
-                    if allyColor == "b":
-                        self.blackKingLocation = (rows, colns)
+        enemyAttacks = self.enemyAttacks
+        if targetMask is not None:
+            enemyAttacks |= FULL_BOARD ^ targetMask  # squares outside the mask are left out like attacked ones
+        for endRow, endCol in KING_TARGETS[rows * 8 + colns]:
+            endPiece = self.board[endRow][endCol]
+            # not an ally piece (empty or enemy piece) and not a square the enemy attacks
+            if endPiece[0] != allyColor and not (enemyAttacks >> (endRow * 8 + endCol)) & 1:
+                moves.append(Move((rows, colns), (endRow, endCol), self.board, pieceMoved=allyColor + "K",
+                                  pieceCaptured=endPiece))
 
     '''
     Generate all valid castle moves for the king at (rows, colns) and add them to the list of moves
     '''
 
     def getCastlingMoves(self, rows, colns, moves):  # could add allyColor as a parameter
-        if self.squareUnderAttack(rows, colns):
+        if self.isInCheck:
             return  # you can't castle while in check
         if (self.whiteToMove and self.currentCastlingRights.wks) or \
                 (not self.whiteToMove and self.currentCastlingRights.bks):
@@ -702,14 +1267,171 @@ class GameBoard():
 
     def getKingSideCastleMoves(self, rows, colns, moves):
         if self.board[rows][colns + 1] == "--" and self.board[rows][colns + 2] == "--":
-            if not self.squareUnderAttack(rows, colns + 1) and not self.squareUnderAttack(rows, colns + 2):
+            if not (self.enemyAttacks >> (rows * 8 + colns + 1)) & 3:  # the king passes and lands unattacked
                 moves.append(Move((rows, colns), (rows, colns + 2), self.board, isCastleMove=True))
 
     def getQueenSideCastleMoves(self, rows, colns, moves):
         if self.board[rows][colns - 1] == "--" and self.board[rows][colns - 2] == "--" and self.board[rows][colns - 3] == "--":
-            if not self.squareUnderAttack(rows, colns - 1) and not self.squareUnderAttack(rows, colns - 2):
+            if not (self.enemyAttacks >> (rows * 8 + colns - 2)) & 3:
                 moves.append(Move((rows, colns), (rows, colns - 2), self.board, isCastleMove=True))
 
+    '''
+    Legal moves (without castling) that end on a square of targetMask, or on any square if it is None. Needs
+    prepareMoveGeneration to have been called for the position.
+    '''
+
+    def getMovesOnto(self, kingRow, kingCol, targetMask=None):
+        moves = []
+        if not self.isInCheck:
+            moves = self.getAllPossibleMoves(targetMask)
+        elif len(self.checks) == 1:  # only does 1 check (block check, capture the checking piece or move king)
+            self.getCheckEvasions(kingRow, kingCol, self.checks[0], moves, targetMask)
+        else:  # double checks because it must move the king
+            self.getKingMoves(kingRow, kingCol, moves, targetMask)
+        return moves
+
+    '''
+    The legal move with the given moveID in the position, or None if there is none (e.g. a hash or killer move that
+    was found in another position). Only the moves of the piece on the start square are generated. Needs
+    prepareMoveGeneration to have been called for the position.
+    '''
+
+    def findLegalMove(self, moveID):
+        startRow, startCol = (moveID >> 3) & 7, moveID & 7
+        endRow, endCol = (moveID >> 9) & 7, (moveID >> 6) & 7
+        piece = self.board[startRow][startCol]
+        if piece[0] != ("w" if self.whiteToMove else "b"):
+            return None
+        moves = []
+        if piece[1] == "K":
+            if abs(endCol - startCol) == 2:
+                self.getCastlingMoves(startRow, startCol, moves)
+            else:
+                self.getKingMoves(startRow, startCol, moves, 1 << (endRow * 8 + endCol))
+        elif len(self.checks) > 1:  # double check: only the king can move
+            return None
+        else:
+            # en passant takes a pawn that isn't on the end square, so pawns look at all of their moves
+            targetMask = None if piece[1] == "P" else 1 << (endRow * 8 + endCol)
+            if self.isInCheck:
+                kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+                blockMask = CHECK_BLOCK_MASKS[kingRow * 8 + kingCol][self.checks[0][0] * 8 + self.checks[0][1]]
+                targetMask = blockMask if targetMask is None else targetMask & blockMask
+            self.moveFunctions[piece[1]](startRow, startCol, moves, targetMask)
+        for move in moves:
+            if move.moveID == moveID:
+                return move
+        return None
+
+    '''
+    Staged move generation for the search. Yields the legal moves one at a time, and each stage is only generated
+    when the moves before it are used up, so a node that cuts off early never pays for the rest:
+    1. the hash move (a moveID, e.g. from the transposition table)
+    2. captures, most valuable victim / least valuable attacker first
+    3. the killer moves (moveIDs of quiet moves that caused a cutoff at the same ply elsewhere)
+    4. the remaining quiet moves, highest history score first if a history table (see ChessMoveOrdering) is given
+    The caller makes and undoes moves between the yields, which overwrites the pins, checks and attacked squares of
+    this position, so they are put back before every stage. If nothing is yielded the side to move is mated
+    (isInCheck) or stalemated.
+    '''
+
+    def getStagedMoves(self, hashMoveID=None, killerMoveIDs=(), history=None):
+        kingRow, kingCol = self.prepareMoveGeneration()
+        state = (self.isInCheck, self.pins, self.checks, self.enemyAttacks, self.enemyPieces)
+        yieldedIDs = []  # the hash move, killers and en passant captures, which a later stage can generate again
+        if hashMoveID is not None:
+            hashMove = self.findLegalMove(hashMoveID)
+            if hashMove is not None:
+                yieldedIDs.append(hashMoveID)
+                yield hashMove
+                self.isInCheck, self.pins, self.checks, self.enemyAttacks, self.enemyPieces = state
+
+        captures = self.getMovesOnto(kingRow, kingCol, self.enemyPieces)
+        captures.sort(key=mvvLvaScore, reverse=True)
+        for move in captures:
+            if move.moveID not in yieldedIDs:
+                if move.isEnpassantMove:
+                    yieldedIDs.append(move.moveID)
+                yield move
+        self.isInCheck, self.pins, self.checks, self.enemyAttacks, self.enemyPieces = state
+
+        for killerMoveID in killerMoveIDs:
+            if killerMoveID not in yieldedIDs:
+                killer = self.findLegalMove(killerMoveID)
+                if killer is not None and killer.pieceCaptured == "--":  # captures were all tried already
+                    yieldedIDs.append(killerMoveID)
+                    yield killer
+                    self.isInCheck, self.pins, self.checks, self.enemyAttacks, self.enemyPieces = state
+
+        quiets = self.getMovesOnto(kingRow, kingCol, FULL_BOARD ^ self.enemyPieces)
+        self.getCastlingMoves(kingRow, kingCol, quiets)
+        if history is not None:
+            quiets.sort(key=lambda move: history[move.moveID & 0xFFF], reverse=True)
+        for move in quiets:
+            if move.moveID not in yieldedIDs:
+                yield move
+
+    '''
+    Perft: counts every leaf of the legal move tree depth moves deep. Comparing the count to known results checks
+    getValidMoves/makeChessMove/undoMove, and timing it measures how fast they are.
+    '''
+
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.getValidMoves()
+        if depth == 1:  # bulk count: no need to make the last moves
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.makeChessMove(move)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    '''
+    Divide: perft split up by the first move, returns {move in chess notation: nodes}. Comparing this against another
+    engine shows which move the move generation goes wrong under.
+    '''
+
+    def divide(self, depth):
+        counts = {}
+        for move in self.getValidMoves():
+            self.makeChessMove(move)
+            counts[move.getChessNotation()] = self.perft(depth - 1)
+            self.undoMove()
+        return counts
+
+
+'''
+The legal moves of one position, looked up by moveID or by start square instead of scanning the whole list.
+'''
+
+
+class LegalMoveIndex():
+    def __init__(self, moves):
+        self.moves = moves  # in the order the move generator made them
+        self.movesByID = {}
+        self.movesBySquare = {}  # (rows, colns) of the start square -> the moves of the piece there
+        for move in moves:
+            self.movesByID[move.moveID] = move
+            self.movesBySquare.setdefault((move.startRow, move.startCol), []).append(move)
+
+    def find(self, moveID):  # the legal move with this moveID, or None
+        return self.movesByID.get(moveID)
+
+    def movesFrom(self, square):
+        return self.movesBySquare.get(square, [])
+
+    def __contains__(self, move):
+        return move.moveID in self.movesByID
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
 
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
@@ -718,6 +1440,19 @@ class CastleRights():
         self.wqs = wqs
         self.bqs = bqs
 
+    '''
+    Castling rights packed into 4 bits: wks = 1, wqs = 2, bks = 4, bqs = 8
+    '''
+
+    def getMask(self):
+        return self.wks | (self.wqs << 1) | (self.bks << 2) | (self.bqs << 3)
+
+    def setMask(self, mask):
+        self.wks = bool(mask & 1)
+        self.wqs = bool(mask & 2)
+        self.bks = bool(mask & 4)
+        self.bqs = bool(mask & 8)
+
     '''
 	Overloading the __str__ function to print the updating Castling Rights Properly
 	'''
@@ -749,27 +1484,73 @@ class Move():
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3,
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}  # reversed coln
+    promotionPieces = ("Q", "R", "B", "N")
+
+    # __slots__ -> no per-move __dict__, so the thousands of moves made (and mostly thrown away) per search cost less
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPawnPromotion",
+                 "promotionChoice", "isEnpassantMove", "isCastleMove", "moveID")
 
-    def __init__(self, startSquare, endSquare, board, isEnpassantMove=False, isCastleMove=False):  # a move in chess has start & end square, board allows to store
+    # pieceMoved/pieceCaptured can be passed in by the move generators (they already looked at both squares) so the
+    # board doesn't have to be read again
+    def __init__(self, startSquare, endSquare, board, isEnpassantMove=False, isCastleMove=False, promotionChoice="Q",
+                 pieceMoved=None, pieceCaptured=None):  # a move in chess has start & end square, board allows to store
         # info about the move & validate it)
-        self.startRow = startSquare[0]  # 1st tuple for starting square
-        self.startCol = startSquare[1]  # 2nd tuple for starting square
-        self.endRow = endSquare[0]  # 1st tuple for ending square
-        self.endCol = endSquare[1]  # 2nd tuple for ending square
-        self.pieceMoved = board[self.startRow][self.startCol]  # keeping track of info, hasn't moved yet.
-        self.pieceCaptured = board[self.endRow][self.endCol]  # user wanted to move from this (see lines 32 & 33) startRow/Col to endRow/Col
+        self.startRow, self.startCol = startRow, startCol = startSquare  # tuple for starting square
+        self.endRow, self.endCol = endRow, endCol = endSquare  # tuple for ending square
+        if pieceMoved is None:
+            pieceMoved = board[startRow][startCol]  # keeping track of info, hasn't moved yet.
+        if pieceCaptured is None:
+            pieceCaptured = board[endRow][endCol]  # user wanted to move from this (see lines 32 & 33) startRow/Col to endRow/Col
+        self.pieceMoved = pieceMoved
+        # unique 16 bit move ID: start square (6 bits) | end square (6 bits) << 6 | promotion piece (2 bits) << 12
+        # squares are rows * 8 + colns; a queen promotion has promotion bits 0 so it equals the plain from-to move
+        moveID = startRow << 3 | startCol | endRow << 9 | endCol << 6
         # pawn-promotion
-        self.isPawnPromotion = (self.pieceMoved == "wP" and self.endRow == 0) or (self.pieceMoved == "bP" and self.endRow == 7)
+        self.isPawnPromotion = isPawnPromotion = pieceMoved[1] == "P" and (endRow == 0 or endRow == 7)
+        self.promotionChoice = promotionChoice  # 'Q', 'R', 'B' or 'N'; only used when isPawnPromotion
+        if isPawnPromotion and promotionChoice != "Q":
+            moveID |= self.promotionPieces.index(promotionChoice) << 12
+        self.moveID = moveID
         # en-passant
-        # self.isEnpassantMove = False
         self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = "wP" if self.pieceMoved == "bP" else "bP"
+        if isEnpassantMove:
+            pieceCaptured = "wP" if pieceMoved == "bP" else "bP"
+        self.pieceCaptured = pieceCaptured
 
         # CastleMove
         self.isCastleMove = isCastleMove
 
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol  # gives a unique move ID between 0 - 7777 Ex. if move is 0002 -> move from row 0, coln 0 to row 0, coln 2
+    '''
+    Builds the move with the given moveID in the position on the board (the reverse of moveID). En passant and
+    castling are recognised from the pieces: a pawn moving diagonally onto an empty square, a king moving 2 colns.
+    '''
+
+    @classmethod
+    def fromMoveID(cls, moveID, board):
+        startRow, startCol = (moveID >> 3) & 7, moveID & 7
+        endRow, endCol = (moveID >> 9) & 7, (moveID >> 6) & 7
+        pieceMoved = board[startRow][startCol]
+        isEnpassantMove = pieceMoved[1] == "P" and startCol != endCol and board[endRow][endCol] == "--"
+        isCastleMove = pieceMoved[1] == "K" and abs(endCol - startCol) == 2
+        return cls((startRow, startCol), (endRow, endCol), board, isEnpassantMove=isEnpassantMove,
+                   isCastleMove=isCastleMove, promotionChoice=cls.promotionPieces[moveID >> 12])
+
+    '''
+    The moveID of a move written the way getChessNotation writes it (e2e4, e7e8q), or None if the text isn't a move.
+    '''
+
+    @classmethod
+    def moveIDFromNotation(cls, notation):
+        if len(notation) not in (4, 5) or notation[0] not in cls.filesToCols or notation[2] not in cls.filesToCols or \
+                notation[1] not in cls.ranksToRows or notation[3] not in cls.ranksToRows:
+            return None
+        moveID = cls.ranksToRows[notation[1]] << 3 | cls.filesToCols[notation[0]] | \
+            cls.ranksToRows[notation[3]] << 9 | cls.filesToCols[notation[2]] << 6
+        if len(notation) == 5:
+            if notation[4].upper() not in cls.promotionPieces or notation[1] + notation[3] not in ("78", "21"):
+                return None  # only a pawn step onto the last rank can carry a promotion piece
+            moveID |= cls.promotionPieces.index(notation[4].upper()) << 12
+        return moveID
 
     '''
     Overriding the equals method
@@ -780,6 +1561,9 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):  # equal moves have equal IDs, so moves can be used in sets and as dictionary keys
+        return self.moveID
+
     def getChessNotation(self):  # returns rankFileNotation (not real chess notation (file[a-h] then rank[1-8]) for the move
         '''
         Another way to do it:
@@ -805,7 +1589,10 @@ class Move():
                 return self.getRankFile(self.endRow, self.endCol)
             else:
                 return self.pieceMoved[1] + self.getRankFile(self.endRow, self.endCol) '''
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionChoice.lower()  # e7e8q
+        return notation
 
     def getRankFile(self, rows, colns):  # helper method for getChessNotation; takes rank & file for 1 square
         return self.colsToFiles[colns] + self.rowsToRanks[rows]
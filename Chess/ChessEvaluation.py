@@ -0,0 +1,168 @@
+"""
+Evaluation terms that GameBoard and BitBoard keep up to date as moves are made and undone, so evaluating a position
+in the search doesn't have to look at all 64 squares.
+
+Every piece on a square is worth its material value plus a piece-square table bonus, once with the opening tables and
+once with the endgame tables. The game phase (how much of the non-pawn material is still on the board) blends the two
+sums: with everything on the board the opening score counts, with only kings and pawns left the endgame score counts.
+"""
+
+PIECE_VALUES = {"K": 0, "Q": 900, "R": 500, "B": 330, "N": 320, "P": 100}
+
+# piece values for static exchange evaluation; the king is worth more than everything else so a capture sequence never
+# ends with the king being taken
+SEE_VALUES = dict(PIECE_VALUES, K=20000)
+
+# how much each piece adds to the game phase; the start position has MAX_PHASE
+PHASE_WEIGHTS = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "P": 0}
+MAX_PHASE = 24
+
+# Piece-square tables from white's point of view, written the way the board is printed (row 0 is black's back rank).
+# Black uses the same tables flipped upside down.
+PIECE_SQUARE_TABLES = {
+    "P": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [50, 50, 50, 50, 50, 50, 50, 50],
+          [10, 10, 20, 30, 30, 20, 10, 10],
+          [5, 5, 10, 25, 25, 10, 5, 5],
+          [0, 0, 0, 20, 20, 0, 0, 0],
+          [5, -5, -10, 0, 0, -10, -5, 5],
+          [5, 10, 10, -20, -20, 10, 10, 5],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    "N": [[-50, -40, -30, -30, -30, -30, -40, -50],
+          [-40, -20, 0, 0, 0, 0, -20, -40],
+          [-30, 0, 10, 15, 15, 10, 0, -30],
+          [-30, 5, 15, 20, 20, 15, 5, -30],
+          [-30, 0, 15, 20, 20, 15, 0, -30],
+          [-30, 5, 10, 15, 15, 10, 5, -30],
+          [-40, -20, 0, 5, 5, 0, -20, -40],
+          [-50, -40, -30, -30, -30, -30, -40, -50]],
+    "B": [[-20, -10, -10, -10, -10, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 10, 10, 5, 0, -10],
+          [-10, 5, 5, 10, 10, 5, 5, -10],
+          [-10, 0, 10, 10, 10, 10, 0, -10],
+          [-10, 10, 10, 10, 10, 10, 10, -10],
+          [-10, 5, 0, 0, 0, 0, 5, -10],
+          [-20, -10, -10, -10, -10, -10, -10, -20]],
+    "R": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [5, 10, 10, 10, 10, 10, 10, 5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [0, 0, 0, 5, 5, 0, 0, 0]],
+    "Q": [[-20, -10, -10, -5, -5, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 5, 5, 5, 0, -10],
+          [-5, 0, 5, 5, 5, 5, 0, -5],
+          [0, 0, 5, 5, 5, 5, 0, -5],
+          [-10, 5, 5, 5, 5, 5, 0, -10],
+          [-10, 0, 5, 0, 0, 0, 0, -10],
+          [-20, -10, -10, -5, -5, -10, -10, -20]],
+    "K": [[-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-20, -30, -30, -40, -40, -30, -30, -20],
+          [-10, -20, -20, -20, -20, -20, -20, -10],
+          [20, 20, 0, 0, 0, 0, 20, 20],
+          [20, 30, 10, 0, 0, 10, 30, 20]],
+}
+
+# In the endgame the king should come to the centre and passed pawns should run; the other pieces keep their tables.
+ENDGAME_PIECE_SQUARE_TABLES = dict(PIECE_SQUARE_TABLES)
+ENDGAME_PIECE_SQUARE_TABLES["P"] = [[0, 0, 0, 0, 0, 0, 0, 0],
+                                    [80, 80, 80, 80, 80, 80, 80, 80],
+                                    [50, 50, 50, 50, 50, 50, 50, 50],
+                                    [30, 30, 30, 30, 30, 30, 30, 30],
+                                    [20, 20, 20, 20, 20, 20, 20, 20],
+                                    [10, 10, 10, 10, 10, 10, 10, 10],
+                                    [10, 10, 10, 10, 10, 10, 10, 10],
+                                    [0, 0, 0, 0, 0, 0, 0, 0]]
+ENDGAME_PIECE_SQUARE_TABLES["K"] = [[-50, -40, -30, -20, -20, -30, -40, -50],
+                                    [-30, -20, -10, 0, 0, -10, -20, -30],
+                                    [-30, -10, 20, 30, 30, 20, -10, -30],
+                                    [-30, -10, 30, 40, 40, 30, -10, -30],
+                                    [-30, -10, 30, 40, 40, 30, -10, -30],
+                                    [-30, -10, 20, 30, 30, 20, -10, -30],
+                                    [-30, -30, 0, 0, 0, 0, -30, -30],
+                                    [-50, -30, -30, -30, -30, -30, -30, -50]]
+
+
+def _squareScores(piece, tables):
+    value = PIECE_VALUES[piece[1]]
+    table = tables[piece[1]]
+    if piece[0] == "w":
+        return [value + table[sq // 8][sq % 8] for sq in range(64)]
+    return [-(value + table[7 - sq // 8][sq % 8]) for sq in range(64)]
+
+
+# OPENING_SCORES[piece][rows * 8 + colns] -> material + table bonus of the piece on that square, positive for white
+# pieces and negative for black ones, so the score of a position is just the sum over its pieces
+OPENING_SCORES = {piece: _squareScores(piece, PIECE_SQUARE_TABLES)
+                  for piece in ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")}
+ENDGAME_SCORES = {piece: _squareScores(piece, ENDGAME_PIECE_SQUARE_TABLES) for piece in OPENING_SCORES}
+
+'''
+Opening score, endgame score and game phase of a board from scratch. Only used when a position is set up; after that
+makeChessMove/undoMove keep the three numbers up to date.
+'''
+
+
+def computeScores(board):
+    openingScore = 0
+    endgameScore = 0
+    gamePhase = 0
+    for rows in range(8):
+        for colns in range(8):
+            piece = board[rows][colns]
+            if piece != "--":
+                openingScore += OPENING_SCORES[piece][rows * 8 + colns]
+                endgameScore += ENDGAME_SCORES[piece][rows * 8 + colns]
+                gamePhase += PHASE_WEIGHTS[piece[1]]
+    return openingScore, endgameScore, gamePhase
+
+
+'''
+How much a move changes (openingScore, endgameScore, gamePhase): the moved piece leaves its start square, the piece
+that lands (the promoted piece for a promotion) is added on the end square, the captured piece (beside the end square
+for en passant) is removed and a castling rook moves. makeChessMove adds it and undoMove subtracts it.
+'''
+
+
+def scoreDelta(move):
+    startSquare = move.startRow * 8 + move.startCol
+    endSquare = move.endRow * 8 + move.endCol
+    pieceMoved = move.pieceMoved
+    pieceLanded = pieceMoved[0] + move.promotionChoice if move.isPawnPromotion else pieceMoved
+    openingDelta = OPENING_SCORES[pieceLanded][endSquare] - OPENING_SCORES[pieceMoved][startSquare]
+    endgameDelta = ENDGAME_SCORES[pieceLanded][endSquare] - ENDGAME_SCORES[pieceMoved][startSquare]
+    phaseDelta = PHASE_WEIGHTS[pieceLanded[1]] - PHASE_WEIGHTS[pieceMoved[1]]
+    pieceCaptured = move.pieceCaptured
+    if pieceCaptured != "--":
+        captureSquare = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSquare
+        openingDelta -= OPENING_SCORES[pieceCaptured][captureSquare]
+        endgameDelta -= ENDGAME_SCORES[pieceCaptured][captureSquare]
+        phaseDelta -= PHASE_WEIGHTS[pieceCaptured[1]]
+    if move.isCastleMove:
+        rook = pieceMoved[0] + "R"
+        if move.endCol - move.startCol == 2:  # king side: rook h -> f
+            rookStart, rookEnd = endSquare + 1, endSquare - 1
+        else:  # queen side: rook a -> d
+            rookStart, rookEnd = endSquare - 2, endSquare + 1
+        openingDelta += OPENING_SCORES[rook][rookEnd] - OPENING_SCORES[rook][rookStart]
+        endgameDelta += ENDGAME_SCORES[rook][rookEnd] - ENDGAME_SCORES[rook][rookStart]
+    return openingDelta, endgameDelta, phaseDelta
+
+
+'''
+Blends the opening and endgame scores by the game phase. Positive is good for white. Promotions can take the phase
+above MAX_PHASE, which then just counts as the opening.
+'''
+
+
+def taperedScore(openingScore, endgameScore, gamePhase):
+    if gamePhase > MAX_PHASE:
+        gamePhase = MAX_PHASE
+    return (openingScore * gamePhase + endgameScore * (MAX_PHASE - gamePhase)) // MAX_PHASE
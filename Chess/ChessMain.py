@@ -4,6 +4,8 @@ This is the main driver file responsible for handling user input and displaying
 import sys
 import pygame as pg
 from Chess import ChessEngine # This is so there is access to the board/game state
+from Chess import ChessBitboard # same game state kept in bitboards (faster move generation)
+from Chess import ChessAIProcess # computer player, searching in a background process
 # pg.init() you can initilize game up here as well but if you do, delete line font init below and pg init in the main
 pg.font.init()
 
@@ -18,6 +20,9 @@ MOVE_LOG_PANEL_HEIGHT = HEIGHT
 MOVE_LOG = True
 MOVE_LOG_FONT = pg.font.SysFont('Arial', 16, False, False, None)
 IMAGES = {}  # Dictionary of imagesForChessPieces of the chess pieces
+USE_BITBOARDS = False  # True -> game state is a ChessBitboard.BitBoard instead of a ChessEngine.GameBoard
+AI_THINKING_TIME = 1.0  # seconds the computer player searches for each move
+THINKING_FONT = pg.font.SysFont('Arial', 16, True, False, None)
 
 ''' 
 Initializing a global dictionary of imagesForChessPieces. This will be called exactly once in the main so it does not load multiple 
@@ -32,6 +37,18 @@ def load_images():
     # Note: An image can also be accessed by saying 'IMAGES['wP']' etc.
 
 
+'''
+Creates a new game state at the starting position using the backend picked by USE_BITBOARDS. Both backends have the
+same makeChessMove/undoMove/getValidMoves methods and board/logOfMoves variables.
+'''
+
+
+def newGameState():
+    if USE_BITBOARDS:
+        return ChessBitboard.BitBoard()
+    return ChessEngine.GameBoard()
+
+
 '''
 This the main driver for the code which will take care of the user input and updating the graphics.
 '''
@@ -42,8 +59,8 @@ def main():
     screen = pg.display.set_mode((WIDTH + MOVE_LOG_PANEL_HEIGHT, HEIGHT))  # Screen variable
     clock = pg.time.Clock()  # creating the clock to keep track of time
     screen.fill(pg.Color("white"))  # filling screen with white background color
-    game_state = ChessEngine.GameBoard()  # creating a game_state object calling the constructor GameState()
-    validMoves = game_state.getValidMoves()  # able to see list of moves user made and see if its in list of valid moves engine generated & then can only make those moves
+    game_state = newGameState()  # creating a game_state object calling the constructor GameState()
+    legalMoves = game_state.getLegalMoveIndex()  # moves of the user are looked up in here by moveID & then can only make those moves
     moveMade = False  # flag variable for when a move is made (then make a new set of validmoves, else don't regenerate validmoves function)
     load_images()  # only doing this once before the while loop
     running = True
@@ -51,14 +68,18 @@ def main():
     squareSelected = () # keeps track of the last click of the user (tuple: row and coln); no square selected initially
     playerClicks = [] # keeps track of the player clicks (2 tuples: [(6,4), (4,4)]) <- moving white pawn from one location to next
     playerOne = True  # if Human is playing white -> this will be true
-    playerTwo = True  # if Human is playing black -> this will be true
+    playerTwo = False  # if Human is playing black -> this will be true (False -> the computer plays black)
     gameOver = False  # True in case of Checkmate and Stalemate
+    status = game_state.gameStatus()  # ChessEngine.GAME_ONGOING/GAME_CHECKMATE/GAME_STALEMATE, updated after every move
+    # the computer searches in another process; the loop below only polls it, so the window never freezes
+    computerPlayer = ChessAIProcess.AIWorker(timeLimit=AI_THINKING_TIME)
 
     while running:
             humanTurn = (game_state.whiteToMove and playerOne) or (not game_state.whiteToMove and playerTwo)
             for a in pg.event.get():
                 if a.type == pg.QUIT:  # so the game exits when the user quits it
                     running = False
+                    computerPlayer.close()
                     pg.quit()
                     sys.exit()
                 # mouse handler
@@ -79,41 +100,61 @@ def main():
                             if len(playerClicks) == 2 and humanTurn: # len of player clicks after 2nd click
                                 move = ChessEngine.Move(playerClicks[0], playerClicks[1], game_state.board)
                                 #to check: print(move.getChessNotation())
-                                for i in range(len(validMoves)):
-                                    if move == validMoves[i]:
-                                        game_state.makeChessMove(validMoves[i]) #makes moves
-                                        moveMade = True
-                                        animate = True
-                                        squareSelected = ()  # reset user clicks
-                                        playerClicks = []  # reset player clicks
+                                legalMove = legalMoves.find(move.moveID)  # the board's own move (en passant/castling flags set)
+                                if legalMove is not None:
+                                    game_state.makeChessMove(legalMove) #makes moves
+                                    moveMade = True
+                                    animate = True
+                                    squareSelected = ()  # reset user clicks
+                                    playerClicks = []  # reset player clicks
                                 if not moveMade:  # invalid move or if a user did a 2nd click on another piece
                                     playerClicks = [squareSelected]  # instead or resetting clicks, this resets the click to current square selection
                 #key handler
                 elif a.type == pg.KEYDOWN:  # this event fires everytime a user pushes a key; it records that key
                     if a.key == pg.K_z:  # undo when 'z' is pressed
+                        computerPlayer.cancel()  # the position it was thinking about is gone
                         game_state.undoMove()
+                        if humanTurn and playerOne != playerTwo and len(game_state.logOfMoves) > 0:  # the computer has replied: take back the human's move too
+                            game_state.undoMove()
                         animate = False
                         gameOver = False
-                        moveMade = True # another option "validMoves = game_state.getValidMoves()"
+                        moveMade = True # another option "legalMoves = game_state.getLegalMoveIndex()"
                     if a.key == pg.K_r:  # reset the game if 'r' is pressed
-                        game_state = ChessEngine.GameBoard()
+                        computerPlayer.cancel()
+                        game_state = newGameState()
                         sqSelected = ()
                         playerClicks = []
                         moveMade = False
                         animate = False
                         gameOver = False
-                        validMoves = game_state.getValidMoves()
+                        legalMoves = game_state.getLegalMoveIndex()
+                        status = game_state.gameStatus()
+            # computer player's turn: start the search once, then check every frame whether the move is there
+            if not gameOver and not humanTurn and not moveMade:
+                if not computerPlayer.thinking:
+                    computerPlayer.start(game_state)
+                else:
+                    computerMove = computerPlayer.poll()
+                    if computerMove is not None:
+                        legalMove = legalMoves.find(computerMove.moveID)  # it came from another process: play our own copy
+                        if legalMove is not None:
+                            game_state.makeChessMove(legalMove)
+                            moveMade = True
+                            animate = True
             if moveMade: # generates new set of valid moves and sets flag back to false
                     if len(game_state.logOfMoves) > 0 and animate:
                         animate = False
                         moveMade = False
                         animateMove(game_state.logOfMoves[-1], screen, game_state.board, clock)
-                    validMoves = game_state.getValidMoves()
-                    #moveMade = False
-            drawStateOfGame(screen, game_state, squareSelected, validMoves)
+                    legalMoves = game_state.getLegalMoveIndex()
+                    moveMade = False  # so the next move (human or computer) can be made
+                    status = game_state.gameStatus()
+            drawStateOfGame(screen, game_state, squareSelected, legalMoves)
+            if computerPlayer.thinking:
+                drawThinkingIndicator(screen)
 
             #Print Checkmate
-            if game_state.checkMate:
+            if status == ChessEngine.GAME_CHECKMATE:
                 gameOver = True
                 if game_state.whiteToMove:
                     drawEndGameText(screen, "Black Won by Checkmate!");
@@ -121,10 +162,15 @@ def main():
                     drawEndGameText(screen, "White Won by Checkmate!");
 
             #Print Stalemate
-            elif game_state.staleMate:
+            elif status == ChessEngine.GAME_STALEMATE:
                 gameOver = True
                 drawEndGameText(screen, "Draw due to Stalemate!")
 
+            #Print the other draws (repetition, fifty-move rule, insufficient material)
+            elif status != ChessEngine.GAME_ONGOING:
+                gameOver = True
+                drawEndGameText(screen, "Draw due to " + status + "!")
+
             clock.tick(MAX_FPS)
             pg.display.flip()
 # pg.display.quit()
@@ -135,9 +181,9 @@ This method holds all of the graphics within the current state of a game.
 '''
 
 
-def drawStateOfGame(screen, game_state, squareSelected, validMoves):
+def drawStateOfGame(screen, game_state, squareSelected, legalMoves):
     drawBoard(screen)  # draws the squares on the board
-    highlightSquares(screen, game_state, squareSelected, validMoves)
+    highlightSquares(screen, game_state, squareSelected, legalMoves)
     if len(game_state.logOfMoves) > 0:
         highlightLastMove(screen, game_state.logOfMoves[-1])
     drawPieces(screen, game_state.board)  # draws the pieces on top of the squares
@@ -158,12 +204,13 @@ def drawBoard(screen):
 '''
 For highlighting the correct square of selected piece and the squares it can move to
 '''
-def highlightSquares(screen, game_state, squareSelected, validMoves):
+def highlightSquares(screen, game_state, squareSelected, legalMoves):
     if squareSelected != ():
         rows, colns = squareSelected
         enemyColor = 'b' if game_state.whiteToMove else 'w'
         allyColor = 'w' if game_state.whiteToMove else 'b'
-        if game_state.board[rows][colns][0] == allyColor:
+        board = game_state.board  # read once: a BitBoard builds it from its bitboards every time
+        if board[rows][colns][0] == allyColor:
             #Highlighting the selected Square
             s = pg.Surface((SQUARE_SIZE, SQUARE_SIZE))
             s.set_alpha(100)		# transparency value -> 0 : 100% transparent | 255 : 100% Opaque
@@ -172,12 +219,11 @@ def highlightSquares(screen, game_state, squareSelected, validMoves):
 
             #Highlighting the valid move squares
             s.fill(pg.Color('yellow'))
-            for move in validMoves:
-                if move.startRow == rows and move.startCol == colns:
-                    endRow = move.endRow
-                    endCol = move.endCol
-                    if game_state.board[endRow][endCol] == '--' or game_state.board[endRow][endCol][0] == enemyColor:
-                        screen.blit(s, (endCol * SQUARE_SIZE, endRow * SQUARE_SIZE))
+            for move in legalMoves.movesFrom(squareSelected):  # only the selected piece's moves, not the whole list
+                endRow = move.endRow
+                endCol = move.endCol
+                if board[endRow][endCol] == '--' or board[endRow][endCol][0] == enemyColor:
+                    screen.blit(s, (endCol * SQUARE_SIZE, endRow * SQUARE_SIZE))
 
 '''
 This method will highlight the last move
@@ -258,6 +304,15 @@ def animateMove(move, screen, board, clock):
         pg.display.flip()
         clock.tick(60)
 
+'''
+Shows that the computer is thinking, at the bottom of the move log panel. The dots move with the clock, so it also
+shows the window is still being redrawn every frame.
+'''
+def drawThinkingIndicator(screen):
+    dots = "." * (pg.time.get_ticks() // 300 % 4)
+    textObject = THINKING_FONT.render("Computer is thinking" + dots, True, pg.Color('yellow'))
+    screen.blit(textObject, (WIDTH + 5, MOVE_LOG_PANEL_HEIGHT - textObject.get_height() - 5))
+
 '''
 This method will write text in the middle of the screen!
 '''
@@ -0,0 +1,80 @@
+"""
+Move ordering for the search in ChessAI. Alpha-beta only cuts off once a good enough move has been searched, so the
+sooner the best move comes up the fewer nodes are searched. The staged move generators (GameBoard.getStagedMoves,
+BitBoard.getStagedMoves) put the hash move first and then use what is kept here:
+
+- captures are ordered MVV-LVA (most valuable victim, least valuable attacker)
+- killer moves: per ply, the last 2 quiet moves that caused a cutoff; a move that refutes one line often refutes the
+  sibling lines at the same ply too
+- history table: for every (from square, to square) the sum of depth * depth of the cutoffs the quiet move caused
+  anywhere in the tree, used to order the remaining quiet moves
+"""
+
+# MVV-LVA: captures of bigger pieces first, and of the same piece with the cheapest attacker first, because losing the
+# attacker to a recapture then costs the least
+ORDERING_VALUES = {"P": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6}
+
+KILLER_SLOTS = 2
+HISTORY_SIZE = 64 * 64  # indexed by moveID & 0xFFF, i.e. from square | to square << 6
+HISTORY_MAX = 1 << 20  # when an entry gets this big all entries are halved, so old cutoffs keep losing weight
+
+
+def mvvLvaScore(move):
+    return ORDERING_VALUES[move.pieceCaptured[1]] * 8 - ORDERING_VALUES[move.pieceMoved[1]]
+
+
+class MoveOrderer():
+    def __init__(self, maxPly=64, useKillers=True, useHistory=True):
+        self.maxPly = maxPly
+        self.useKillers = useKillers
+        self.useHistory = useHistory
+        self.killers = [[] for _ in range(maxPly + 1)]  # killers[ply] -> up to KILLER_SLOTS moveIDs, newest first
+        self.history = [0] * HISTORY_SIZE
+        self.resetStats()
+
+    def resetStats(self):
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0  # cutoffs by the first move searched: the higher the share, the better the order
+
+    '''
+    Called at the start of every search. Killers belong to the positions of the last search so they are dropped;
+    history scores are halved so the new search's cutoffs soon count for more than the old ones (aging).
+    '''
+
+    def newSearch(self):
+        self.killers = [[] for _ in range(self.maxPly + 1)]
+        self.history = [score >> 1 for score in self.history]
+        self.resetStats()
+
+    '''
+    What getStagedMoves needs at a ply: (killer moveIDs, history table or None).
+    '''
+
+    def getKillers(self, ply):
+        return tuple(self.killers[ply]) if self.useKillers else ()
+
+    def getHistory(self):
+        return self.history if self.useHistory else None
+
+    '''
+    Records a beta cutoff. moveNumber is how many moves were searched at the node (1 = the first move cut off). Quiet
+    moves become killers at their ply and get depth * depth added to their history score.
+    '''
+
+    def addCutoff(self, move, ply, depth, moveNumber):
+        self.cutoffs += 1
+        if moveNumber == 1:
+            self.firstMoveCutoffs += 1
+        if move.pieceCaptured != "--":  # captures are already ordered by MVV-LVA
+            return
+        killers = self.killers[ply]
+        if move.moveID not in killers:
+            killers.insert(0, move.moveID)
+            del killers[KILLER_SLOTS:]
+        index = move.moveID & 0xFFF
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_MAX:
+            self.history = [score >> 1 for score in self.history]
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
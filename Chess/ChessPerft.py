@@ -0,0 +1,185 @@
+"""
+Command line runner for perft (move generation node counts). Runs GameBoard.perft over the standard perft test
+positions, compares every count against the known correct number and reports nodes per second.
+
+Run it from the project folder:  python -m Chess.ChessPerft --depth 3
+
+With --workers N the subtrees are counted on a pool of N processes (see parallelDivide), and --scaling runs the same
+count with 1, 2, ... N processes to show how the speed scales with the number of cores.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from Chess.ChessEngine import GameBoard
+from Chess.ChessBitboard import BitBoard
+
+# (name, FEN, known node counts for depth 1, 2, 3, ...) from https://www.chessprogramming.org/Perft_Results
+PERFT_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+BACKENDS = {"board": GameBoard, "bitboard": BitBoard}
+
+'''
+Runs in a worker process: counts one subtree. The position arrives as a clone (pickled by the pool), so every task
+has a board of its own.
+'''
+
+
+def _perftTask(task):
+    rootNotation, gameState, depth = task
+    return rootNotation, gameState.perft(depth), os.getpid()
+
+
+'''
+Makes one task per position splitDepth plies below the root. Every task remembers the root move it is under, so the
+results can be added up per root move like divide does.
+'''
+
+
+def _splitTasks(gameState, rootNotation, splitDepth, depth, tasks):
+    for move in gameState.getValidMoves():
+        gameState.makeChessMove(move)
+        notation = rootNotation if rootNotation is not None else move.getChessNotation()
+        if splitDepth == 1:
+            tasks.append((notation, gameState.clone(), depth - 1))
+        else:
+            _splitTasks(gameState, notation, splitDepth - 1, depth - 1, tasks)
+        gameState.undoMove()
+
+
+'''
+Divide on a process pool: returns ({root move: nodes}, {worker pid: nodes}). With splitDepth 1 every root move is one
+task; with splitDepth 2 (the default) every reply to every root move is one, which gives the pool hundreds of small
+tasks instead of ~20-50 uneven ones, so no worker sits idle at the end waiting for one big subtree.
+'''
+
+
+def parallelDivide(gameState, depth, workers=None, splitDepth=2):
+    splitDepth = max(1, min(splitDepth, depth))
+    tasks = []
+    _splitTasks(gameState, None, splitDepth, depth, tasks)
+    counts = {move.getChessNotation(): 0 for move in gameState.getValidMoves()}  # mated subtrees give no tasks
+    workerNodes = {}
+    with multiprocessing.Pool(workers) as pool:
+        for rootNotation, nodes, pid in pool.imap_unordered(_perftTask, tasks):
+            counts[rootNotation] = counts.get(rootNotation, 0) + nodes
+            workerNodes[pid] = workerNodes.get(pid, 0) + nodes
+    return counts, workerNodes
+
+
+def parallelPerft(gameState, depth, workers=None, splitDepth=2):
+    if depth <= 1:
+        return gameState.perft(depth)
+    counts, workerNodes = parallelDivide(gameState, depth, workers, splitDepth)
+    return sum(counts.values())
+
+
+'''
+Runs perft on one position and returns (nodes, seconds).
+'''
+
+
+def timePerft(gameState, depth):
+    startTime = time.perf_counter()
+    nodes = gameState.perft(depth)
+    return nodes, time.perf_counter() - startTime
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft node counts and speed for the chess move generator.")
+    parser.add_argument("--depth", type=int, default=3, help="search depth (default 3)")
+    parser.add_argument("--position", choices=[p[0] for p in PERFT_POSITIONS], action="append",
+                        help="only run this position (can be given more than once)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="board", help="game state class to test")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every first move")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="count on a pool of this many processes (default 0: in this process)")
+    parser.add_argument("--split", type=int, default=2, help="plies below the root where work is split (default 2)")
+    parser.add_argument("--scaling", action="store_true",
+                        help="time every position with 1, 2, ... --workers processes (default: all cores)")
+    args = parser.parse_args(argv)
+    if args.scaling:
+        return runScaling(args)
+
+    mismatches = 0
+    totalNodes = 0
+    totalSeconds = 0.0
+    for name, fen, expected in PERFT_POSITIONS:
+        if args.position and name not in args.position:
+            continue
+        gameState = BACKENDS[args.backend].fromFEN(fen)
+        if args.workers > 0 and args.depth > 1:
+            startTime = time.perf_counter()
+            counts, workerNodes = parallelDivide(gameState, args.depth, args.workers, args.split)
+            seconds = time.perf_counter() - startTime
+            nodes = sum(counts.values())
+            if args.divide:
+                for move, moveNodes in sorted(counts.items()):
+                    print("  " + move + ": " + str(moveNodes))
+            print("  per worker: " + ", ".join(str(workerNodes[pid]) for pid in sorted(workerNodes)))
+        else:
+            if args.divide:
+                for move, moveNodes in sorted(gameState.divide(args.depth).items()):
+                    print("  " + move + ": " + str(moveNodes))
+            nodes, seconds = timePerft(gameState, args.depth)
+        totalNodes += nodes
+        totalSeconds += seconds
+        if args.depth <= len(expected):
+            status = "ok" if nodes == expected[args.depth - 1] else "MISMATCH (expected " + str(expected[args.depth - 1]) + ")"
+        else:
+            status = "no reference count"
+        if status.startswith("MISMATCH"):
+            mismatches += 1
+        print("%-10s depth %d  %12d nodes  %7.2fs  %9.0f nodes/sec  %s" %
+              (name, args.depth, nodes, seconds, nodes / seconds if seconds > 0 else 0.0, status))
+    if totalSeconds > 0:
+        print("total %d nodes in %.2fs (%.0f nodes/sec)" % (totalNodes, totalSeconds, totalNodes / totalSeconds))
+    return 1 if mismatches else 0
+
+
+'''
+Wall-clock scaling: every selected position is counted with 1, 2, ... N worker processes. The speedup is against the
+1 worker run, so it only shows what the extra processes bring (the pool's own overhead is in every row).
+'''
+
+
+def runScaling(args):
+    maxWorkers = args.workers if args.workers > 0 else os.cpu_count() or 1
+    mismatches = 0
+    for name, fen, expected in PERFT_POSITIONS:
+        if args.position and name not in args.position:
+            continue
+        baseSeconds = None
+        for workers in range(1, maxWorkers + 1):
+            gameState = BACKENDS[args.backend].fromFEN(fen)
+            startTime = time.perf_counter()
+            counts, workerNodes = parallelDivide(gameState, args.depth, workers, args.split)
+            seconds = time.perf_counter() - startTime
+            nodes = sum(counts.values())
+            baseSeconds = baseSeconds or seconds
+            if args.depth <= len(expected) and nodes != expected[args.depth - 1]:
+                mismatches += 1
+            print("%-10s depth %d  %2d workers  %12d nodes  %7.2fs  %9.0f nodes/sec  speedup %.2fx  per worker %s" %
+                  (name, args.depth, workers, nodes, seconds, nodes / seconds if seconds > 0 else 0.0,
+                   baseSeconds / seconds if seconds > 0 else 0.0,
+                   "/".join(str(workerNodes[pid]) for pid in sorted(workerNodes))))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
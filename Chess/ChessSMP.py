@@ -0,0 +1,113 @@
+"""
+Lazy SMP: a multi-process version of the search in ChessAI. Python threads can't search in parallel (the GIL), so the
+extra searches run in helper processes. All of them search the same position with their own Searcher; the only thing
+they share is the transposition table (ChessTransposition.SharedTranspositionTable, in shared memory). Every helper
+skips a different set of depths (Searcher.skipsDepth), so the processes are at different depths at any moment and
+each one finds entries the others stored: the main search gets to its depths faster than it would alone.
+
+The main search runs in the process that calls ParallelSearcher.search and decides when the search is over (time,
+depth, nodes or stop()). Then the helpers are stopped through a shared event and the deepest result is returned.
+"""
+import multiprocessing
+import queue
+
+from Chess.ChessAI import Searcher, SearchResult
+from Chess.ChessTransposition import SharedTranspositionTable
+
+HELPER_POLL_SECONDS = 0.1  # how often the helpers are checked for being alive while their results are awaited
+
+'''
+Runs in every helper process: waits for a position, searches it until it is told to stop (or reaches maxDepth) and
+sends back the result, until it gets None.
+'''
+
+
+def _helperLoop(tableName, hashSizeMB, helperIndex, tasks, results, stopEvent):
+    table = SharedTranspositionTable(hashSizeMB, tableName)
+    searcher = Searcher(timeLimit=None, transpositionTable=table, stopEvent=stopEvent, helperIndex=helperIndex)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            gameState, maxDepth = task
+            searcher.maxDepth = maxDepth
+            searcher.stopRequested = False
+            results.put(searcher.search(gameState))
+    finally:
+        table.close()
+
+
+class ParallelSearcher(Searcher):
+    def __init__(self, workers=2, hashSizeMB=16, **searcherOptions):
+        self.stopEvent = multiprocessing.Event()
+        table = SharedTranspositionTable(hashSizeMB)
+        super().__init__(hashSizeMB=hashSizeMB, transpositionTable=table, stopEvent=self.stopEvent, **searcherOptions)
+        self.workers = workers  # processes searching, counting this one
+        self.results = multiprocessing.Queue()
+        self.taskQueues = []
+        self.helpers = []
+        for helperIndex in range(1, workers):
+            tasks = multiprocessing.Queue()
+            helper = multiprocessing.Process(target=_helperLoop, daemon=True,
+                                             args=(table.blockName(), hashSizeMB, helperIndex, tasks, self.results,
+                                                   self.stopEvent))
+            helper.start()
+            self.taskQueues.append(tasks)
+            self.helpers.append(helper)
+        self.helperResults = []  # what every helper found in the last search (for statistics)
+
+    '''
+    Searches with all processes. The result is the main search's, unless a helper finished a deeper iteration; nodes
+    are the total over all processes.
+    '''
+
+    def search(self, gameState):
+        self.stopEvent.clear()
+        for tasks in self.taskQueues:
+            tasks.put((gameState.clone(), self.maxDepth))
+        try:
+            result = super().search(gameState)
+        finally:
+            self.stopEvent.set()  # the main search is done: so are the helpers
+            self.helperResults = self.collectHelperResults()
+        best = result
+        for helperResult in self.helperResults:
+            if helperResult.bestMove is not None and helperResult.depth > best.depth:
+                best = helperResult
+        return SearchResult(best.bestMove, best.score, best.depth,
+                            result.nodes + sum(helperResult.nodes for helperResult in self.helperResults),
+                            result.seconds, best.principalVariation)
+
+    '''
+    Waits for the result of every helper. A helper that died (or raised) never sends one, so while waiting the
+    helpers are checked every HELPER_POLL_SECONDS and the dead ones are dropped instead of being waited for forever.
+    '''
+
+    def collectHelperResults(self):
+        results = []
+        while len(results) < len(self.helpers):
+            try:
+                results.append(self.results.get(timeout=HELPER_POLL_SECONDS))
+            except queue.Empty:
+                alive = [i for i, helper in enumerate(self.helpers) if helper.is_alive()]
+                self.helpers = [self.helpers[i] for i in alive]
+                self.taskQueues = [self.taskQueues[i] for i in alive]
+        return results
+
+    def stop(self):
+        super().stop()
+        self.stopEvent.set()
+
+    '''
+    Ends the helper processes and frees the shared table. The searcher can't be used after this.
+    '''
+
+    def close(self):
+        for tasks in self.taskQueues:
+            tasks.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.taskQueues = []
+        self.helpers = []
+        self.transpositionTable.close()
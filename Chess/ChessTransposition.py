@@ -0,0 +1,184 @@
+"""
+Transposition table for the search in ChessAI. The same position is often reached through different move orders, so
+the result of searching it (depth, score, bound type and best move) is kept under its Zobrist key and reused the next
+time the position comes up.
+
+The table has a fixed size: two flat arrays of 64-bit ints (keys and packed data) instead of a dict of objects, so
+memory use is known up front and doesn't grow during long games.
+
+The key array holds key XOR data rather than the key itself. An entry only counts as a hit if the two words still
+XOR back to the key being probed, so an entry whose two words come from different writes (another process sharing the
+table wrote one of them in between, see SharedTranspositionTable) is just a miss, and the table needs no locks.
+"""
+from array import array
+from multiprocessing import shared_memory
+
+# bound type of a stored score (0 means the slot is empty)
+BOUND_EXACT = 1  # score is exact
+BOUND_LOWER = 2  # search failed high: real score >= stored score
+BOUND_UPPER = 3  # search failed low: real score <= stored score
+
+ENTRY_BYTES = 16  # 8 bytes of key + 8 bytes of data
+NO_MOVE = 0xFFFF  # moveID stored when there is no best move (Move.moveID uses 14 bits)
+SCORE_OFFSET = 1 << 31  # scores are stored as unsigned 32-bit numbers
+
+# layout of the 64-bit data word:  score (32) | age (6) | bound (2) | depth (8) | moveID (16)
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+
+'''
+Number of entries for a table of sizeMB: the largest power of 2 that fits, so the slot of a key is just key & mask.
+'''
+
+
+def entryCount(sizeMB):
+    entries = 1
+    while entries * 2 * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+        entries *= 2
+    return entries
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16):
+        self.resize(sizeMB)
+
+    '''
+    Allocates an empty table of entryCount(sizeMB) entries.
+    '''
+
+    def resize(self, sizeMB):
+        entries = entryCount(sizeMB)
+        self.mask = entries - 1
+        self.keys = array("Q", [0]) * entries
+        self.data = array("Q", [0]) * entries
+        self.age = 0
+        self.resetStats()
+
+    def clear(self):
+        self.resize(self.sizeMB())
+
+    def sizeMB(self):
+        return (self.mask + 1) * ENTRY_BYTES / (1024 * 1024)
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0  # a different position was thrown out to make room
+
+    '''
+    Called at the start of every search. Entries from older searches can always be replaced, however deep they were.
+    '''
+
+    def newSearch(self):
+        self.age = (self.age + 1) & 63
+
+    '''
+    Returns (depth, score, bound, moveID) for the position, or None if it isn't in the table.
+    '''
+
+    def probe(self, key):
+        index = key & self.mask
+        data = self.data[index]
+        if data and self.keys[index] ^ data == key:
+            self.hits += 1
+            return ((data >> DEPTH_SHIFT) & 0xFF, (data >> SCORE_SHIFT) - SCORE_OFFSET,
+                    (data >> BOUND_SHIFT) & 3, data & 0xFFFF)
+        self.misses += 1
+        return None
+
+    '''
+    Stores a search result. A slot holding another position from the current search is only replaced by a result
+    searched at least as deep (depth-preferred); results from older searches are always replaced.
+    '''
+
+    def store(self, key, depth, score, bound, moveID):
+        index = key & self.mask
+        oldData = self.data[index]
+        if oldData and self.keys[index] ^ oldData != key:
+            if ((oldData >> AGE_SHIFT) & 63) == self.age and ((oldData >> DEPTH_SHIFT) & 0xFF) > depth:
+                return
+            self.overwrites += 1
+        elif oldData and moveID == NO_MOVE:
+            moveID = oldData & 0xFFFF  # same position: keep the best move we already knew
+        self.stores += 1
+        data = ((score + SCORE_OFFSET) << SCORE_SHIFT) | (self.age << AGE_SHIFT) | (bound << BOUND_SHIFT) | \
+            (min(depth, 255) << DEPTH_SHIFT) | moveID
+        self.data[index] = data
+        self.keys[index] = key ^ data
+
+    '''
+    Permille of the first 1000 slots in use by the current search (what UCI calls hashfull).
+    '''
+
+    def usage(self):
+        sample = min(1000, self.mask + 1)
+        used = 0
+        for index in range(sample):
+            data = self.data[index]
+            if data and ((data >> AGE_SHIFT) & 63) == self.age:
+                used += 1
+        return used * 1000 // sample
+
+    def __str__(self):
+        probes = self.hits + self.misses
+        return "TT %.0fMB hits %d misses %d (%.1f%% hit rate) stores %d overwrites %d" % (
+            self.sizeMB(), self.hits, self.misses, 100.0 * self.hits / probes if probes else 0.0, self.stores,
+            self.overwrites)
+
+
+'''
+The same table as TranspositionTable, but the two arrays live in one block of multiprocessing.shared_memory so several
+search processes can use it at once (Lazy SMP, see ChessSMP). The process that created the block owns it: only the
+owner may resize it, and it removes the block in close(). The others attach by name with the same sizeMB.
+'''
+
+
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, sizeMB=16, name=None):
+        self.name = name  # None: create a new block of shared memory; otherwise attach to the block of that name
+        self.sharedMemory = None
+        super().__init__(sizeMB)
+
+    def resize(self, sizeMB):
+        if self.sharedMemory is not None and self.name is not None:
+            raise ValueError("only the process that created a shared table can resize it")
+        self.close()
+        entries = entryCount(sizeMB)
+        if self.name is None:
+            self.sharedMemory = shared_memory.SharedMemory(create=True, size=entries * ENTRY_BYTES)
+            self.sharedMemory.buf[:entries * ENTRY_BYTES] = bytes(entries * ENTRY_BYTES)
+        else:
+            # helpers started by multiprocessing share the owner's resource tracker, so attaching doesn't make the
+            # block get removed when a helper exits
+            self.sharedMemory = shared_memory.SharedMemory(name=self.name)
+        self.mask = entries - 1
+        self.keys = self.sharedMemory.buf[:entries * 8].cast("Q")
+        self.data = self.sharedMemory.buf[entries * 8:entries * ENTRY_BYTES].cast("Q")
+        self.age = 0
+        self.resetStats()
+
+    def blockName(self):
+        return self.sharedMemory.name
+
+    '''
+    Empties the table in place, so the processes attached to it keep using the same block.
+    '''
+
+    def clear(self):
+        size = (self.mask + 1) * ENTRY_BYTES
+        self.sharedMemory.buf[:size] = bytes(size)
+        self.age = 0
+        self.resetStats()
+
+    def close(self):
+        if self.sharedMemory is None:
+            return
+        self.keys.release()
+        self.data.release()
+        self.sharedMemory.close()
+        if self.name is None:
+            self.sharedMemory.unlink()
+        self.sharedMemory = None
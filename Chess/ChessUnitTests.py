@@ -1,34 +1,1116 @@
-from Chess.ChessEngine import GameBoard
-import ChessMain
-import unittest, mock
-class CheckMoveValidity(unittest.TestCase):
-    @mock.patch('ChessMain.isMoveValid')
-    def test_MoveValid(self, mockisMoveValid):
-        'Unit Test for isMoveValid method in ChessMain'
-        gs = GameBoard(0)
-        chess_game_obj = ChessMain()
-        chess_game_obj.isMoveValid(gs.drawStateOfGame(), "black")
-
-        expected_arg_calls = []
-        for rows in range(0, 2):
-            for colns in range(0, 8):
-                expected_arg_calls.append(mock.call(gs.drawStateOfGame(), 'black', (rows, colns)))
-        self.assertEqual(mockisMoveValid.call_args_list, expected_arg_calls)
-if __name__=="__main__":
-    unittest.main()
+"""
+Unit tests for the game state classes in ChessEngine and ChessBitboard. Run them from the project folder with:
+python -m unittest Chess.ChessUnitTests
+"""
+import bz2
+import contextlib
+import gzip
+import io
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+import unittest
+
+from Chess.ChessEngine import GameBoard, Move, PIECE_CODES, GAME_ONGOING, GAME_CHECKMATE, GAME_STALEMATE, \
+    GAME_REPETITION, GAME_FIFTY_MOVES, GAME_INSUFFICIENT_MATERIAL, countPieces
+from Chess.ChessBitboard import BitBoard, FULL_BOARD, ROOK_LINES, BISHOP_LINES, rookAttacks, bishopAttacks, \
+    slidingAttacks
+from Chess.ChessPerft import PERFT_POSITIONS, parallelDivide, parallelPerft
+from Chess.ChessAI import Searcher, CHECKMATE, evaluate
+from Chess.ChessEvaluation import computeScores, MAX_PHASE
+from Chess.ChessMoveOrdering import MoveOrderer, mvvLvaScore, HISTORY_MAX
+from Chess.uci import UCIEngine, allocateTime, formatScore
+from Chess.ChessSMP import ParallelSearcher
+from Chess.ChessAIProcess import AIWorker
+from Chess.ChessPGN import PGNError, readGames, parseSAN, toSAN, formatGame, writeGame
+from Chess.ChessTransposition import TranspositionTable, SharedTranspositionTable, BOUND_EXACT, BOUND_LOWER, NO_MOVE
+
+'''
+Perft node counts checked against the known results for both backends. Depths are kept small so the whole file
+runs in a few seconds; use "python -m Chess.ChessPerft --depth 4" for the deeper counts.
+'''
+
+
+class PerftCounts(unittest.TestCase):
+    depths = {"startpos": 3, "kiwipete": 2, "position3": 3, "position4": 2, "position5": 2, "position6": 2}
+
+    def checkBackend(self, boardClass):
+        for name, fen, expected in PERFT_POSITIONS:
+            depth = self.depths[name]
+            with self.subTest(position=name, depth=depth):
+                self.assertEqual(boardClass.fromFEN(fen).perft(depth), expected[depth - 1])
+
+    def test_GameBoardPerft(self):
+        self.checkBackend(GameBoard)
+
+    def test_BitBoardPerft(self):
+        self.checkBackend(BitBoard)
+
+    def test_DivideAddsUpToPerft(self):
+        gs = GameBoard.fromFEN(PERFT_POSITIONS[1][1])
+        counts = gs.divide(2)
+        self.assertEqual(len(counts), 48)
+        self.assertEqual(sum(counts.values()), 2039)
+
+    def test_ParallelDivideMatchesDivide(self):
+        gs = GameBoard.fromFEN(PERFT_POSITIONS[1][1])
+        expected = gs.divide(3)
+        for splitDepth in (1, 2):
+            counts, workerNodes = parallelDivide(gs, 3, workers=2, splitDepth=splitDepth)
+            self.assertEqual(counts, expected)
+            self.assertEqual(sum(workerNodes.values()), sum(expected.values()))
+        self.assertEqual(parallelPerft(BitBoard(), 3, workers=2), PERFT_POSITIONS[0][2][2])
+        self.assertEqual(len(gs.logOfMoves), 0)  # the tasks were split off without changing the board
+
+    def test_ParallelDivideKeepsMatingRootMoves(self):
+        gs = GameBoard.fromFEN("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")  # Ra8 is mate, so it has no replies to split
+        expected = gs.divide(2)
+        counts, workerNodes = parallelDivide(gs, 2, workers=2, splitDepth=2)
+        self.assertEqual(counts["a1a8"], 0)
+        self.assertEqual(counts, expected)
+
+
+class MakeAndUndo(unittest.TestCase):
+    def test_UndoRestoresPosition(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(PERFT_POSITIONS[1][1])  # kiwipete: castling, en passant and promotions nearby
+            board = [row[:] for row in gs.board]
+            for move in gs.getValidMoves():
+                gs.makeChessMove(move)
+                for reply in gs.getValidMoves():
+                    gs.makeChessMove(reply)
+                    gs.undoMove()
+                gs.undoMove()
+                self.assertEqual(gs.board, board)
+                self.assertTrue(gs.whiteToMove)
+                rights = gs.currentCastlingRights
+                self.assertEqual((rights.wks, rights.wqs, rights.bks, rights.bqs), (True, True, True, True))
+                self.assertEqual(gs.whiteKingLocation, (7, 4))
+                self.assertEqual(gs.blackKingLocation, (0, 4))
+
+    def test_UnderPromotions(self):
+        gs = GameBoard.fromFEN("8/P7/8/8/8/8/8/k6K w - - 0 1")
+        promotions = [move.getChessNotation() for move in gs.getValidMoves() if move.isPawnPromotion]
+        self.assertEqual(sorted(promotions), ["a7a8b", "a7a8n", "a7a8q", "a7a8r"])
+
+
+'''
+BitBoard generates and makes moves from its bitboards alone, so every position it reaches is compared against
+GameBoard: the same moves (with the same pieces moved and captured) and the same bitboards, key and scores after
+undoing them.
+'''
+
+
+class BitBoardBackend(unittest.TestCase):
+    positions = [fen for name, fen, expected in PERFT_POSITIONS] + \
+                ["r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1",  # en passant and castling on both sides
+                 "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",  # promotions with and without a capture
+                 "8/8/8/KP5r/8/8/8/7k w - - 0 1"]  # a pawn pinned along its row
+
+    def moveDetails(self, moves):
+        return sorted((move.getChessNotation(), move.pieceMoved, move.pieceCaptured, move.isEnpassantMove,
+                       move.isCastleMove) for move in moves)
+
+    def test_MovesMatchGameBoard(self):
+        for fen in self.positions:
+            with self.subTest(fen=fen):
+                board, bitboard = GameBoard.fromFEN(fen), BitBoard.fromFEN(fen)
+                for move in bitboard.getValidMoves():
+                    self.assertIn(move, board.getValidMoves())
+                    board.makeChessMove(board.getLegalMove(move.moveID))
+                    bitboard.makeChessMove(move)
+                    self.assertEqual(self.moveDetails(bitboard.getValidMoves()), self.moveDetails(board.getValidMoves()))
+                    self.assertEqual(bitboard.board, board.board)
+                    self.assertEqual(bitboard.zobristKey, board.zobristKey)
+                    board.undoMove()
+                    bitboard.undoMove()
+
+    def test_UndoRestoresBitboards(self):
+        for fen in self.positions:
+            gs = BitBoard.fromFEN(fen)
+            state = (dict(gs.pieceBitboards), dict(gs.occupancy), gs.occupied, gs.zobristKey, gs.openingScore,
+                     gs.endgameScore, gs.gamePhase)
+            for move in gs.getValidMoves():
+                gs.makeChessMove(move)
+                self.assertEqual(gs.zobristKey, gs.computeZobristKey())
+                self.assertEqual((gs.openingScore, gs.endgameScore, gs.gamePhase), computeScores(gs.board))
+                gs.undoMove()
+                self.assertEqual((gs.pieceBitboards, gs.occupancy, gs.occupied, gs.zobristKey, gs.openingScore,
+                                  gs.endgameScore, gs.gamePhase), state)
+
+    def test_BoardIsBuiltFromTheBitboards(self):
+        gs = BitBoard()
+        self.assertEqual(gs.board, GameBoard().board)
+        gs.board[6][4] = "--"  # a copy: the position doesn't change
+        self.assertEqual(gs.board[6][4], "wP")
+        gs.setFEN("4k3/8/8/8/8/8/8/4K2R w K - 0 1")
+        self.assertEqual(gs.pieceBitboards["wR"], 1 << 63)
+        self.assertEqual(gs.occupied, 1 << 4 | 1 << 60 | 1 << 63)
+        self.assertEqual(gs.board[7][7], "wR")
+
+    def test_CaptureMovesAreTheCaptures(self):
+        for fen in self.positions + CheckEvasions.positions:
+            with self.subTest(fen=fen):
+                gs = BitBoard.fromFEN(fen)
+                captures = [move for move in gs.getValidMoves() if move.pieceCaptured != "--"]
+                self.assertEqual(self.moveDetails(gs.getCaptureMoves()), self.moveDetails(captures))
+
+    def test_SliderLookupMatchesRayWalk(self):
+        occupancies = [0, FULL_BOARD] + [random.Random(square).getrandbits(64) for square in range(64)]
+        for square in range(64):
+            for occupied in occupancies:
+                self.assertEqual(rookAttacks(square, occupied), slidingAttacks(square, occupied, ROOK_LINES))
+                self.assertEqual(bishopAttacks(square, occupied), slidingAttacks(square, occupied, BISHOP_LINES))
+
+    def test_MovesAreReused(self):
+        gs = BitBoard()
+        first = gs.getValidMoves()
+        self.assertTrue(all(a is b for a, b in zip(first, gs.getValidMoves())))
+
+
+class UndoStack(unittest.TestCase):
+    def test_RecordPacksTheOldState(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN("r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 7 20")
+            rights = gs.currentCastlingRights
+            move = next(move for move in gs.getValidMoves() if move.getChessNotation() == "a1a8")  # Rxa8
+            gs.makeChessMove(move)
+            record = gs.undoStack[0]
+            self.assertEqual(record & 0xFFFF, move.moveID)
+            self.assertEqual(PIECE_CODES["bR"], (record >> 16) & 15)
+            self.assertEqual((record >> 20) & 15, 15)  # all four rights before the move
+            self.assertEqual((record >> 24) & 15, 3 + 1)  # en passant on the d file
+            self.assertEqual((record >> 28) & 0xFFFF, 7)
+            self.assertEqual(gs.toFEN(), "R3k2r/8/8/3pP3/8/8/8/4K2R b Kk - 0 20")
+            gs.undoMove()
+            self.assertIs(gs.currentCastlingRights, rights)  # changed in place, never replaced
+            self.assertEqual(gs.toFEN(), "r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 7 20")
+
+    def test_StackGrowsForLongGames(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass()
+            start = gs.toFEN()
+            shuffle = ["g1f3", "g8f6", "f3g1", "f6g8"]
+            for i in range(600):
+                notation = shuffle[i % 4]
+                gs.makeChessMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+            self.assertEqual(len(gs.logOfMoves), 600)
+            self.assertEqual(gs.logOfMoves[-1].getChessNotation(), "f6g8")
+            for i in range(600):
+                gs.undoMove()
+            self.assertEqual(gs.toFEN(), start)
+            self.assertEqual(gs.zobristKey, gs.computeZobristKey())
+
+
+class MoveEncoding(unittest.TestCase):
+    def test_MoveIDRoundTrip(self):
+        for name, fen, expected in PERFT_POSITIONS:
+            gs = GameBoard.fromFEN(fen)
+            for move in gs.getValidMoves():
+                self.assertLess(move.moveID, 1 << 16)
+                decoded = Move.fromMoveID(move.moveID, gs.board)
+                self.assertEqual(decoded, move)
+                self.assertEqual((decoded.pieceMoved, decoded.pieceCaptured, decoded.isEnpassantMove,
+                                  decoded.isCastleMove, decoded.isPawnPromotion),
+                                 (move.pieceMoved, move.pieceCaptured, move.isEnpassantMove,
+                                  move.isCastleMove, move.isPawnPromotion))
+
+    def test_ClickedMoveEqualsGeneratedMove(self):
+        gs = GameBoard()
+        clicked = Move((6, 4), (4, 4), gs.board)  # how ChessMain builds a move from two clicks
+        self.assertIn(clicked, gs.getValidMoves())
+        self.assertEqual(len({move for move in gs.getValidMoves()}), 20)
+        self.assertFalse(hasattr(clicked, "__dict__"))
+
+
+'''
+Positions where the side to move is in check, compared against BitBoard, which finds the legal moves its own way.
+'''
+
+
+class CheckEvasions(unittest.TestCase):
+    positions = ["4k3/8/8/8/1b6/8/8/R3K2R w KQ - 0 1",  # bishop check: block on c3/d2 or move the king
+                 "4k3/8/8/8/8/5n2/8/R3K2R w KQ - 0 1",  # knight check: only the king can answer it here
+                 "8/8/8/2k5/3Pp3/8/8/4K3 b - d3 0 1",  # the checking pawn can be taken en passant
+                 "4k3/1pp5/8/8/Q7/8/8/4K3 b - - 0 1",  # blocks by a single and a double pawn push
+                 "4k3/8/8/8/1b6/8/4r3/4K3 w - - 0 1",  # double check: king moves only
+                 PERFT_POSITIONS[3][1]]  # position4
+
+    def test_EvasionsMatchBitBoard(self):
+        for fen in self.positions:
+            with self.subTest(fen=fen):
+                moves = [move.getChessNotation() for move in GameBoard.fromFEN(fen).getValidMoves()]
+                expected = [move.getChessNotation() for move in BitBoard.fromFEN(fen).getValidMoves()]
+                self.assertEqual(len(moves), len(set(moves)))
+                self.assertEqual(sorted(moves), sorted(expected))
+
+    def test_EnPassantEvasion(self):
+        moves = [move for move in GameBoard.fromFEN(self.positions[2]).getValidMoves() if move.isEnpassantMove]
+        self.assertEqual([move.getChessNotation() for move in moves], ["e4d3"])
 
+
+class GameStatus(unittest.TestCase):
+    positions = [("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", GAME_CHECKMATE),  # fool's mate
+                 ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", GAME_STALEMATE),
+                 ("k7/8/8/8/8/8/P4q2/7K w - - 0 1", GAME_ONGOING),  # the king is boxed in: only the pawn can move
+                 ("k7/8/8/8/8/p7/P4q2/7K w - - 0 1", GAME_STALEMATE),  # ... and now the pawn is blocked too
+                 ("4k3/8/8/8/1b6/8/4r3/4K3 w - - 0 1", GAME_ONGOING)]  # double check
+
+    def test_StatusOfPositions(self):
+        for boardClass in (GameBoard, BitBoard):
+            for fen, expected in self.positions:
+                with self.subTest(board=boardClass.__name__, fen=fen):
+                    gs = boardClass.fromFEN(fen)
+                    self.assertEqual(gs.gameStatus(), expected)
+                    self.assertEqual((gs.checkMate, gs.staleMate), (expected == GAME_CHECKMATE,
+                                                                    expected == GAME_STALEMATE))
+                    self.assertEqual(gs.toFEN(), fen)
+
+    def test_HasLegalMoveMatchesGeneration(self):
+        for boardClass in (GameBoard, BitBoard):
+            for name, fen, expected in PERFT_POSITIONS:
+                gs = boardClass.fromFEN(fen)
+                for move in gs.getValidMoves():
+                    gs.makeChessMove(move)
+                    for reply in gs.getValidMoves():
+                        gs.makeChessMove(reply)
+                        with self.subTest(board=boardClass.__name__, position=name):
+                            self.assertEqual(gs.hasLegalMove(), len(gs.getValidMoves()) > 0)
+                        gs.undoMove()
+                    gs.undoMove()
+
+    def test_NothingIsPrinted(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for boardClass in (GameBoard, BitBoard):
+                for fen, expected in self.positions:
+                    gs = boardClass.fromFEN(fen)
+                    gs.getValidMoves()
+                    gs.gameStatus()
+        self.assertEqual(output.getvalue(), "")
+
+    def test_SearchScoresMateAtTheLeaves(self):
+        # mate in one: without quiescence the mate is only seen through the leaf check
+        gs = GameBoard.fromFEN("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        result = Searcher(maxDepth=1, timeLimit=None, useQuiescence=False).search(gs)
+        self.assertEqual(result.bestMove.getChessNotation(), "a1a8")
+        self.assertEqual(result.score, CHECKMATE - 1)
+
+
+class DrawRules(unittest.TestCase):
+    def play(self, gs, notations):
+        for notation in notations:
+            gs.makeChessMove(gs.getLegalMove(Move.moveIDFromNotation(notation)))
+
+    def test_ThreefoldRepetition(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass()
+            self.play(gs, ["g1f3", "g8f6", "f3g1", "f6g8"])
+            self.assertTrue(gs.isRepetition(1))
+            self.assertFalse(gs.isRepetition())
+            self.assertEqual(gs.gameStatus(), GAME_ONGOING)
+            self.play(gs, ["g1f3", "g8f6", "f3g1"])
+            self.assertFalse(gs.isRepetition())  # twice so far
+            self.play(gs, ["f6g8"])
+            self.assertEqual(gs.gameStatus(), GAME_REPETITION)
+            gs.undoMove()
+            self.assertEqual(gs.gameStatus(), GAME_ONGOING)
+
+    def test_ScanStopsAtIrreversibleMoves(self):
+        for boardClass in (GameBoard, BitBoard):
+            # the rook goes out and back: same squares, but the queen side castling right is gone
+            gs = boardClass.fromFEN("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1")
+            self.play(gs, ["a1a2", "e8d8", "a2a1", "d8e8"])
+            self.assertFalse(gs.isRepetition(1))
+            self.play(gs, ["a1a2", "e8d8", "a2a1", "d8e8"])
+            self.assertTrue(gs.isRepetition(1))
+            # a null move resets the clock: the search never counts a repetition across one
+            gs.makeNullMove()
+            gs.makeNullMove()
+            self.assertFalse(gs.isRepetition(1))
+            gs.undoNullMove()
+            gs.undoNullMove()
+            self.assertTrue(gs.isRepetition(1))
+
+    def test_FiftyMoveRule(self):
+        for boardClass in (GameBoard, BitBoard):
+            fen = "7k/8/6K1/8/8/8/8/R7 w - - 99 80"
+            gs = boardClass.fromFEN(fen)
+            self.play(gs, ["a1b1"])
+            self.assertEqual(gs.gameStatus(), GAME_FIFTY_MOVES)
+            self.assertTrue(gs.isDraw())
+            gs = boardClass.fromFEN(fen)
+            self.play(gs, ["a1a8"])  # mate on the hundredth ply still counts
+            self.assertEqual(gs.gameStatus(), GAME_CHECKMATE)
+            self.assertFalse(gs.isDraw())
+
+    def test_InsufficientMaterial(self):
+        positions = [("4k3/8/8/8/8/8/8/4K3 w - - 0 1", True),
+                     ("4k3/8/8/8/8/8/8/4KN2 w - - 0 1", True),
+                     ("4kb2/8/8/8/8/8/8/2B1K3 w - - 0 1", True),  # both bishops on dark squares
+                     ("4k1b1/8/8/8/8/8/8/2B1K3 w - - 0 1", False),  # opposite colors: mate is possible
+                     ("4k3/8/8/8/8/8/8/4KNN1 w - - 0 1", False),
+                     ("4k3/8/8/8/8/8/7P/4K3 w - - 0 1", False)]
+        for boardClass in (GameBoard, BitBoard):
+            for fen, expected in positions:
+                with self.subTest(board=boardClass.__name__, fen=fen):
+                    gs = boardClass.fromFEN(fen)
+                    self.assertEqual(gs.hasInsufficientMaterial(), expected)
+                    self.assertEqual(gs.gameStatus(), GAME_INSUFFICIENT_MATERIAL if expected else GAME_ONGOING)
+
+    def test_PieceCountsFollowCapturesAndPromotions(self):
+        gs = GameBoard.fromFEN("1n2k3/P7/8/8/8/8/5r2/4K3 w - - 0 1")
+        self.play(gs, ["e1f2"])
+        self.assertFalse(gs.hasInsufficientMaterial())  # the pawn is still there
+        self.play(gs, ["e8d8", "a7b8n"])
+        self.assertEqual(gs.pieceCounts, countPieces(gs.board))
+        self.assertTrue(gs.hasInsufficientMaterial())  # king and knight against king
+        for i in range(3):
+            gs.undoMove()
+            self.assertEqual(gs.pieceCounts, countPieces(gs.board))
+
+    def test_CloneSeesRepetitions(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass()
+            self.play(gs, ["g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"])
+            copyOfGame = gs.clone()
+            self.assertEqual(len(copyOfGame.logOfMoves), 0)
+            self.play(copyOfGame, ["f6g8"])
+            self.assertEqual(copyOfGame.gameStatus(), GAME_REPETITION)
+
+    def test_SearchScoresRepetitionAsDraw(self):
+        gs = GameBoard()
+        self.play(gs, ["g1f3", "g8f6", "f3g1", "f6g8"])
+        searcher = Searcher(maxDepth=3, timeLimit=None)
+        self.assertEqual(searcher.negamax(gs, 3, -CHECKMATE - 1, CHECKMATE + 1, 1), 0)
+        self.assertEqual(gs.ply, 4)
+
+
+class LegalityCheck(unittest.TestCase):
+    positions = [PERFT_POSITIONS[1][1], PERFT_POSITIONS[2][1], PERFT_POSITIONS[3][1],
+                 CheckEvasions.positions[2],  # en passant evasion
+                 "4k3/8/8/8/1b6/8/4r3/4K3 w - - 0 1"]  # double check
+
+    def test_IsLegalMatchesGeneration(self):
+        for boardClass in (GameBoard, BitBoard):
+            for fen in self.positions:
+                gs = boardClass.fromFEN(fen)
+                legalIDs = {move.moveID for move in gs.getValidMoves()}
+                for moveID in range(1 << 14):
+                    if moveID & 63 == (moveID >> 6) & 63:
+                        continue  # start square == end square
+                    move = Move.fromMoveID(moveID, gs.board)  # only pawns reaching the last row keep promotion bits
+                    with self.subTest(board=boardClass.__name__, fen=fen, moveID=moveID):
+                        self.assertEqual(gs.isLegal(move), move.moveID in legalIDs)
+                self.assertEqual(gs.toFEN(), fen)
+
+    def test_GetLegalMoveReturnsTheBoardsMove(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(CheckEvasions.positions[2])
+            move = gs.getLegalMove(Move.moveIDFromNotation("e4d3"))
+            self.assertTrue(move.isEnpassantMove)
+            self.assertIsNone(gs.getLegalMove(Move.moveIDFromNotation("e4e3")))  # doesn't answer the check
+
+    def test_IndexBySquareAndID(self):
+        gs = GameBoard()
+        index = gs.getLegalMoveIndex()
+        self.assertEqual(len(index), 20)
+        self.assertEqual(sorted(move.getChessNotation() for move in index.movesFrom((7, 6))), ["g1f3", "g1h3"])
+        self.assertEqual(index.movesFrom((4, 4)), [])
+        e4 = index.find(Move.moveIDFromNotation("e2e4"))
+        self.assertIn(e4, index)
+        self.assertIs(gs.getLegalMoveIndex(), index)  # same position: not built again
+        gs.makeChessMove(e4)
+        self.assertIsNot(gs.getLegalMoveIndex(), index)
+        self.assertIsNone(gs.getLegalMoveIndex().find(e4.moveID))
+        gs.undoMove()
+        self.assertIs(gs.getLegalMoveIndex().find(e4.moveID).pieceMoved, "wP")
+
+    def test_MoveIDFromNotation(self):
+        gs = GameBoard.fromFEN("4k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+        for move in gs.getValidMoves():
+            self.assertEqual(Move.moveIDFromNotation(move.getChessNotation()), move.moveID)
+        for notation in ("", "e2", "e2e9", "i2e4", "a7a8k", "e1e2e3", "e2e4q", "a8a7q", "a6a7q"):
+            self.assertIsNone(Move.moveIDFromNotation(notation))
+
+
+class PinTable(unittest.TestCase):
+    fen = "4k3/4r3/8/8/1b6/8/3NQ3/4K3 w - - 0 1"  # queen pinned on the e-file, knight pinned on the diagonal
+
+    def test_PinDirections(self):
+        gs = GameBoard.fromFEN(self.fen)
+        isInCheck, pins, checks = gs.checkForPinsAndChecks()
+        self.assertFalse(isInCheck)
+        self.assertEqual(len(pins), 64)
+        self.assertEqual(pins[6 * 8 + 4], (-1, 0))  # e2
+        self.assertEqual(pins[6 * 8 + 3], (-1, -1))  # d2
+        self.assertEqual(sum(pin is not None for pin in pins), 2)
+
+    def test_GenerationDoesNotChangePins(self):
+        gs = GameBoard.fromFEN(self.fen)
+        moves = gs.getValidMoves()
+        pins = gs.pins[:]
+        queenMoves = []
+        gs.getQueenMoves(6, 4, queenMoves)  # generating a piece again gives the same moves
+        gs.getKnightMoves(6, 3, queenMoves)  # pinned, adds nothing
+        self.assertEqual(gs.pins, pins)
+        self.assertEqual(sorted(move.getChessNotation() for move in queenMoves),
+                         sorted(move.getChessNotation() for move in moves if move.pieceMoved == "wQ"))
+        self.assertEqual(sorted(move.getChessNotation() for move in queenMoves), ["e2e3", "e2e4", "e2e5", "e2e6",
+                                                                                  "e2e7"])
+
+
+class KingMoves(unittest.TestCase):
+    def kingMoves(self, fen):
+        return sorted(move.getChessNotation() for move in GameBoard.fromFEN(fen).getValidMoves()
+                      if move.pieceMoved[1] == "K")
+
+    def test_KingCantStepBackAlongCheck(self):
+        self.assertEqual(self.kingMoves("4k3/8/8/8/8/8/8/r3K2R w K - 0 1"), ["e1d2", "e1e2", "e1f2"])
+
+    def test_NoCastlingThroughAttackedSquare(self):
+        self.assertEqual(self.kingMoves("4k3/8/8/8/2b5/8/8/4K2R w K - 0 1"), ["e1d1", "e1d2", "e1f2"])  # f1, e2
+        self.assertIn("e1g1", self.kingMoves("4k3/8/7b/8/8/8/8/4K2R w K - 0 1"))
+
+    def test_DefendedPieceCantBeTaken(self):
+        self.assertEqual(self.kingMoves("4k3/8/8/8/8/8/3n4/4K3 w - - 0 1"),
+                         ["e1d1", "e1d2", "e1e2", "e1f2"])  # the knight covers f1
+        self.assertNotIn("e1d2", self.kingMoves("4k3/8/8/8/8/2p5/3n4/4K3 w - - 0 1"))
+
+
+class StagedMoves(unittest.TestCase):
     '''
-    This method will show if a king is in check or not. 
+    Perft through getStagedMoves, making and undoing moves between the yields the way the search does, must give the
+    same counts as getValidMoves.
     '''
 
+    def stagedPerft(self, gs, depth):
+        if depth == 0:
+            return 1
+        nodes = 0
+        ids = []
+        for move in gs.getStagedMoves():
+            ids.append(move.moveID)
+            gs.makeChessMove(move)
+            nodes += self.stagedPerft(gs, depth - 1)
+            gs.undoMove()
+        self.assertEqual(len(ids), len(set(ids)))
+        return nodes
+
+    def test_StagedPerft(self):
+        for boardClass in (GameBoard, BitBoard):
+            for name, fen, expected in PERFT_POSITIONS[1:5]:
+                with self.subTest(backend=boardClass.__name__, position=name):
+                    self.assertEqual(self.stagedPerft(boardClass.fromFEN(fen), 2), expected[1])
+
+    def test_StageOrder(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(PERFT_POSITIONS[1][1])
+            quiet = [m for m in gs.getValidMoves() if m.getChessNotation() == "a2a3"][0]
+            killer = [m for m in gs.getValidMoves() if m.getChessNotation() == "e1g1"][0]
+            moves = list(gs.getStagedMoves(quiet.moveID, (killer.moveID, quiet.moveID)))
+            self.assertEqual(len(moves), 48)
+            self.assertEqual(moves[0], quiet)
+            captures = [move for move in moves[1:] if move.pieceCaptured != "--"]
+            self.assertEqual(moves[1:1 + len(captures)], captures)  # all captures come right after the hash move
+            self.assertEqual(captures[0].getChessNotation(), "e2a6")  # bishop takes bishop before pawn takes pawn
+            self.assertEqual(moves[1 + len(captures)], killer)
 
-    #def isInCheck():
-        #pass
+    def test_IllegalHashMoveIsSkipped(self):
+        gs = GameBoard()
+        illegal = Move((7, 0), (5, 0), gs.board)  # rook jumping over its pawn
+        moves = list(gs.getStagedMoves(illegal.moveID, (illegal.moveID,)))
+        self.assertEqual(len(moves), 20)
+        self.assertNotIn(illegal, moves)
 
+
+class ZobristHashing(unittest.TestCase):
     '''
-    This method will show if a king is in checkmate or not
+    Walks the move tree and checks that the incrementally updated key always equals the key built from scratch, and
+    that undoMove puts the old key back.
     '''
 
+    def walk(self, gs, depth):
+        self.assertEqual(gs.zobristKey, gs.computeZobristKey())
+        if depth == 0:
+            return
+        for move in gs.getValidMoves():
+            key = gs.zobristKey
+            gs.makeChessMove(move)
+            self.walk(gs, depth - 1)
+            gs.undoMove()
+            self.assertEqual(gs.zobristKey, key)
+
+    def test_IncrementalKeyMatchesFullKey(self):
+        for boardClass in (GameBoard, BitBoard):
+            for name, fen, expected in PERFT_POSITIONS[1:4]:  # castling, en passant and promotions all come up
+                with self.subTest(backend=boardClass.__name__, position=name):
+                    self.walk(boardClass.fromFEN(fen), 2)
+
+    def test_TranspositionsGetTheSameKey(self):
+        gs = GameBoard()
+        startKey = gs.zobristKey
+        for notation in ("g1f3", "g8f6", "f3g1", "f6g8"):
+            move = [m for m in gs.getValidMoves() if m.getChessNotation() == notation][0]
+            gs.makeChessMove(move)
+        self.assertEqual(gs.zobristKey, startKey)
+        self.assertEqual(BitBoard().zobristKey, startKey)  # both backends use the same keys
+        # kings walk out and back: same pieces on the same squares as after 1. e4 e5, but no castling rights
+        for notation in ("e2e4", "e7e5", "e1e2", "e8e7", "e2e1", "e7e8"):
+            move = [m for m in gs.getValidMoves() if m.getChessNotation() == notation][0]
+            gs.makeChessMove(move)
+        other = GameBoard()
+        for notation in ("e2e4", "e7e5"):
+            move = [m for m in other.getValidMoves() if m.getChessNotation() == notation][0]
+            other.makeChessMove(move)
+        self.assertEqual(gs.board, other.board)
+        self.assertNotEqual(gs.zobristKey, other.zobristKey)
+
 
-    #def isInCheckmate():
-        #pass
\ No newline at end of file
+class FENAndClone(unittest.TestCase):
+    def test_RoundTrip(self):
+        fens = [fen for name, fen, counts in PERFT_POSITIONS] + \
+               ["rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 3", "8/8/8/8/8/8/8/K6k w - - 37 81"]
+        for boardClass in (GameBoard, BitBoard):
+            for fen in fens:
+                self.assertEqual(boardClass.fromFEN(fen).toFEN(), fen)
+
+    def test_MoveCounters(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass()
+            self.assertEqual(gs.toFEN(), "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+            for notation in ("g1f3", "g8f6", "e2e4"):
+                gs.makeChessMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+            self.assertEqual(gs.toFEN(), "rnbqkb1r/pppppppp/5n2/8/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq e3 0 2")
+            gs.undoMove()
+            self.assertEqual(gs.toFEN(), "rnbqkb1r/pppppppp/5n2/8/8/5N2/PPPPPPPP/RNBQKB1R w KQkq - 2 2")
+            gs.undoMove()
+            gs.undoMove()
+            self.assertEqual(gs.toFEN(), "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+
+    def test_FENMatchesPlayedPosition(self):
+        played = GameBoard()
+        for notation in ("e2e4", "d7d5", "e4e5", "f7f5"):
+            played.makeChessMove(next(move for move in played.getValidMoves() if move.getChessNotation() == notation))
+        loaded = GameBoard.fromFEN(played.toFEN())
+        self.assertEqual(loaded.zobristKey, played.zobristKey)
+        self.assertEqual(loaded.getValidMoves(), played.getValidMoves())  # includes e5xf6 en passant
+
+    def test_CloneIsIndependent(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(PERFT_POSITIONS[1][1])
+            gs.makeChessMove(gs.getValidMoves()[0])
+            copyOfGame = gs.clone()
+            self.assertEqual(copyOfGame.toFEN(), gs.toFEN())
+            self.assertEqual(copyOfGame.zobristKey, gs.zobristKey)
+            self.assertEqual(len(copyOfGame.logOfMoves), 0)
+            self.assertEqual(copyOfGame.perft(2), gs.perft(2))
+            fen = gs.toFEN()
+            copyOfGame.makeChessMove(copyOfGame.getValidMoves()[0])
+            self.assertEqual(gs.toFEN(), fen)  # the original didn't move
+            copyOfGame.undoMove()
+            self.assertEqual(copyOfGame.toFEN(), fen)
+
+    def test_CloneLeavesTheLegalMoveIndexBehind(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass()
+            gs.getLegalMoveIndex()
+            copyOfGame = gs.clone()
+            self.assertIsNone(copyOfGame.legalMoveIndex)
+            self.assertLess(len(pickle.dumps(copyOfGame)), len(pickle.dumps(gs)))
+            self.assertEqual(len(copyOfGame.getLegalMoveIndex()), 20)
+
+
+class IncrementalEvaluation(unittest.TestCase):
+    '''
+    Same walk for the evaluation scores: after every make and undo they must equal the scores counted from scratch.
+    '''
+
+    def walk(self, gs, depth):
+        self.assertEqual((gs.openingScore, gs.endgameScore, gs.gamePhase), computeScores(gs.board))
+        if depth == 0:
+            return
+        for move in gs.getValidMoves():
+            gs.makeChessMove(move)
+            self.walk(gs, depth - 1)
+            gs.undoMove()
+
+    def test_IncrementalScoresMatchFullScores(self):
+        for boardClass in (GameBoard, BitBoard):
+            for name, fen, expected in PERFT_POSITIONS[1:5]:  # castling, en passant and promotions all come up
+                with self.subTest(backend=boardClass.__name__, position=name):
+                    self.walk(boardClass.fromFEN(fen), 2)
+
+    def test_StartPositionIsBalanced(self):
+        gs = GameBoard()
+        self.assertEqual(gs.gamePhase, MAX_PHASE)
+        self.assertEqual(evaluate(gs), 0)
+
+    def test_KingEndgameTable(self):
+        centre = GameBoard.fromFEN("4k3/8/8/8/3K4/8/8/8 w - - 0 1")
+        corner = GameBoard.fromFEN("4k3/8/8/8/8/8/8/K7 w - - 0 1")
+        self.assertEqual(centre.gamePhase, 0)
+        self.assertGreater(evaluate(centre), evaluate(corner))
+
+
+class Search(unittest.TestCase):
+    def test_FindsMateInOne(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+            result = Searcher(maxDepth=3, timeLimit=None).search(gs)
+            self.assertEqual(result.bestMove.getChessNotation(), "a1a8")
+            self.assertEqual(result.score, CHECKMATE - 1)
+
+    def test_PrincipalVariationIsPlayable(self):
+        gs = GameBoard()
+        result = Searcher(maxDepth=4, timeLimit=None).search(gs)
+        self.assertEqual(result.depth, 4)
+        self.assertTrue(1 <= len(result.principalVariation) <= 4)  # hash table cutoffs can shorten the line
+        self.assertEqual(result.principalVariation[0], result.bestMove)
+        for move in result.principalVariation:
+            self.assertIn(move, gs.getValidMoves())
+            gs.makeChessMove(move)
+
+    def test_NodeLimitLeavesBoardUntouched(self):
+        gs = GameBoard.fromFEN(PERFT_POSITIONS[1][1])
+        board = [row[:] for row in gs.board]
+        key = gs.zobristKey
+        result = Searcher(timeLimit=None, nodeLimit=3000).search(gs)
+        self.assertIn(result.bestMove, gs.getValidMoves())
+        self.assertEqual(gs.board, board)
+        self.assertEqual(gs.zobristKey, key)
+        self.assertEqual(len(gs.logOfMoves), 0)
+
+
+class SelectiveSearch(unittest.TestCase):
+    PLAIN = dict(usePVS=False, useNullMove=False, useLMR=False)
+
+    def test_NullMoveRoundTrip(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 3")  # d4xe3 possible
+            key = gs.zobristKey
+            gs.makeNullMove()
+            self.assertTrue(gs.whiteToMove)
+            self.assertEqual(gs.enPassantPossible, ())
+            self.assertEqual(gs.zobristKey, gs.computeZobristKey())
+            gs.undoNullMove()
+            self.assertFalse(gs.whiteToMove)
+            self.assertEqual(gs.enPassantPossible, (5, 4))
+            self.assertEqual(gs.zobristKey, key)
+            self.assertEqual(gs.ply, 0)
+
+    def test_NonPawnMaterial(self):
+        for boardClass in (GameBoard, BitBoard):
+            self.assertTrue(boardClass.fromFEN("4k3/8/8/8/8/8/4P3/4KN2 w - - 0 1").hasNonPawnMaterial())
+            self.assertFalse(boardClass.fromFEN("4k3/8/8/8/8/8/4P3/4KN2 b - - 0 1").hasNonPawnMaterial())
+
+    def test_EveryCombinationFindsMate(self):
+        fen = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"  # Qxf7#
+        for usePVS in (False, True):
+            for useNullMove in (False, True):
+                for useLMR in (False, True):
+                    searcher = Searcher(maxDepth=3, timeLimit=None, usePVS=usePVS, useNullMove=useNullMove,
+                                        useLMR=useLMR)
+                    result = searcher.search(GameBoard.fromFEN(fen))
+                    self.assertEqual(result.bestMove.getChessNotation(), "h5f7")
+                    self.assertEqual(result.score, CHECKMATE - 1)
+
+    def test_SelectivitySearchesFewerNodes(self):
+        fen = PERFT_POSITIONS[1][1]
+        plain = Searcher(maxDepth=4, timeLimit=None, **self.PLAIN).search(GameBoard.fromFEN(fen))
+        selective = Searcher(maxDepth=4, timeLimit=None).search(GameBoard.fromFEN(fen))
+        self.assertLess(selective.nodes, plain.nodes)
+
+    def test_TimeoutUndoesNullMoves(self):
+        gs = GameBoard.fromFEN(PERFT_POSITIONS[1][1])
+        key = gs.zobristKey
+        for nodeLimit in range(1000, 5000, 500):  # stops the search at many different places in the tree
+            Searcher(timeLimit=None, nodeLimit=nodeLimit).search(gs)
+            self.assertEqual(gs.zobristKey, key)
+            self.assertTrue(gs.whiteToMove)
+            self.assertEqual(gs.ply, 0)
+
+
+class MoveOrdering(unittest.TestCase):
+    def test_MvvLva(self):
+        gs = GameBoard()
+        pawnTakesQueen = Move((6, 4), (5, 3), gs.board, pieceCaptured="bQ")
+        queenTakesQueen = Move((7, 3), (5, 3), gs.board, pieceCaptured="bQ")
+        pawnTakesRook = Move((6, 4), (5, 3), gs.board, pieceCaptured="bR")
+        self.assertGreater(mvvLvaScore(pawnTakesQueen), mvvLvaScore(queenTakesQueen))
+        self.assertGreater(mvvLvaScore(queenTakesQueen), mvvLvaScore(pawnTakesRook))
+
+    def test_KillersAndHistory(self):
+        gs = GameBoard()
+        orderer = MoveOrderer()
+        first, second, third = [Move(start, end, gs.board) for start, end in
+                                (((6, 0), (5, 0)), ((6, 1), (5, 1)), ((6, 2), (5, 2)))]
+        for move in (first, second, second, third):
+            orderer.addCutoff(move, 3, 4, 1)
+        self.assertEqual(orderer.getKillers(3), (third.moveID, second.moveID))  # 2 slots, newest first
+        self.assertEqual(orderer.getKillers(2), ())
+        self.assertEqual(orderer.history[second.moveID & 0xFFF], 32)
+        capture = Move((6, 4), (5, 3), gs.board, pieceCaptured="bQ")
+        orderer.addCutoff(capture, 3, 4, 2)  # captures aren't killers
+        self.assertEqual(orderer.getKillers(3), (third.moveID, second.moveID))
+        self.assertEqual((orderer.cutoffs, orderer.firstMoveCutoffs), (5, 4))
+        orderer.newSearch()  # history ages, killers are dropped
+        self.assertEqual(orderer.history[second.moveID & 0xFFF], 16)
+        self.assertEqual(orderer.getKillers(3), ())
+        orderer.history[first.moveID & 0xFFF] = HISTORY_MAX - 1
+        orderer.addCutoff(first, 0, 1, 1)
+        self.assertEqual(orderer.history[first.moveID & 0xFFF], HISTORY_MAX // 2)
+        self.assertEqual(orderer.history[second.moveID & 0xFFF], 8)
+
+    def test_OrderingSearchesFewerNodes(self):
+        nodes = []
+        for orderer in (MoveOrderer(useKillers=False, useHistory=False), MoveOrderer()):
+            searcher = Searcher(maxDepth=4, timeLimit=None, moveOrderer=orderer)
+            result = searcher.search(GameBoard.fromFEN(PERFT_POSITIONS[2][1]))
+            self.assertEqual(result.depth, 4)
+            nodes.append(result.nodes)
+        self.assertLess(nodes[1], nodes[0])
+
+
+class StaticExchange(unittest.TestCase):
+    cases = [("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1", "e4d5", 100),  # free pawn
+             ("4k3/8/2p5/3p4/8/8/3R4/4K3 w - - 0 1", "d2d5", -400),  # rook for a defended pawn
+             ("4k3/8/2p5/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", -300),  # second rook recaptures: 2 pawns for a rook
+             ("4k3/8/2p5/3n4/8/5B2/6Q1/4K3 w - - 0 1", "f3d5", 90)]  # queen behind the bishop recaptures (x-ray)
+
+    def test_StaticExchange(self):
+        for boardClass in (GameBoard, BitBoard):
+            for fen, notation, expected in self.cases:
+                with self.subTest(backend=boardClass.__name__, fen=fen):
+                    gs = boardClass.fromFEN(fen)
+                    board = [row[:] for row in gs.board]
+                    move = [m for m in gs.getValidMoves() if m.getChessNotation() == notation][0]
+                    self.assertEqual(gs.staticExchange(move), expected)
+                    self.assertEqual(gs.board, board)
+
+    def test_CaptureMoves(self):
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(PERFT_POSITIONS[1][1])
+            captures = gs.getCaptureMoves()
+            self.assertEqual(sorted(m.getChessNotation() for m in captures),
+                             sorted(m.getChessNotation() for m in gs.getValidMoves() if m.pieceCaptured != "--"))
+            self.assertEqual(captures[0].getChessNotation(), "e2a6")
+
+
+class Quiescence(unittest.TestCase):
+    def test_SeesTheRecapture(self):
+        # at depth 1 without quiescence Qxd5 just wins a pawn; with it the recapture cxd5 is seen
+        fen = "4k3/8/2p5/3p4/8/8/3Q4/4K3 w - - 0 1"
+        for useQuiescence, takes in ((False, True), (True, False)):
+            searcher = Searcher(maxDepth=1, timeLimit=None, useQuiescence=useQuiescence)
+            result = searcher.search(GameBoard.fromFEN(fen))
+            self.assertEqual(result.bestMove.getChessNotation() == "d2d5", takes)
+
+    def test_QuiescenceFindsMateInCheck(self):
+        gs = GameBoard.fromFEN("R5k1/5ppp/8/8/8/8/5PPP/6K1 b - - 0 1")  # back rank mate on the board
+        self.assertEqual(Searcher(timeLimit=None).quiescence(gs, -CHECKMATE - 1, CHECKMATE + 1, 0), -CHECKMATE)
+
+
+class TranspositionTableTests(unittest.TestCase):
+    def test_StoreAndProbe(self):
+        table = TranspositionTable(1)
+        self.assertEqual(table.mask + 1, 65536)  # 1MB / 16 bytes per entry
+        table.store(0x123456789ABCDEF0, 7, -250, BOUND_LOWER, 6444)
+        self.assertEqual(table.probe(0x123456789ABCDEF0), (7, -250, BOUND_LOWER, 6444))
+        self.assertIsNone(table.probe(0x0FEDCBA987654321))
+        self.assertEqual((table.hits, table.misses), (1, 1))
+
+    def test_DepthPreferredReplacement(self):
+        table = TranspositionTable(1)
+        first, second = 5, 5 + table.mask + 1  # two keys that share a slot
+        table.store(first, 6, 10, BOUND_EXACT, 1)
+        table.store(second, 3, 20, BOUND_EXACT, 2)  # shallower result from the same search is thrown away
+        self.assertIsNotNone(table.probe(first))
+        self.assertIsNone(table.probe(second))
+        table.newSearch()
+        table.store(second, 3, 20, BOUND_EXACT, 2)  # the deep entry is from an older search now
+        self.assertEqual(table.probe(second), (3, 20, BOUND_EXACT, 2))
+        self.assertEqual(table.overwrites, 1)
+        table.store(second, 4, 30, BOUND_EXACT, NO_MOVE)  # same position without a best move keeps the old one
+        self.assertEqual(table.probe(second), (4, 30, BOUND_EXACT, 2))
+
+    def test_SearchUsesTable(self):
+        # plain alpha-beta: with null moves and reductions the result can depend on what the table already holds
+        searcher = Searcher(maxDepth=4, timeLimit=None, **SelectiveSearch.PLAIN)
+        first = searcher.search(GameBoard())
+        second = searcher.search(GameBoard())  # same position again: the table answers most of it
+        self.assertEqual(first.bestMove, second.bestMove)
+        self.assertLess(second.nodes, first.nodes)
+        self.assertGreater(searcher.transpositionTable.hits, 0)
+
+    def test_TornEntryIsAMiss(self):
+        table = TranspositionTable(1)
+        key = 0x123456789ABCDEF0
+        table.store(key, 7, -250, BOUND_LOWER, 6444)
+        index = key & table.mask
+        table.data[index] ^= 1 << 40  # data word from another write: key ^ data no longer gives the key
+        self.assertIsNone(table.probe(key))
+
+
+class LazySMP(unittest.TestCase):
+    def test_SharedTableIsShared(self):
+        owner = SharedTranspositionTable(1)
+        attached = SharedTranspositionTable(1, owner.blockName())
+        owner.store(42, 5, 77, BOUND_EXACT, 123)
+        self.assertEqual(attached.probe(42), (5, 77, BOUND_EXACT, 123))
+        attached.clear()
+        self.assertIsNone(owner.probe(42))
+        attached.close()
+        owner.close()
+
+    def test_HelpersSkipDifferentDepths(self):
+        searchers = [Searcher(maxDepth=10, helperIndex=helperIndex) for helperIndex in range(4)]
+        searched = [[depth for depth in range(1, 11) if not searcher.skipsDepth(depth)] for searcher in searchers]
+        self.assertEqual(searched[0], list(range(1, 11)))
+        self.assertEqual(searched[1], [2, 4, 6, 8, 10])
+        self.assertEqual(searched[2], [1, 3, 5, 7, 9, 10])
+        self.assertEqual(len(set(map(tuple, searched))), 4)
+
+    def test_ParallelSearchFindsMate(self):
+        searcher = ParallelSearcher(workers=2, maxDepth=3, timeLimit=None)
+        try:
+            gs = GameBoard.fromFEN("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+            result = searcher.search(gs)
+            self.assertEqual(result.bestMove.getChessNotation(), "a1a8")
+            self.assertEqual(len(searcher.helperResults), 1)
+            self.assertEqual(len(gs.logOfMoves), 0)
+        finally:
+            searcher.close()
+
+    def test_DeadHelperIsSkipped(self):
+        searcher = ParallelSearcher(workers=3, maxDepth=2, timeLimit=None)
+        try:
+            searcher.helpers[0].terminate()
+            searcher.helpers[0].join()
+            result = searcher.search(GameBoard())  # would wait forever for the dead helper's result
+            self.assertIsNotNone(result.bestMove)
+            self.assertEqual(len(searcher.helpers), 1)
+            self.assertEqual(len(searcher.helperResults), 1)
+        finally:
+            searcher.close()
+
+
+class BackgroundSearch(unittest.TestCase):
+    def waitForMove(self, worker, seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            move = worker.poll()
+            if move is not None:
+                return move
+            time.sleep(0.01)
+        return None
+
+    def test_PollReturnsMoveWithoutBlocking(self):
+        worker = AIWorker(timeLimit=0.5)
+        try:
+            worker.start(GameBoard.fromFEN("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"))
+            startTime = time.perf_counter()
+            worker.poll()
+            self.assertLess(time.perf_counter() - startTime, 0.05)
+            self.assertEqual(self.waitForMove(worker, 5.0).getChessNotation(), "a1a8")
+            self.assertFalse(worker.thinking)
+        finally:
+            worker.close()
+
+    def test_CancelDropsTheOldSearch(self):
+        worker = AIWorker(timeLimit=10.0)
+        try:
+            worker.start(GameBoard())
+            time.sleep(0.2)
+            worker.cancel()
+            self.assertIsNone(worker.poll())
+            worker.timeLimit = 0.5
+            worker.start(GameBoard.fromFEN("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"))
+            self.assertEqual(self.waitForMove(worker, 3.0).getChessNotation(), "a1a8")  # not the start position's move
+        finally:
+            worker.close()
+
+
+class UCIProtocol(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.engine = UCIEngine(self.output)
+
+    def lines(self):
+        return self.output.getvalue().splitlines()
+
+    def test_Handshake(self):
+        self.engine.handleCommand("uci")
+        self.engine.handleCommand("isready")
+        self.assertEqual(self.lines()[-2:], ["uciok", "readyok"])
+        self.assertFalse(self.engine.handleCommand("quit"))
+
+    def test_PositionWithMoves(self):
+        self.engine.handleCommand("position startpos moves e2e4 e7e5 g1f3")
+        self.assertFalse(self.engine.gameState.whiteToMove)
+        self.assertEqual(self.engine.gameState.board[5][5], "wN")
+        self.engine.handleCommand("position fen 4k3/P7/8/8/8/8/8/4K3 w - - 0 1 moves a7a8n")
+        self.assertEqual(self.engine.gameState.board[0][0], "wN")
+
+    def test_GoDepthAnswersBestMove(self):
+        self.engine.handleCommand("position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        self.engine.handleCommand("go depth 3")
+        self.engine.waitForSearch()
+        self.assertIn("score mate 1", self.lines()[-2])
+        self.assertEqual(self.lines()[-1], "bestmove a1a8")
+
+    def test_MalformedGoIsIgnored(self):
+        self.engine.handleCommand("position fen 6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        for command in ("go depth 2 movetime", "go wtime abc depth 2", "go depth x depth 2"):
+            with self.subTest(command=command):
+                self.engine.handleCommand(command)  # the limit without a number is left out, the rest still counts
+                self.engine.waitForSearch()
+                self.assertEqual(self.engine.searcher.maxDepth, 2)
+                self.assertEqual(self.lines()[-1], "bestmove a1a8")
+
+    def test_StopEndsInfiniteSearch(self):
+        self.engine.handleCommand("position startpos")
+        self.engine.handleCommand("go infinite")
+        time.sleep(0.2)
+        self.engine.handleCommand("isready")
+        self.assertIn("readyok", self.lines())
+        startTime = time.perf_counter()
+        self.engine.handleCommand("stop")
+        self.assertLess(time.perf_counter() - startTime, 0.5)
+        self.assertTrue(self.lines()[-1].startswith("bestmove "))
+
+    def test_PositionDuringInfiniteSearch(self):
+        self.engine.handleCommand("position startpos")
+        self.engine.handleCommand("go infinite")
+        time.sleep(0.2)
+        command = threading.Thread(target=self.engine.handleCommand, args=("position startpos moves e2e4",), daemon=True)
+        command.start()
+        command.join(2.0)
+        self.assertFalse(command.is_alive())  # the infinite search is ended instead of waited for
+        self.assertTrue(self.lines()[-1].startswith("bestmove "))
+        self.engine.handleCommand("isready")
+        self.assertEqual(self.lines()[-1], "readyok")
+        self.assertFalse(self.engine.gameState.whiteToMove)
+        self.assertFalse(self.engine.handleCommand("quit"))
+
+    def test_TimeAndScoreFormats(self):
+        self.assertAlmostEqual(allocateTime(60000, 0, 20), 3.0)
+        self.assertLess(allocateTime(100, 5000), 0.1)  # never more than the clock has left
+        self.assertEqual(formatScore(35), "cp 35")
+        self.assertEqual(formatScore(CHECKMATE - 3), "mate 2")
+        self.assertEqual(formatScore(-(CHECKMATE - 2)), "mate -1")
+
+
+class PGNReadWrite(unittest.TestCase):
+    # the Opera game (Morphy, Paris 1858), with the comments, NAGs, variations and move numbers archives are full of
+    OPERA_GAME = """[Event "Paris"]
+[White "Paul Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {This is a weak move
+already.--Fischer} 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7
+8. Nc3 c6 9. Bg5 {Black is in what's like a zugzwang position here.} b5 $6
+10. Nxb5! cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 (12... O-O-O 13. Ba6+ (13. Qa4) Kb8) 13. Rxd7 Rxd7 14.
+Rd1 Qe6 15.Bxd7+ Nxd7 16. Qb8+ ; a queen sacrifice
+% a line for some other program
+Nxb8 17. Rd8# 1-0
+
+[Event "?"]
+[SetUp "1"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+[Result "*"]
+
+1. a8=Q+ Kd7 2. Qb7+ *
+"""
+    OPERA_END = "1n1Rkb1r/p4ppp/4q3/4p1B1/4P3/8/PPP2PPP/2K5 b k - 1 17"
+
+    def test_ReadAndReplay(self):
+        games = list(readGames(io.StringIO(self.OPERA_GAME)))
+        self.assertEqual(len(games), 2)
+        opera, promotion = games
+        self.assertEqual((opera.headers["White"], opera.result, len(opera.moves)), ("Paul Morphy", "1-0", 33))
+        self.assertEqual(opera.moves[17:19], ["b5", "Nxb5!"])  # nothing of the variation got in
+        for boardClass in (GameBoard, BitBoard):
+            gs = opera.replay(boardClass)
+            self.assertEqual(gs.toFEN(), self.OPERA_END)
+            self.assertEqual(gs.gameStatus(), GAME_CHECKMATE)
+            self.assertEqual(promotion.replay(boardClass).toFEN(), "8/1Q1k4/8/8/8/8/8/4K3 b - - 2 2")
+
+    def test_WriteAndReadBack(self):
+        opera = next(readGames(io.StringIO(self.OPERA_GAME)))
+        for boardClass in (GameBoard, BitBoard):
+            gs = opera.replay(boardClass)
+            text = formatGame(gs, {"Event": "Paris", "White": "Paul Morphy"})
+            self.assertEqual(gs.toFEN(), self.OPERA_END)  # the board was taken back and played forward again
+            self.assertIn('[White "Paul Morphy"]', text)
+            self.assertIn("12. O-O-O Rd8 13. Rxd7 Rxd7", text)
+            self.assertTrue(text.rstrip().endswith("17. Rd8# 1-0"))  # the result comes from the checkmate
+            self.assertTrue(all(len(line) < 80 for line in text.splitlines()))
+            again = next(readGames(io.StringIO(text)))
+            self.assertEqual(again.moves, [san.rstrip("!") for san in opera.moves])
+
+    def test_WriteFromAPosition(self):
+        gs = GameBoard.fromFEN("4k3/P7/8/8/8/8/8/4K3 b - - 0 30")
+        gs.makeChessMove(parseSAN(gs, "Kd7"))
+        gs.makeChessMove(parseSAN(gs, "a8=N"))
+        text = formatGame(gs)
+        self.assertIn('[FEN "4k3/P7/8/8/8/8/8/4K3 b - - 0 30"]', text)
+        self.assertIn("30... Kd7 31. a8=N 1/2-1/2", text)  # king and knight against king
+
+    def test_Disambiguation(self):
+        cases = [("4k3/8/8/8/8/8/4K3/R6R w - - 0 1", "a1d1", "Rad1"),  # by file
+                 ("4k3/8/8/R7/8/8/8/R3K3 w - - 0 1", "a1a3", "R1a3"),  # by rank
+                 ("2k5/8/8/8/4Q2Q/8/8/K6Q w - - 0 1", "h4e1", "Qh4e1"),  # by both
+                 ("4k3/8/8/8/8/8/3N4/4K1N1 w - - 0 1", "g1f3", "Ngf3"),
+                 ("4k3/8/8/8/1b6/8/3N4/4K1N1 w - - 0 1", "g1f3", "Nf3")]  # the d2 knight is pinned: no need
+        for fen, notation, san in cases:
+            for boardClass in (GameBoard, BitBoard):
+                with self.subTest(board=boardClass.__name__, fen=fen):
+                    gs = boardClass.fromFEN(fen)
+                    move = gs.getLegalMove(Move.moveIDFromNotation(notation))
+                    self.assertEqual(toSAN(gs, move), san)
+                    self.assertEqual(parseSAN(gs, san), move)
+                    self.assertEqual(gs.toFEN(), fen)
+
+    def test_BadMoves(self):
+        gs = GameBoard.fromFEN("4k3/8/8/8/8/8/8/R3K2R w K - 0 1")
+        for san in ("Ke3", "O-O-O", "Nf3", "e4", "hello"):
+            with self.subTest(san=san):
+                self.assertRaises(PGNError, parseSAN, gs, san)
+        self.assertRaises(PGNError, parseSAN, GameBoard.fromFEN("4k3/8/8/8/8/8/4K3/R6R w - - 0 1"), "Rd1")  # ambiguous
+        self.assertTrue(parseSAN(gs, "0-0").isCastleMove)
+        game = next(readGames(io.StringIO("1. e4 e5 2. Ke3 *")))
+        self.assertRaises(PGNError, game.replay)
+
+    def test_CaptureAndPromotionMustMatch(self):
+        fen = "r3k3/1P6/8/3p4/4P3/8/8/4KN2 w - d6 0 1"
+        for boardClass in (GameBoard, BitBoard):
+            gs = boardClass.fromFEN(fen)
+            for san in ("Nxe3", "e4d5", "e4xd5", "xd5", "ed5", "exe5", "b8", "bxa8", "e5=Q"):
+                with self.subTest(board=boardClass.__name__, san=san):
+                    self.assertRaises(PGNError, parseSAN, gs, san)
+            for san, notation in (("Ne3", "f1e3"), ("exd5", "e4d5"), ("b8=Q", "b7b8q"), ("bxa8=N", "b7a8n")):
+                self.assertEqual(parseSAN(gs, san).moveID, Move.moveIDFromNotation(notation))
+        gs = GameBoard.fromFEN("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        self.assertTrue(parseSAN(gs, "exd6").isEnpassantMove)  # x even though d6 is empty
+        self.assertRaises(PGNError, parseSAN, gs, "ed6")
+
+    def test_CompressedArchives(self):
+        opera = next(readGames(io.StringIO(self.OPERA_GAME)))
+        with tempfile.TemporaryDirectory() as folder:
+            for name, opener in (("games.pgn.gz", gzip.open), ("games.pgn.bz2", bz2.open)):
+                path = os.path.join(folder, name)
+                with opener(path, "wt", encoding="utf-8") as output:
+                    for _ in range(3):
+                        writeGame(output, opera.replay())
+                games = list(readGames(path))
+                self.assertEqual(len(games), 3)
+                self.assertEqual(games[2].replay().toFEN(), self.OPERA_END)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can run without pygame inside chess GUIs and match runners.
+It reads commands from stdin and answers on stdout:
+
+    uci, isready, ucinewgame, setoption name Hash|Threads value <n>,
+    position startpos|fen <FEN> [moves <move> ...],
+    go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [movestogo <n>] [nodes <n>]
+       [infinite],
+    stop, quit
+
+The search runs on a worker thread, so stop and isready are answered while it is thinking. With Threads above 1 it is
+a Lazy SMP search (ChessSMP) using that many processes. Anything else the engine
+prints (e.g. the message of undoMove at the start of the game) goes to stderr, so it can't corrupt the protocol
+stream.
+
+Run it from the project folder:  python -m Chess.uci
+"""
+import sys
+import threading
+import time
+
+from Chess.ChessEngine import GameBoard, Move
+from Chess.ChessAI import Searcher, CHECKMATE, MAX_PLY
+from Chess.ChessSMP import ParallelSearcher
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "Chess project"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+DEFAULT_MOVES_TO_GO = 30  # with no movestogo the remaining time is shared out as if this many moves were left
+MOVE_OVERHEAD = 0.05  # seconds kept back from every move for reading input and printing the answer
+
+'''
+Seconds to think with timeLeft and increment given in milliseconds: an equal share of the time left over the moves to
+go, plus most of the increment, but never more than the clock has left.
+'''
+
+
+def allocateTime(timeLeft, increment=0, movesToGo=None):
+    timeLeft /= 1000.0
+    increment /= 1000.0
+    share = timeLeft / (movesToGo if movesToGo else DEFAULT_MOVES_TO_GO) + increment * 0.75
+    return max(0.01, min(share, timeLeft - MOVE_OVERHEAD))
+
+
+'''
+UCI score field: "cp <centipawns>", or "mate <moves>" (negative when the engine is getting mated).
+'''
+
+
+def formatScore(score):
+    if score >= CHECKMATE - MAX_PLY:
+        return "mate " + str((CHECKMATE - score + 1) // 2)
+    if score <= -(CHECKMATE - MAX_PLY):
+        return "mate -" + str((CHECKMATE + score) // 2)
+    return "cp " + str(score)
+
+
+class UCIEngine():
+    def __init__(self, output=None):
+        self.output = output if output is not None else sys.stdout
+        self.outputLock = threading.Lock()  # the worker thread prints info and bestmove lines too
+        self.hashSizeMB = DEFAULT_HASH_MB
+        self.threads = 1
+        self.searcher = self.makeSearcher()
+        self.gameState = GameBoard()
+        self.worker = None
+        self.stopSignal = threading.Event()  # tells an infinite search it may print its bestmove
+        self.searchStart = 0.0
+
+    def makeSearcher(self):
+        if self.threads > 1:
+            return ParallelSearcher(workers=self.threads, hashSizeMB=self.hashSizeMB, timeLimit=None,
+                                    onDepthCompleted=self.sendInfo)
+        return Searcher(timeLimit=None, hashSizeMB=self.hashSizeMB, onDepthCompleted=self.sendInfo)
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handles one line of input. Returns False after quit.
+    '''
+
+    def handleCommand(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")  # answered straight away, even during a search
+        elif command == "ucinewgame":
+            self.stopSearch()  # a search still running (even "go infinite") is finished before the state changes
+            self.searcher.transpositionTable.clear()
+            self.gameState = GameBoard()
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(tokens[1:])
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.startSearch(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            self.closeSearcher()
+            return False
+        return True  # unknown commands are ignored, as the protocol asks
+
+    def setOption(self, tokens):
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if not value.isdigit():
+            return
+        if name == "hash":
+            self.hashSizeMB = max(1, min(int(value), MAX_HASH_MB))
+        elif name == "threads":
+            self.threads = max(1, min(int(value), MAX_THREADS))
+        else:
+            return
+        self.closeSearcher()
+        self.searcher = self.makeSearcher()
+
+    def closeSearcher(self):
+        if isinstance(self.searcher, ParallelSearcher):
+            self.searcher.close()  # ends the helper processes and frees the shared table
+
+    '''
+    position startpos [moves ...] or position fen <6 fields> [moves ...]. The moves are in long algebraic notation
+    (e2e4, e7e8q), which is what Move.getChessNotation returns.
+    '''
+
+    def setPosition(self, tokens):
+        movesIndex = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if tokens and tokens[0] == "fen":
+            gameState = GameBoard.fromFEN(" ".join(tokens[1:movesIndex]))
+        else:
+            gameState = GameBoard.fromFEN(START_FEN)
+        for notation in tokens[movesIndex + 1:]:
+            move = self.parseMove(gameState, notation)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            gameState.makeChessMove(move)
+        self.gameState = gameState
+
+    def parseMove(self, gameState, notation):
+        moveID = Move.moveIDFromNotation(notation)
+        return gameState.getLegalMove(moveID) if moveID is not None else None
+
+    '''
+    Sets the limits for the go command and starts the search on the worker thread.
+    '''
+
+    def startSearch(self, tokens):
+        limits = {}
+        infinite = False
+        i = 0
+        while i < len(tokens):
+            if tokens[i] == "infinite":
+                infinite = True
+            elif tokens[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes") and \
+                    i + 1 < len(tokens) and tokens[i + 1].lstrip("-").isdigit():
+                limits[tokens[i]] = int(tokens[i + 1])
+                i += 1
+            # a limit without a number after it (a truncated or garbled command) is left out
+            i += 1
+        searcher = self.searcher
+        searcher.maxDepth = min(limits.get("depth", MAX_PLY), MAX_PLY)
+        searcher.nodeLimit = limits.get("nodes")
+        timeLeft = limits.get("wtime" if self.gameState.whiteToMove else "btime")
+        if infinite:
+            searcher.timeLimit = None
+        elif "movetime" in limits:
+            searcher.timeLimit = max(0.01, limits["movetime"] / 1000.0 - MOVE_OVERHEAD)
+        elif timeLeft is not None:
+            searcher.timeLimit = allocateTime(timeLeft, limits.get("winc" if self.gameState.whiteToMove else "binc", 0),
+                                              limits.get("movestogo"))
+        else:
+            searcher.timeLimit = None  # depth or nodes only (or nothing: think until stop)
+        searcher.stopRequested = False
+        self.stopSignal.clear()
+        self.searchStart = time.perf_counter()
+        self.worker = threading.Thread(target=self.runSearch, args=(self.gameState, infinite), daemon=True)
+        self.worker.start()
+
+    def runSearch(self, gameState, infinite):
+        result = self.searcher.search(gameState)
+        if infinite:  # "go infinite" must not answer before the GUI says stop
+            self.stopSignal.wait()
+        if result.bestMove is None:  # mate or stalemate on the board
+            self.send("bestmove 0000")
+        else:
+            self.send("bestmove " + result.bestMove.getChessNotation())
+
+    def sendInfo(self, result):
+        elapsed = time.perf_counter() - self.searchStart
+        self.send("info depth %d score %s nodes %d nps %d time %d hashfull %d pv %s" % (
+            result.depth, formatScore(result.score), result.nodes, int(result.nodes / elapsed) if elapsed > 0 else 0,
+            int(elapsed * 1000), self.searcher.transpositionTable.usage(),
+            " ".join(move.getChessNotation() for move in result.principalVariation)))
+
+    def stopSearch(self):
+        self.searcher.stop()
+        self.stopSignal.set()
+        self.waitForSearch()
+
+    def waitForSearch(self):
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+
+def main(argv=None):
+    engine = UCIEngine(sys.stdout)
+    sys.stdout = sys.stderr  # stray prints from the engine must not end up in the protocol stream
+    try:
+        for line in sys.stdin:
+            if not engine.handleCommand(line):
+                break
+    finally:
+        engine.stopSearch()
+        engine.closeSearcher()
+        sys.stdout = engine.output
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())